@@ -0,0 +1,279 @@
+import csv
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import config
+
+# 花名册列名（支持中英文表头）
+COLUMN_ALIASES = {
+    "name": ["name", "姓名", "学生姓名"],
+    "student_id": ["student_id", "id", "学号", "学号id"],
+    "subject": ["subject", "主题", "课程主题"],
+    "paper_size": ["paper_size", "paper", "纸张", "纸张尺寸"],
+    "copies": ["copies", "份数", "打印份数"],
+}
+
+# 文件名中不允许出现的字符
+_INVALID_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\r\n\t]')
+
+
+def parse_paper_size(value, default=None):
+    """解析纸张尺寸，支持 A4/A3 或 宽x高（毫米）"""
+    if value is None or str(value).strip() == "":
+        return tuple(default or config.PAPER_SIZES["A4"])
+
+    text = str(value).strip().upper()
+    for key, size in config.PAPER_SIZES.items():
+        if text.startswith(key.upper()):
+            return tuple(size)
+
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*[X×*]\s*(\d+(?:\.\d+)?)\s*(MM)?", text)
+    if not match:
+        raise ValueError(f"无法识别的纸张尺寸: {value}")
+    width, height = float(match.group(1)), float(match.group(2))
+    if not (1 <= width <= 1000 and 1 <= height <= 1000):
+        raise ValueError(f"纸张尺寸超出范围(1-1000mm): {value}")
+    # 整数尺寸保持为int，便于与预设尺寸比较
+    return tuple(int(v) if v.is_integer() else v for v in (width, height))
+
+
+def label_stem(name, student_id):
+    """按"姓名_学号"格式生成不含扩展名的文件名"""
+    return _INVALID_FILENAME_CHARS.sub("_", f"{name}_{student_id}")
+
+
+def label_filename(name, student_id, ext="png"):
+    """按"姓名_学号"格式生成文件名"""
+    return f"{label_stem(name, student_id)}.{ext}"
+
+
+def _normalize_header(header):
+    """将表头映射为标准字段名"""
+    mapping = {}
+    for index, column in enumerate(header):
+        key = str(column or "").strip().lower()
+        for field, aliases in COLUMN_ALIASES.items():
+            if key in aliases and field not in mapping:
+                mapping[field] = index
+    return mapping
+
+
+def _read_csv_rows(path):
+    """读取CSV文件的所有行（兼容UTF-8和Excel导出的GBK编码）"""
+    for encoding in ("utf-8-sig", "gbk"):
+        try:
+            with open(path, "r", encoding=encoding, newline="") as f:
+                return list(csv.reader(f))
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"无法识别文件编码: {path}")
+
+
+def _read_xlsx_rows(path):
+    """读取XLSX文件第一个工作表的所有行"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("读取XLSX需要安装openpyxl: pip install openpyxl")
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        return [list(row) for row in sheet.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def read_roster(path):
+    """读取花名册，返回 (行号, 字段字典) 列表"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        rows = _read_xlsx_rows(path)
+    elif ext in (".csv", ".txt"):
+        rows = _read_csv_rows(path)
+    else:
+        raise ValueError(f"不支持的花名册格式: {ext}（支持CSV/XLSX）")
+
+    if not rows:
+        return []
+
+    mapping = _normalize_header(rows[0])
+    if "name" not in mapping or "student_id" not in mapping:
+        raise ValueError("花名册缺少必需的列: 姓名(name) 和 学号(student_id)")
+
+    records = []
+    for line_no, row in enumerate(rows[1:], start=2):
+        # 跳过空行
+        if not any(str(cell or "").strip() for cell in row):
+            continue
+        record = {}
+        for field, index in mapping.items():
+            value = row[index] if index < len(row) else None
+            # Excel中的纯数字学号会被读成float，去掉多余的".0"
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            record[field] = "" if value is None else str(value).strip()
+        records.append((line_no, record))
+    return records
+
+
+def build_jobs(records, default_paper_size=None):
+    """校验花名册记录并转换为渲染任务，返回 (任务列表, 错误列表)
+
+    姓名和学号相同（输出文件名相同）的重复行不会互相覆盖：之后的行在文件名后加"_2"、"_3"……，
+    并在任务的 duplicate_of 中记录第一次出现的行号。加序号后的文件名如果已被其他行使用，
+    序号继续递增，直到文件名没有被使用。
+    """
+    jobs = []
+    errors = []
+    # 文件名（Windows不区分大小写）-> (第一次出现的行号, 出现次数)
+    seen = {}
+    # 已分配的输出文件名（小写）
+    used = set()
+    for line_no, record in records:
+        try:
+            name = record.get("name", "")
+            student_id = record.get("student_id", "")
+            if not name or not student_id:
+                raise ValueError("姓名和学号不能为空")
+            paper_size = parse_paper_size(record.get("paper_size"), default_paper_size)
+            copies = record.get("copies") or "1"
+            copies = int(float(copies))
+            if copies < 1:
+                raise ValueError(f"打印份数无效: {copies}")
+        except ValueError as e:
+            errors.append({"line": line_no, "record": record, "error": str(e)})
+            continue
+
+        base = label_stem(name, student_id)
+        first_line, count = seen.get(base.lower(), (line_no, 0))
+        seen[base.lower()] = (first_line, count + 1)
+        duplicate_of = first_line if count else None
+        # 如"张三"、"1"的第二行是"张三_1_2"，可能与学号为"1_2"的"张三"相同
+        suffix = count + 1
+        stem = f"{base}_{suffix}" if count else base
+        while stem.lower() in used:
+            suffix += 1
+            stem = f"{base}_{suffix}"
+        used.add(stem.lower())
+
+        jobs.append({
+            "line": line_no,
+            "name": name,
+            "student_id": student_id,
+            "subject": record.get("subject") or None,
+            "paper_size": paper_size,
+            "copies": copies,
+            "file_stem": stem,
+            "duplicate_of": duplicate_of,
+        })
+    return jobs, errors
+
+
+def _render_job(job, output_dir, qr_size_percent, logo_path, dpi=300, profile=False, fmt="png",
+                mode="RGB", logo_threshold=None, use_cache=True):
+    """在工作进程中渲染单个标签并保存，profile为True时同时返回各阶段耗时
+
+    返回 (job, 输出路径, 错误, 各阶段耗时, 是否命中磁盘缓存)。
+    """
+    if profile:
+        import profiling
+        with profiling.profile() as stats:
+            result = _render_job(job, output_dir, qr_size_percent, logo_path, dpi, fmt=fmt,
+                                 mode=mode, logo_threshold=logo_threshold, use_cache=use_cache)
+        return result[:3] + (stats.summary(),) + result[4:]
+
+    from render_cache import render_label_file
+
+    try:
+        output_path = os.path.join(output_dir, f"{job['file_stem']}.{fmt}")
+        # 内容没有变化的标签直接从磁盘缓存复制
+        cached = render_label_file(
+            output_path,
+            fmt,
+            job["student_id"],
+            job["name"],
+            paper_size_mm=job["paper_size"],
+            qr_size_percent=qr_size_percent,
+            logo_path=logo_path,
+            subject=job["subject"],
+            dpi=dpi,
+            mode=mode,
+            logo_threshold=logo_threshold,
+            use_cache=use_cache,
+        )
+        return job, output_path, None, None, cached
+    except Exception as e:
+        return job, None, str(e), None, False
+
+
+def render_roster(roster, output_dir, qr_size_percent=None, logo_path=None,
+                  default_paper_size=None, workers=None, progress=None, dpi=300, stage_stats=None,
+                  fmt="png", mode="RGB", logo_threshold=None, use_cache=True):
+    """批量渲染花名册中的所有标签
+
+    roster 可以是花名册文件路径，也可以是 read_roster 返回的记录列表。
+    progress(done, total, result) 在每个标签完成后回调。
+    fmt 为输出格式（png、jpg、bmp、tiff 或矢量的 svg）。
+    mode 为"1"时输出1位黑白图像，logo_threshold 为Logo的二值化阈值（None为抖动）。
+    stage_stats 为 profiling.StageStats 时，工作进程中各渲染阶段的耗时会汇总到其中。
+    每个标签只保存一个文件，花名册中的份数记录在结果的 copies 中（汇总为需要打印的总份数），
+    拼版和PDF导出会按份数重复排列标签。
+    姓名和学号重复的行保存为带序号的文件，并在结果的 duplicates 中列出。
+    use_cache 为True时使用磁盘渲染缓存（render_cache），内容没有变化的标签不再重新渲染。
+    出错的行会被记录并跳过，不会中断整个批次。
+    """
+    records = read_roster(roster) if isinstance(roster, (str, os.PathLike)) else roster
+    jobs, errors = build_jobs(records, default_paper_size)
+    os.makedirs(output_dir, exist_ok=True)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs) or 1))
+
+    outputs = []
+    total = len(jobs)
+    done = 0
+    cached = 0
+    start = time.perf_counter()
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_render_job, job, output_dir, qr_size_percent, logo_path, dpi,
+                                stage_stats is not None, fmt, mode, logo_threshold, use_cache)
+                for job in jobs
+            ]
+            for future in as_completed(futures):
+                job, output_path, error, stages, hit = future.result()
+                cached += hit
+                if stages:
+                    stage_stats.merge(stages)
+                result = {"line": job["line"], "name": job["name"],
+                          "student_id": job["student_id"], "copies": job["copies"],
+                          "path": output_path, "error": error, "duplicate_of": job["duplicate_of"]}
+                if error:
+                    errors.append({"line": job["line"], "record": job, "error": error})
+                else:
+                    outputs.append(result)
+                done += 1
+                if progress:
+                    progress(done, total, result)
+
+    elapsed = time.perf_counter() - start
+    errors.sort(key=lambda e: e["line"])
+    outputs.sort(key=lambda r: r["line"])
+    return {
+        "total": len(records),
+        "succeeded": len(outputs),
+        "failed": len(errors),
+        "cached": cached,
+        "copies": sum(result["copies"] for result in outputs),
+        "duplicates": [result for result in outputs if result["duplicate_of"]],
+        "outputs": outputs,
+        "errors": errors,
+        "elapsed": elapsed,
+        "workers": workers,
+        "labels_per_sec": len(outputs) / elapsed if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,330 @@
+"""贝朵亚画纸生成系统命令行工具（无界面，可用于脚本和定时任务）
+
+用法:
+    python -m bedoya render --name 江龙 --id 3436676 --subject 水彩 --paper A4
+    python -m bedoya batch roster.csv -o labels/
+    python -m bedoya batch roster.xlsx --format pdf -o roster.pdf --impose --label 40x20
+    python -m bedoya render --name 江龙 --id 3436676 --paper 40x20 -o label.svg
+    python -m bedoya serve --port 8765
+    python -m bedoya print --printer 192.168.1.50 --name 江龙 --id 3436676 --paper 40x20
+    python -m bedoya cache stats
+    python -m bedoya fonts
+
+本模块顶层只导入标准库，PIL、qrcode和配置在执行命令时才导入，且从不导入PyQt6。
+"""
+import argparse
+import os
+import sys
+import time
+
+# 冷启动（python -m bedoya --help）的时间预算，benchmark.py startup 会检查
+STARTUP_BUDGET_MS = 150
+
+OUTPUT_FORMATS = ("png", "pdf", "svg", "jpg", "bmp", "tiff")
+
+
+def _percent(value):
+    """解析二维码大小百分比（5-20）"""
+    percent = float(value)
+    if not 5 <= percent <= 20:
+        raise argparse.ArgumentTypeError("二维码大小必须在5%-20%之间")
+    return percent / 100
+
+
+def _positive(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError("必须大于0")
+    return number
+
+
+def _paper_size(value):
+    """解析纸张尺寸，无法识别时抛出ValueError"""
+    from batch import parse_paper_size
+    return parse_paper_size(value)
+
+
+def _threshold(value):
+    threshold = int(value)
+    if not 1 <= threshold <= 254:
+        raise argparse.ArgumentTypeError("阈值必须在1-254之间")
+    return threshold
+
+
+def _color_mode(args):
+    """--mono 时输出1位黑白图像"""
+    return "1" if args.mono else "RGB"
+
+
+def _output_format(path, fmt):
+    """根据参数或文件扩展名确定输出格式"""
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path or "")[1].lstrip(".").lower()
+    return ext if ext in OUTPUT_FORMATS else "png"
+
+
+def cmd_render(args):
+    """渲染单个标签"""
+    import config
+    from batch import label_filename
+
+    paper_size = _paper_size(args.paper)
+    dpi = args.dpi or config.PRINT_DPI
+    fmt = _output_format(args.output, args.format)
+    output = args.output or label_filename(args.name, args.id, fmt)
+
+    # 相同输入的标签直接从磁盘缓存复制
+    from render_cache import render_label_file
+    render_label_file(output, fmt, args.id, args.name, paper_size, qr_size_percent=args.qr_size,
+                      logo_path=args.logo, subject=args.subject, dpi=dpi, mode=_color_mode(args),
+                      logo_threshold=args.logo_threshold, use_cache=not args.no_cache)
+    print(output)
+    return 0
+
+
+def _print_progress(done, total, *_):
+    print(f"\r进度: {done}/{total}", end="", file=sys.stderr, flush=True)
+    if done == total:
+        print(file=sys.stderr)
+
+
+def cmd_batch(args):
+    """批量渲染花名册"""
+    import config
+
+    dpi = args.dpi or config.PRINT_DPI
+    default_paper = _paper_size(args.paper) if args.paper else None
+    progress = None if args.quiet else _print_progress
+    fmt = _output_format(args.output, args.format)
+
+    if fmt == "pdf":
+        from pdf_export import export_roster_pdf
+        output = args.output or "labels.pdf"
+        summary = export_roster_pdf(
+            args.roster, output, qr_size_percent=args.qr_size, logo_path=args.logo,
+            default_paper_size=default_paper, impose=args.impose,
+            sheet_size_mm=_paper_size(args.sheet), label_size_mm=_paper_size(args.label),
+            gutter_mm=args.gutter, margin_mm=args.margin, cut_marks=not args.no_cut_marks,
+            progress=progress,
+        )
+        print(f"已写入 {output}: {summary['pages']}页，{summary['labels']}个标签，"
+              f"耗时{summary['elapsed']:.2f}秒（{summary['pages_per_sec']:.1f}页/秒）")
+    elif args.impose:
+        from imposition import impose_roster
+        output = args.output or "sheets"
+        start = time.perf_counter()
+        outputs, errors = impose_roster(
+            args.roster, output, sheet_size_mm=_paper_size(args.sheet),
+            label_size_mm=_paper_size(args.label), gutter_mm=args.gutter, margin_mm=args.margin,
+            cut_marks=not args.no_cut_marks, qr_size_percent=args.qr_size, logo_path=args.logo, dpi=dpi,
+            fmt=fmt, mode=_color_mode(args), logo_threshold=args.logo_threshold,
+        )
+        summary = {"errors": errors}
+        print(f"已生成 {len(outputs)} 张拼版到 {output}，耗时{time.perf_counter() - start:.2f}秒")
+    else:
+        from batch import render_roster
+        output = args.output or "labels"
+        stage_stats = None
+        if args.profile:
+            import profiling
+            stage_stats = profiling.global_stats()
+        summary = render_roster(
+            args.roster, output, qr_size_percent=args.qr_size, logo_path=args.logo,
+            default_paper_size=default_paper, workers=args.workers, progress=progress, dpi=dpi,
+            stage_stats=stage_stats, fmt=fmt, mode=_color_mode(args), logo_threshold=args.logo_threshold,
+            use_cache=not args.no_cache,
+        )
+        print(f"成功 {summary['succeeded']} 个（{summary['cached']}个来自缓存，共需打印{summary['copies']}份），"
+              f"失败 {summary['failed']} 个，耗时{summary['elapsed']:.2f}秒（{summary['labels_per_sec']:.1f}个/秒，"
+              f"{summary['workers']}个进程）")
+        for duplicate in summary["duplicates"]:
+            print(f"第{duplicate['line']}行与第{duplicate['duplicate_of']}行的姓名和学号相同，"
+                  f"已保存为 {os.path.basename(duplicate['path'])}", file=sys.stderr)
+
+    for error in summary["errors"]:
+        print(f"第{error['line']}行: {error['error']}", file=sys.stderr)
+    return 1 if summary["errors"] else 0
+
+
+def cmd_cache(args):
+    """查看或清理磁盘渲染缓存"""
+    from render_cache import RenderCache, format_size
+
+    cache = RenderCache(args.dir)
+    if args.action == "stats":
+        info = cache.info()
+        print(f"目录: {info['directory']}")
+        print(f"条目: {info['entries']}")
+        print(f"大小: {format_size(info['bytes'])} / {format_size(info['max_bytes'])}")
+    else:
+        if args.action == "clear":
+            result = cache.clear()
+        else:
+            max_bytes = cache.max_bytes if args.max_mb is None else int(args.max_mb * 1024 * 1024)
+            result = cache.prune(max_bytes)
+        print(f"删除 {result['removed']} 个条目，释放 {format_size(result['freed'])}，"
+              f"剩余 {format_size(result['bytes'])}")
+    return 0
+
+
+def cmd_fonts(args):
+    """列出支持中文标签的系统字体"""
+    import config
+    import font_index
+
+    index = font_index.load_index(refresh=args.refresh)
+    faces = font_index.cjk_faces()
+    print(f"索引: {font_index.index_path()}（{len(index['faces'])} 个字体）")
+    if not faces:
+        print("没有找到能显示中文标签的字体，请安装中文字体（如文泉驿、思源黑体）或在设置中指定FONT_PATH",
+              file=sys.stderr)
+        return 1
+    for face in faces:
+        index_text = f" #{face['index']}" if face["path"].lower().endswith((".ttc", ".otc")) else ""
+        print(f"{face['family']} {face['style']}  姓名用字 {face['names']:.0%}  {face['path']}{index_text}")
+    print(f"当前使用: {config.FONT_PATH or '默认字体'}")
+    return 0
+
+
+def cmd_serve(args):
+    """启动本地HTTP标签服务"""
+    from server import serve
+    serve(args.host, args.port, args.workers, args.quiet, args.profile)
+    return 0
+
+
+def cmd_print(args):
+    """直接发送到热敏标签打印机（ZPL/ESC-POS）"""
+    import config
+    from label_printer import print_labels, parse_printer_address
+
+    address = args.printer or config.LABEL_PRINTER
+    if not address:
+        raise ValueError("请用 --printer 指定打印机地址，或在配置中设置 LABEL_PRINTER")
+    host, port = parse_printer_address(address)
+    paper_size = _paper_size(args.paper)
+
+    if args.roster:
+        from batch import read_roster, build_jobs
+        labels, errors = build_jobs(read_roster(args.roster), paper_size)
+    elif args.name and args.id:
+        labels = [{"student_id": args.id, "name": args.name, "subject": args.subject,
+                   "copies": args.copies, "paper_size": paper_size}]
+        errors = []
+    else:
+        raise ValueError("请指定 --roster，或同时指定 --name 和 --id")
+
+    summary = print_labels(
+        labels, host, port, language=args.language or config.LABEL_PRINTER_LANGUAGE,
+        paper_size_mm=paper_size, qr_size_percent=args.qr_size, logo_path=args.logo,
+        dpi=args.dpi or config.LABEL_PRINTER_DPI, logo_threshold=args.logo_threshold,
+    )
+    print(f"已发送 {summary['labels']} 个标签到 {host}:{port}，共{summary['bytes'] / 1024:.1f}KB，"
+          f"耗时{summary['elapsed']:.2f}秒")
+    for error in errors:
+        print(f"第{error['line']}行: {error['error']}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def _add_common_options(parser):
+    """render 和 batch 共用的标签参数"""
+    parser.add_argument("--qr-size", type=_percent, metavar="PERCENT",
+                        help="二维码大小（相对纸张短边的百分比，5-20，默认使用配置中的QR_CODE_SIZE_PERCENT）")
+    parser.add_argument("--logo", help="Logo文件路径（默认使用配置中的Logo）")
+    parser.add_argument("--dpi", type=_positive, help="输出分辨率（默认使用配置中的PRINT_DPI）")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="输出格式（默认按输出文件扩展名，否则为png）")
+    parser.add_argument("--mono", action="store_true",
+                        help="输出1位黑白图像（热敏标签打印机），tiff格式使用G4压缩")
+    parser.add_argument("--logo-threshold", type=_threshold, metavar="1-254",
+                        help="黑白输出时Logo的二值化阈值（默认使用抖动）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用磁盘渲染缓存")
+    parser.add_argument("-o", "--output", help="输出文件或目录")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="bedoya", description="贝朵亚画纸标签生成（命令行）")
+    parser.add_argument("--profile", action="store_true",
+                        help="统计各渲染阶段的耗时，结束后输出到标准错误（serve 时在 /stats 中提供）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    render = subparsers.add_parser("render", help="生成单个标签")
+    render.add_argument("--name", required=True, help="学生姓名")
+    render.add_argument("--id", required=True, help="学号")
+    render.add_argument("--subject", help="课程主题")
+    render.add_argument("--paper", default="A4", help="纸张尺寸：A4、A3 或 宽x高（毫米），默认A4")
+    _add_common_options(render)
+    render.set_defaults(func=cmd_render)
+
+    batch = subparsers.add_parser("batch", help="从花名册（CSV/XLSX）批量生成")
+    batch.add_argument("roster", help="花名册文件")
+    batch.add_argument("--paper", help="花名册未指定纸张时使用的尺寸，默认A4")
+    batch.add_argument("--workers", type=int, help="并行进程数（默认CPU核心数）")
+    batch.add_argument("--impose", action="store_true", help="拼版：将小标签排到整张纸上")
+    batch.add_argument("--sheet", default="A4", help="拼版纸张尺寸，默认A4")
+    batch.add_argument("--label", default="40x20", help="拼版标签尺寸，默认40x20")
+    batch.add_argument("--gutter", type=float, default=2, help="拼版标签间距（毫米）")
+    batch.add_argument("--margin", type=float, default=5, help="拼版页边距（毫米）")
+    batch.add_argument("--no-cut-marks", action="store_true", help="拼版时不画裁切线")
+    batch.add_argument("-q", "--quiet", action="store_true", help="不显示进度")
+    _add_common_options(batch)
+    batch.set_defaults(func=cmd_batch)
+
+    printer = subparsers.add_parser("print", help="直接发送到热敏标签打印机（ZPL/ESC-POS，端口9100）")
+    printer.add_argument("--printer", help="打印机地址 主机[:端口]（默认使用配置中的LABEL_PRINTER）")
+    printer.add_argument("--language", choices=("zpl", "escpos"), help="打印机语言（默认使用配置）")
+    printer.add_argument("--roster", help="花名册文件（CSV/XLSX）")
+    printer.add_argument("--name", help="学生姓名")
+    printer.add_argument("--id", help="学号")
+    printer.add_argument("--subject", help="课程主题")
+    printer.add_argument("--copies", type=int, default=1, help="份数（由打印机复制）")
+    printer.add_argument("--paper", default="40x20", help="标签尺寸，默认40x20")
+    printer.add_argument("--qr-size", type=_percent, metavar="PERCENT",
+                         help="二维码大小（5-20，默认使用配置中的QR_CODE_SIZE_PERCENT）")
+    printer.add_argument("--logo", help="Logo文件路径")
+    printer.add_argument("--dpi", type=_positive, help="打印机分辨率（默认使用配置中的LABEL_PRINTER_DPI）")
+    printer.add_argument("--logo-threshold", type=_threshold, metavar="1-254",
+                         help="Logo的二值化阈值（默认使用抖动）")
+    printer.set_defaults(func=cmd_print)
+
+    cache = subparsers.add_parser("cache", help="查看或清理磁盘渲染缓存")
+    cache.add_argument("action", choices=("stats", "prune", "clear"),
+                       help="stats 显示统计，prune 按最近使用时间清理到容量以内，clear 全部删除")
+    cache.add_argument("--max-mb", type=float, help="prune 清理后的大小上限（MB，默认使用配置）")
+    cache.add_argument("--dir", help="缓存目录（默认使用配置）")
+    cache.set_defaults(func=cmd_cache)
+
+    fonts = subparsers.add_parser("fonts", help="列出支持中文标签的系统字体")
+    fonts.add_argument("--refresh", action="store_true", help="重新扫描字体目录")
+    fonts.set_defaults(func=cmd_fonts)
+
+    serve = subparsers.add_parser("serve", help="启动本地HTTP标签服务")
+    serve.add_argument("--host", default="127.0.0.1", help="监听地址，默认127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765, help="监听端口，默认8765")
+    serve.add_argument("--workers", type=int, help="渲染进程数（默认CPU核心数）")
+    serve.add_argument("-q", "--quiet", action="store_true", help="不输出访问日志")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile and args.command != "serve":
+        import profiling
+        profiling.enable()
+    try:
+        return args.func(args)
+    except (ValueError, OSError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.profile and args.command != "serve":
+            summary = profiling.global_stats().summary()
+            if summary:
+                print(profiling.format_table(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,509 @@
+"""标签渲染性能测试
+
+用法:
+    python benchmark.py qr        # 二维码栅格化：旧路径（生成中间图像再缩放）与直接栅格化对比
+    python benchmark.py preview   # 预览延迟：按打印分辨率渲染与按预览区域分辨率渲染对比
+    python benchmark.py pdf       # PDF导出：页/秒、文件大小和峰值内存
+    python benchmark.py startup   # 命令行冷启动时间（超出预算时返回非0）
+    python benchmark.py print     # 打印队列：用替身打印命令检查任务数、份数和吞吐量
+    python benchmark.py suite --save baseline.json        # 全部纸张/标签尺寸的渲染基准，保存为基线
+    python benchmark.py suite --compare baseline.json     # 与基线对比，超过回归阈值时返回非0
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def measure(func, repeat=20, warmup=1):
+    """多次运行函数，返回耗时统计（毫秒）"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "best_ms": min(timings),
+        "mean_ms": statistics.mean(timings),
+        "median_ms": statistics.median(timings),
+        "repeat": repeat,
+    }
+
+
+def traced_peak_kb(func):
+    """单独运行一次函数，返回tracemalloc记录的Python内存分配峰值（KB）
+
+    tracemalloc会明显拖慢运行，所以不和计时放在同一次运行中。
+    """
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def print_table(headers, rows):
+    """以对齐的表格形式打印结果"""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(cell).ljust(w) for cell, w in zip(row, widths)))
+
+
+def qr_benchmark_cases():
+    """二维码栅格化的测试尺寸：A4/A3标准布局和30×20mm全画幅布局"""
+    from qr_generator import mm_to_pixels
+
+    cases = []
+    for name, paper_size_mm in (("A4", (297, 210)), ("A3", (420, 297))):
+        base_size = min(mm_to_pixels(paper_size_mm[0]), mm_to_pixels(paper_size_mm[1]))
+        for percent in (0.08, 0.20):
+            cases.append((f"{name} {int(percent * 100)}%", int(base_size * percent)))
+    # 全画幅布局：二维码占内容宽度的45%
+    content_width = mm_to_pixels(30) - 2 * mm_to_pixels(2)
+    cases.append(("30×20mm", int(content_width * 0.45)))
+    return cases
+
+
+def legacy_qr_image(qr, size):
+    """旧的二维码生成路径：box_size=10的中间图像再缩放到目标尺寸"""
+    from PIL import Image
+
+    qr_image = qr.make_image(fill_color="black", back_color="white")
+    return qr_image.resize((size, size), Image.Resampling.LANCZOS)
+
+
+def bench_qr_raster(repeat=50):
+    """对比旧的二维码生成路径与直接栅格化"""
+    import qrcode
+    from qr_generator import rasterize_qr_matrix
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=1,
+    )
+    qr.add_data("ID:3436676\nName:江龙\nSubject:水彩风景")
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+
+    results = []
+    for label, size in qr_benchmark_cases():
+        legacy = measure(lambda: legacy_qr_image(qr, size), repeat)
+        direct = measure(lambda: rasterize_qr_matrix(matrix, size), repeat)
+        results.append({
+            "case": label,
+            "size": size,
+            "legacy_ms": legacy["best_ms"],
+            "direct_ms": direct["best_ms"],
+            "speedup": legacy["best_ms"] / direct["best_ms"],
+        })
+
+    print_table(
+        ["尺寸", "像素", "旧路径(ms)", "直接栅格化(ms)", "加速比"],
+        [[r["case"], r["size"], f"{r['legacy_ms']:.3f}", f"{r['direct_ms']:.3f}",
+          f"{r['speedup']:.1f}x"] for r in results],
+    )
+    return results
+
+
+def preview_dpi(paper_size_mm, widget_size=(800, 560), max_dpi=300):
+    """按预览区域大小计算渲染分辨率（与PreviewWidget.previewDpi一致）"""
+    scale = min(widget_size[0] / paper_size_mm[0], widget_size[1] / paper_size_mm[1])
+    return max(1, min(scale * 25.4, max_dpi))
+
+
+def bench_preview(repeat=10, widget_size=(800, 560)):
+    """对比按300DPI渲染预览、按预览区域分辨率渲染预览和增量渲染（只换学生）的耗时"""
+    from qr_generator import generate_qr_code
+    from render_session import RenderSession
+
+    cases = [("A4", (297, 210)), ("A3", (420, 297)), ("40×20mm", (40, 20))]
+    results = []
+    for label, paper_size_mm in cases:
+        dpi = preview_dpi(paper_size_mm, widget_size)
+
+        def render(dpi):
+            return generate_qr_code("3436676", "江龙", paper_size_mm=paper_size_mm,
+                                    subject="水彩风景", dpi=dpi)
+
+        full = measure(lambda: render(300), repeat)
+        preview = measure(lambda: render(dpi), repeat)
+        # 逐个浏览花名册：每次换一个新学生（二维码不命中缓存），对比完整渲染和只重绘变化区域
+        roster = [student for _, student in synthetic_roster(2 * (repeat + 1))]
+        students = iter(roster[:repeat + 1])
+
+        def switch():
+            student = next(students)
+            generate_qr_code(student["student_id"], student["name"], paper_size_mm=paper_size_mm,
+                             subject=student["subject"] or None, dpi=dpi)
+
+        session = RenderSession(paper_size_mm, dpi=dpi)
+        session_students = iter(roster[repeat + 1:])
+
+        def update():
+            student = next(session_students)
+            session.update(student["student_id"], student["name"], student["subject"])
+
+        switch_full = measure(switch, repeat)
+        incremental = measure(update, repeat)
+        results.append({
+            "case": label,
+            "preview_dpi": dpi,
+            "print_ms": full["mean_ms"],
+            "preview_ms": preview["mean_ms"],
+            "speedup": full["mean_ms"] / preview["mean_ms"],
+            "switch_ms": switch_full["mean_ms"],
+            "incremental_ms": incremental["mean_ms"],
+        })
+
+    print(f"预览区域: {widget_size[0]}×{widget_size[1]}像素")
+    print_table(
+        ["纸张", "预览DPI", "300DPI(ms)", "预览DPI(ms)", "加速比", "换学生完整(ms)", "换学生增量(ms)"],
+        [[r["case"], f"{r['preview_dpi']:.0f}", f"{r['print_ms']:.1f}", f"{r['preview_ms']:.1f}",
+          f"{r['speedup']:.1f}x", f"{r['switch_ms']:.1f}", f"{r['incremental_ms']:.1f}"] for r in results],
+    )
+    return results
+
+
+def peak_rss_mb():
+    """进程的峰值常驻内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def synthetic_roster(count):
+    """生成测试用的花名册记录"""
+    subjects = ["水彩风景", "素描静物", "创意手工", None]
+    return [
+        (index + 2, {"name": f"学生{index:04d}", "student_id": str(3436000 + index),
+                     "subject": subjects[index % len(subjects)] or ""})
+        for index in range(count)
+    ]
+
+
+def bench_pdf(counts=(100, 500), impose=False):
+    """导出不同长度的花名册，统计页/秒、文件大小和峰值内存
+
+    名单长度按从小到大运行，峰值RSS应保持基本不变。
+    """
+    from pdf_export import export_roster_pdf
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for count in counts:
+            path = os.path.join(temp_dir, f"roster_{count}.pdf")
+            summary = export_roster_pdf(synthetic_roster(count), path, impose=impose)
+            results.append({
+                "students": count,
+                "pages": summary["pages"],
+                "elapsed_s": summary["elapsed"],
+                "pages_per_sec": summary["pages_per_sec"],
+                "size_kb": summary["size"] / 1024,
+                "rss_peak_mb": peak_rss_mb(),
+            })
+
+    print_table(
+        ["学生数", "页数", "耗时(s)", "页/秒", "文件(KB)", "RSS峰值(MB)"],
+        [[r["students"], r["pages"], f"{r['elapsed_s']:.2f}", f"{r['pages_per_sec']:.1f}",
+          f"{r['size_kb']:.0f}", "-" if r["rss_peak_mb"] is None else f"{r['rss_peak_mb']:.0f}"]
+         for r in results],
+    )
+    return results
+
+
+# 基准测试使用的姓名：普通长度和超长中文姓名
+SUITE_NAMES = (("short", "江龙"), ("long", "欧阳娜娜·阿依古丽·努尔买买提"))
+SUITE_SUBJECT = "水彩风景写生与色彩构成"
+
+
+def suite_cases():
+    """基准测试用例：A4、A3（标准布局）和所有标签尺寸（全画幅布局），有无主题，普通和超长姓名"""
+    import config
+    from qr_generator import is_full_layout
+
+    papers = [(name, tuple(size)) for name, size in config.PAPER_SIZES.items()]
+    papers += [(f"{s['width']}x{s['height']}", (s["width"], s["height"]))
+               for s in config.LABEL_SIZES + config.LABEL_PRINTER_SIZES]
+
+    cases = []
+    for paper_name, paper_size_mm in papers:
+        layout = "full" if is_full_layout(paper_size_mm) else "standard"
+        for subject in (None, SUITE_SUBJECT):
+            for name_kind, name in SUITE_NAMES:
+                cases.append({
+                    "case": f"{paper_name}/{layout}/{'subject' if subject else 'plain'}/{name_kind}",
+                    "paper_size_mm": paper_size_mm,
+                    "name": name,
+                    "subject": subject,
+                })
+    return cases
+
+
+def preview_widget():
+    """创建离屏的PreviewWidget，未安装PyQt6时返回None"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt6.QtWidgets import QApplication
+        from main import PreviewWidget
+    except ImportError:
+        return None
+    app = QApplication.instance() or QApplication([])
+    widget = PreviewWidget()
+    widget.resize(800, 600)
+    widget._app = app
+    return widget
+
+
+def bench_suite(repeat=5, dpi=None):
+    """对每个用例测量渲染、PNG编码和预览转换的耗时、吞吐量和内存"""
+    import config
+    from qr_generator import generate_qr_code
+
+    dpi = dpi or config.PRINT_DPI
+    widget = preview_widget()
+    if widget is None:
+        print("未安装PyQt6，跳过预览转换（PreviewWidget.setPreviewImage）")
+
+    results = {}
+    for case in suite_cases():
+        def render():
+            return generate_qr_code("3436676", case["name"], paper_size_mm=case["paper_size_mm"],
+                                    subject=case["subject"], dpi=dpi)
+
+        image = render()
+        if image is None:
+            raise RuntimeError(f"渲染失败: {case['case']}")
+
+        def encode():
+            buffer = io.BytesIO()
+            image.save(buffer, "PNG", dpi=(dpi, dpi))
+            return buffer
+
+        stages = [("render", render), ("png", encode)]
+        if widget is not None:
+            stages.append(("preview", lambda: widget.setPreviewImage(image)))
+
+        for stage, func in stages:
+            timing = measure(func, repeat)
+            results[f"{case['case']}/{stage}"] = {
+                "median_ms": timing["median_ms"],
+                "best_ms": timing["best_ms"],
+                "ops_per_sec": 1000 / timing["median_ms"] if timing["median_ms"] else None,
+                "traced_peak_kb": traced_peak_kb(func),
+                "pixels": image.width * image.height,
+            }
+
+    print_table(
+        ["用例", "中位数(ms)", "次/秒", "分配峰值(KB)"],
+        [[name, f"{r['median_ms']:.2f}", f"{r['ops_per_sec']:.1f}", f"{r['traced_peak_kb']:.0f}"]
+         for name, r in results.items()],
+    )
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"RSS峰值: {rss:.0f}MB")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dpi": dpi,
+            "font": config.FONT_PATH,
+            "repeat": repeat,
+            "rss_peak_mb": rss,
+        },
+        "results": results,
+    }
+
+
+def compare_suite(current, baseline, threshold=0.15, memory_threshold=0.15):
+    """与基线对比，返回回归的用例列表 [(用例, 指标, 基线值, 当前值), ...]
+
+    耗时按中位数对比，内存按tracemalloc峰值对比，超过 1 + 阈值 视为回归。
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        for metric, limit in (("median_ms", threshold), ("traced_peak_kb", memory_threshold)):
+            if base[metric] and result[metric] > base[metric] * (1 + limit):
+                regressions.append((name, metric, base[metric], result[metric]))
+
+    if current["meta"]["dpi"] != baseline["meta"].get("dpi") or \
+            current["meta"]["font"] != baseline["meta"].get("font"):
+        print("警告: 基线的DPI或字体与当前不同，对比结果可能不准确")
+    missing = sorted(set(baseline["results"]) - set(current["results"]))
+    if missing:
+        print(f"基线中有{len(missing)}个用例本次未运行（例如 {missing[0]}）")
+    return regressions
+
+
+# 命令行启动时不应导入的重量级模块
+HEAVY_MODULES = ("PyQt6", "PIL", "qrcode", "numpy", "config", "qr_generator")
+
+
+def bench_startup(repeat=10):
+    """测量 python -m bedoya --help 的冷启动时间，并检查没有导入重量级模块"""
+    from bedoya import STARTUP_BUDGET_MS
+
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": package_dir}
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "bedoya", "--help"], cwd=package_dir, env=env,
+                       stdout=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # 作为对照：空解释器的启动时间
+    baseline = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        baseline.append((time.perf_counter() - start) * 1000)
+
+    check = ("import sys, bedoya\n"
+             "try:\n    bedoya.main(['--help'])\nexcept SystemExit:\n    pass\n"
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)")
+    loaded = subprocess.run([sys.executable, "-c", check], cwd=package_dir, env=env,
+                            capture_output=True, text=True, check=True).stderr.strip()
+
+    median = statistics.median(timings)
+    print(f"冷启动中位数: {median:.1f}ms（预算{STARTUP_BUDGET_MS}ms，空解释器{statistics.median(baseline):.1f}ms）")
+    print(f"启动时导入的重量级模块: {loaded or '无'}")
+    passed = median <= STARTUP_BUDGET_MS and not loaded
+    print("通过" if passed else "未通过")
+    return passed
+
+
+def bench_print(count=20, max_copies=3):
+    """通过替身打印命令提交一批任务，检查日志中的任务数和份数是否一致并统计吞吐量"""
+    from print_queue import PrintQueue
+    from qr_generator import render_label_tile
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "print_queue.py")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_path = os.path.join(temp_dir, "jobs.log")
+        command = f'"{sys.executable}" "{script}" record "{log_path}" {{file}} --copies {{copies}}'
+        print_queue = PrintQueue(command=command, spool_dir=temp_dir)
+        expected_copies = 0
+        start = time.perf_counter()
+        for _, student in synthetic_roster(count):
+            copies = int(student["student_id"]) % max_copies + 1
+            expected_copies += copies
+            print_queue.submit(lambda student=student: render_label_tile(
+                student["student_id"], student["name"], paper_size_mm=(40, 20),
+                subject=student["subject"] or None), copies, student["name"])
+        submitted = time.perf_counter() - start
+        print_queue.wait()
+        elapsed = time.perf_counter() - start
+        print_queue.close()
+
+        with open(log_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        leftover = [name for name in os.listdir(temp_dir) if name != "jobs.log"]
+
+    info = print_queue.info()
+    print_table(
+        ["任务数", "份数", "失败", "提交耗时(ms)", "总耗时(s)", "任务/秒", "残留文件"],
+        [[len(entries), sum(e["copies"] for e in entries), info["failed"], f"{submitted * 1000:.1f}",
+          f"{elapsed:.2f}", f"{len(entries) / elapsed:.1f}", len(leftover)]],
+    )
+    passed = (len(entries) == count and sum(e["copies"] for e in entries) == expected_copies
+              and len({e["file"] for e in entries}) == count and not leftover)
+    print("通过" if passed else f"未通过（应为{count}个任务、{expected_copies}份）")
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="标签渲染性能测试")
+    parser.add_argument("--font", help="覆盖配置中的字体路径（需支持中文）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    qr_parser = subparsers.add_parser("qr", help="二维码栅格化对比")
+    qr_parser.add_argument("--repeat", type=int, default=50, help="每个用例的重复次数")
+
+    preview_parser = subparsers.add_parser("preview", help="预览渲染延迟对比")
+    preview_parser.add_argument("--repeat", type=int, default=10, help="每个用例的重复次数")
+    preview_parser.add_argument("--width", type=int, default=800, help="预览区域宽度（像素）")
+    preview_parser.add_argument("--height", type=int, default=560, help="预览区域高度（像素）")
+
+    pdf_parser = subparsers.add_parser("pdf", help="PDF导出吞吐量和内存")
+    pdf_parser.add_argument("--counts", type=int, nargs="+", default=[100, 500], help="花名册长度")
+    pdf_parser.add_argument("--impose", action="store_true", help="按拼版导出")
+
+    startup_parser = subparsers.add_parser("startup", help="命令行冷启动时间")
+    startup_parser.add_argument("--repeat", type=int, default=10, help="重复次数")
+
+    print_parser = subparsers.add_parser("print", help="打印队列吞吐量（替身打印命令）")
+    print_parser.add_argument("--count", type=int, default=20, help="任务数")
+    print_parser.add_argument("--max-copies", type=int, default=3, help="每个任务的最大份数")
+
+    suite_parser = subparsers.add_parser("suite", help="全部纸张/标签尺寸的渲染基准")
+    suite_parser.add_argument("--repeat", type=int, default=5, help="每个用例的重复次数")
+    suite_parser.add_argument("--dpi", type=float, help="渲染分辨率（默认使用配置中的PRINT_DPI）")
+    suite_parser.add_argument("--save", metavar="JSON", help="将结果保存为基线文件")
+    suite_parser.add_argument("--compare", metavar="JSON", help="与基线文件对比")
+    suite_parser.add_argument("--threshold", type=float, default=0.15,
+                              help="耗时回归阈值（相对基线的比例，默认0.15即慢15%%）")
+    suite_parser.add_argument("--memory-threshold", type=float, default=0.15,
+                              help="内存分配峰值回归阈值（默认0.15）")
+
+    args = parser.parse_args(argv)
+    if args.font:
+        import config
+        config.FONT_PATH = args.font
+
+    if args.command == "qr":
+        bench_qr_raster(args.repeat)
+    elif args.command == "preview":
+        bench_preview(args.repeat, (args.width, args.height))
+    elif args.command == "pdf":
+        bench_pdf(args.counts, args.impose)
+    elif args.command == "startup":
+        if not bench_startup(args.repeat):
+            sys.exit(1)
+    elif args.command == "print":
+        if not bench_print(args.count, args.max_copies):
+            sys.exit(1)
+    elif args.command == "suite":
+        current = bench_suite(args.repeat, args.dpi)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(current, f, ensure_ascii=False, indent=2)
+            print(f"基线已保存到 {args.save}")
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare_suite(current, baseline, args.threshold, args.memory_threshold)
+            if regressions:
+                print(f"发现{len(regressions)}处性能回归:")
+                print_table(
+                    ["用例", "指标", "基线", "当前", "变化"],
+                    [[name, metric, f"{base:.2f}", f"{value:.2f}", f"{(value / base - 1) * 100:+.0f}%"]
+                     for name, metric, base, value in regressions],
+                )
+                sys.exit(1)
+            print("未发现性能回归")
+
+
+if __name__ == "__main__":
+    main()
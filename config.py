@@ -1,55 +1,93 @@
+"""配置：首次访问时才读取 settings.json，按结构校验，文件修改后自动重新加载
+
+配置项通过模块属性访问（config.PRINT_DPI），每次访问都返回当前值，渲染代码不需要重新导入。
+settings.json 先在当前目录查找，再在程序目录查找；文件的修改时间变化后重新解析，
+FONT_PATH 留空时在第一次访问 config.FONT_PATH 时才查找默认字体（首次运行需要扫描系统字体），
+读取其他配置项不会触发扫描；查找结果会被缓存，不会在每次重新加载时重复。
+
+QR_CODE_SIZE_PERCENT 是界面、命令行、标签服务和渲染函数的默认二维码比例；旧版本的 QR_CODE_SIZE
+会映射到它并给出提示。Logo大小由布局决定，LOGO_SIZE / LOGO_SIZE_PERCENT 不再支持，出现时提示并忽略。
+类型或取值不合法的配置项使用默认值。
+
+在程序中直接赋值（config.FONT_PATH = ...）会覆盖配置文件中的值，例如 benchmark.py --font。
+"""
 import json
 import os
 import sys
 import platform
+import tempfile
+import threading
+import time
+from collections import deque
+from functools import lru_cache
 
 CONFIG_FILE = "settings.json"
 
+# 检查配置文件是否被修改的最短间隔（秒），避免每次访问配置都读取文件状态
+RELOAD_CHECK_INTERVAL = 1.0
+# 保留的最近警告数量
+RECENT_WARNINGS_SIZE = 20
+
+_recent_warnings = deque(maxlen=RECENT_WARNINGS_SIZE)
+_warning_handler = None
+_warning_lock = threading.Lock()
+
 # 获取当前文件所在目录的绝对路径
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # 默认logo路径
-DEFAULT_LOGO = os.path.join(CURRENT_DIR, "logo.png")
+DEFAULT_LOGO_PATH = os.path.join(CURRENT_DIR, "logo.png")
 
-# 根据操作系统选择默认字体
+def user_cache_dir():
+    """系统的用户缓存目录下的 bedoya 目录（渲染缓存、字体索引）"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "bedoya")
+
+# 从系统字体索引中选择默认字体（只查找一次）
+@lru_cache(maxsize=1)
 def get_default_font_path():
-    system = platform.system()
-    if system == "Windows":
-        font_paths = [
-            "C:\\Windows\\Fonts\\simhei.ttf",  # 黑体
-            "C:\\Windows\\Fonts\\msyh.ttc",    # 微软雅黑
-            "C:\\Windows\\Fonts\\simsun.ttc"   # 宋体
-        ]
-    elif system == "Darwin":  # macOS
-        font_paths = [
-            "/System/Library/Fonts/PingFang.ttc",
-            "/System/Library/Fonts/STHeiti Light.ttc",
-            "/System/Library/Fonts/STHeiti Medium.ttc"
-        ]
-    else:  # Linux
-        font_paths = [
-            "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
-            "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
-            "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc"
-        ]
+    """能显示中文标签的最佳字体，没有任何可用字体时返回空字符串（使用PIL默认字体）"""
+    import font_index
     
-    # 返回第一个存在的字体文件路径
-    for path in font_paths:
-        if os.path.exists(path):
-            return path
-            
-    # 如果没有找到合适的字体，返回默认值
-    return "C:\\Windows\\Fonts\\simhei.ttf"
-
-# 默认字体路径
-FONT_PATH = get_default_font_path()
+    face = font_index.best_face()
+    if face is None:
+        # 没有安装fonttools时无法读取字体信息，按固定路径查找
+        system = platform.system()
+        if system == "Windows":
+            font_paths = [
+                "C:\\Windows\\Fonts\\simhei.ttf",  # 黑体
+                "C:\\Windows\\Fonts\\msyh.ttc",    # 微软雅黑
+                "C:\\Windows\\Fonts\\simsun.ttc"   # 宋体
+            ]
+        elif system == "Darwin":  # macOS
+            font_paths = [
+                "/System/Library/Fonts/PingFang.ttc",
+                "/System/Library/Fonts/STHeiti Light.ttc",
+                "/System/Library/Fonts/STHeiti Medium.ttc"
+            ]
+        else:  # Linux
+            font_paths = [
+                "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
+                "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+                "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc"
+            ]
+        return next((path for path in font_paths if os.path.exists(path)), "")
+    
+    if not font_index.cjk_faces():
+        warn(f"没有找到支持中文的字体，中文姓名将无法显示，暂时使用 {face[0]}")
+    return face[0]
 
 # 默认图片尺寸
 DEFAULT_SIZE = (800, 400)  # 宽度800像素，高度400像素
 
 # 默认配置
 DEFAULT_CONFIG = {
-    "DEFAULT_LOGO": DEFAULT_LOGO,  # 默认logo路径
+    "DEFAULT_LOGO": DEFAULT_LOGO_PATH,  # 默认logo路径
     
     # 纸张尺寸（单位：毫米，横向）
     "PAPER_SIZES": {
@@ -72,49 +110,292 @@ DEFAULT_CONFIG = {
     ],
     
     # 二维码默认设置
-    "QR_CODE_SIZE_PERCENT": 15,    # 二维码大小（相对于纸张短边的百分比）
+    "QR_CODE_SIZE_PERCENT": 8,     # 二维码大小（相对于纸张短边的百分比，5-20），界面、命令行和服务的默认值
     "QR_MARGIN": 20,       # 二维码到纸张边缘的距离（毫米）
     "QR_NAME_FONT_SIZE": 24,  # 二维码下方姓名的字体大小
     
-    # Logo默认设置
-    "LOGO_SIZE_PERCENT": 12,       # Logo大小（相对于纸张短边的百分比）
+    # Logo默认设置（Logo大小由布局决定：标准布局与二维码等宽，全画幅布局占45%宽度）
     "LOGO_MARGIN": 20,     # Logo到纸张边缘的距离（毫米）
     
     # 字体设置
     "FONT_SIZE": 24,       # 姓名字体大小
-    "FONT_PATH": FONT_PATH  # 默认字体
+    "FONT_PATH": "",       # 字体文件，留空则自动查找系统中文字体
+    
+    # 输出设置
+    "PRINT_DPI": 300,      # 打印和保存图片的分辨率
+    
+    # 热敏标签打印机直连（ZPL/ESC-POS，原始TCP端口9100），留空则使用系统打印
+    "LABEL_PRINTER": "",             # 打印机地址，如 "192.168.1.50" 或 "192.168.1.50:9100"
+    "LABEL_PRINTER_LANGUAGE": "zpl", # zpl 或 escpos
+    "LABEL_PRINTER_DPI": 203,        # 打印机分辨率（8点/毫米为203，12点/毫米为300）
+    
+    # 系统打印（CUPS lp/lpr），打印机名称留空则使用默认打印机
+    "PRINTER_NAME": "",
+    # 自定义打印命令（留空则自动选择lp/lpr），可使用 {file} {copies} {printer} {title}
+    "PRINT_COMMAND": "",
+    
+    # 磁盘渲染缓存：相同输入的标签直接复制上次的输出，目录留空则使用系统的用户缓存目录
+    "RENDER_CACHE": True,
+    "RENDER_CACHE_DIR": "",
+    "RENDER_CACHE_MAX_MB": 512
 }
 
-def load_config():
-    """加载配置文件"""
-    if os.path.exists(CONFIG_FILE):
+# 旧版本的配置项名称
+LEGACY_KEYS = {
+    "QR_CODE_SIZE": "QR_CODE_SIZE_PERCENT",
+}
+
+# 不再支持的配置项及原因
+UNSUPPORTED_KEYS = {
+    "LOGO_SIZE": "Logo大小由布局决定（标准布局与二维码等宽，全画幅布局占45%宽度）",
+    "LOGO_SIZE_PERCENT": "Logo大小由布局决定（标准布局与二维码等宽，全画幅布局占45%宽度）",
+}
+
+
+def _number(minimum=None, maximum=None):
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError("应为数字")
+        if minimum is not None and value < minimum or maximum is not None and value > maximum:
+            raise ValueError(f"应在{minimum}-{maximum}之间" if maximum is not None else f"不能小于{minimum}")
+        return value
+    return check
+
+
+def _integer(minimum=None, maximum=None):
+    check_number = _number(minimum, maximum)
+
+    def check(value):
+        if not isinstance(value, int):
+            raise ValueError("应为整数")
+        return check_number(value)
+    return check
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise ValueError("应为字符串")
+    return value
+
+
+def _boolean(value):
+    if not isinstance(value, bool):
+        raise ValueError("应为 true 或 false")
+    return value
+
+
+def _choice(*choices):
+    def check(value):
+        if value not in choices:
+            raise ValueError(f"应为 {' / '.join(choices)} 之一")
+        return value
+    return check
+
+
+def _paper_sizes(value):
+    if not isinstance(value, dict):
+        raise ValueError("应为 名称: [宽, 高] 的字典")
+    sizes = {}
+    for name, size in value.items():
+        if not (isinstance(size, (list, tuple)) and len(size) == 2 and
+                all(isinstance(v, (int, float)) and not isinstance(v, bool) and v > 0 for v in size)):
+            raise ValueError(f"{name} 应为 [宽, 高]（毫米）")
+        sizes[name] = tuple(size)
+    return sizes
+
+
+def _size_list(value):
+    if not isinstance(value, list):
+        raise ValueError("应为尺寸列表")
+    for size in value:
+        if not (isinstance(size, dict) and all(
+                isinstance(size.get(key), (int, float)) and not isinstance(size[key], bool) and size[key] > 0
+                for key in ("width", "height"))):
+            raise ValueError("每个尺寸应为 {\"width\": 宽, \"height\": 高}（毫米）")
+    return value
+
+
+# 配置项的校验函数，返回规范化后的值，不合法时抛出ValueError
+SCHEMA = {
+    "DEFAULT_LOGO": _string,
+    "PAPER_SIZES": _paper_sizes,
+    "LABEL_PRINTER_SIZES": _size_list,
+    "LABEL_SIZES": _size_list,
+    "QR_CODE_SIZE_PERCENT": _number(5, 20),
+    "QR_MARGIN": _number(0),
+    "QR_NAME_FONT_SIZE": _integer(1),
+    "LOGO_MARGIN": _number(0),
+    "FONT_SIZE": _integer(1),
+    "FONT_PATH": _string,
+    "PRINT_DPI": _number(1, 1200),
+    "LABEL_PRINTER": _string,
+    "LABEL_PRINTER_LANGUAGE": _choice("zpl", "escpos"),
+    "LABEL_PRINTER_DPI": _number(1, 1200),
+    "PRINTER_NAME": _string,
+    "PRINT_COMMAND": _string,
+    "RENDER_CACHE": _boolean,
+    "RENDER_CACHE_DIR": _string,
+    "RENDER_CACHE_MAX_MB": _number(0),
+}
+
+
+def warn(message):
+    """报告配置和字体的问题：默认输出到标准错误，注册了处理函数（界面状态栏）时交给处理函数
+
+    可能在后台线程中调用（如字体扫描），处理函数需要自己切换到界面线程。
+    """
+    with _warning_lock:
+        _recent_warnings.append(message)
+        handler = _warning_handler
+    if handler is None:
+        print(f"警告: {message}", file=sys.stderr)
+    else:
+        handler(message)
+
+
+def set_warning_handler(handler):
+    """注册接收警告的函数，None表示输出到标准错误，返回之前的处理函数"""
+    global _warning_handler
+    with _warning_lock:
+        previous, _warning_handler = _warning_handler, handler
+    return previous
+
+
+def recent_warnings():
+    """最近的警告（按时间顺序），界面启动前产生的警告也可以补充显示"""
+    with _warning_lock:
+        return list(_recent_warnings)
+
+
+def validate_config(values, source=CONFIG_FILE):
+    """校验配置文件中的值并与默认配置合并，不合法的配置项给出提示并使用默认值"""
+    config = dict(DEFAULT_CONFIG)
+    for key, value in values.items():
+        if key in UNSUPPORTED_KEYS:
+            warn(f"{source} 中的 {key} 不再支持：{UNSUPPORTED_KEYS[key]}，已忽略，请从配置文件中删除")
+            continue
+        if key in LEGACY_KEYS:
+            new_key = LEGACY_KEYS[key]
+            warn(f"{source} 中的 {key} 已更名为 {new_key}，请修改配置文件")
+            if new_key in values:
+                continue
+            key = new_key
+        check = SCHEMA.get(key)
+        if check is None:
+            warn(f"{source} 中有未知的配置项 {key}，已忽略")
+            continue
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return {**DEFAULT_CONFIG, **json.load(f)}
-        except:
-            return DEFAULT_CONFIG
-    return DEFAULT_CONFIG
+            config[key] = check(value)
+        except ValueError as e:
+            warn(f"{source} 中的 {key} {e}，使用默认值 {DEFAULT_CONFIG[key]!r}")
+    return config
+
+
+def find_config_file():
+    """配置文件路径：先查找当前目录，再查找程序目录，都不存在时返回None"""
+    for directory in (os.getcwd(), CURRENT_DIR):
+        path = os.path.join(directory, CONFIG_FILE)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+class Settings:
+    """延迟加载的配置，文件修改后自动重新加载（线程安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = None
+        self.path = None
+        self.stamp = None
+        self.checked = 0.0
+        self.loads = 0
+
+    def current(self):
+        """返回当前配置字典，距上次检查超过 RELOAD_CHECK_INTERVAL 时检查文件是否被修改"""
+        values = self.values
+        if values is not None and time.monotonic() - self.checked < RELOAD_CHECK_INTERVAL:
+            return values
+        with self.lock:
+            self.checked = time.monotonic()
+            path = find_config_file()
+            stamp = _file_stamp(path)
+            if self.values is None or (path, stamp) != (self.path, self.stamp):
+                self.values = self._load(path)
+                self.path, self.stamp = path, stamp
+                self.loads += 1
+            return self.values
+
+    def invalidate(self):
+        """下次访问时重新检查配置文件"""
+        self.checked = 0.0
+
+    def _load(self, path):
+        if path is None:
+            return validate_config({})
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                values = json.load(f)
+            if not isinstance(values, dict):
+                raise ValueError("顶层应为对象")
+        except (OSError, ValueError) as e:
+            warn(f"无法读取 {path}（{e}），使用默认配置")
+            # 文件正在被写入时可能读到不完整的内容，下次访问再检查
+            self.checked = 0.0
+            return self.values if self.values is not None else validate_config({})
+        return validate_config(values, path)
+
+
+def _file_stamp(path):
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+settings = Settings()
+
+
+def load_config():
+    """返回当前的完整配置（字典）"""
+    config = dict(settings.current())
+    if not config["FONT_PATH"]:
+        config["FONT_PATH"] = get_default_font_path()
+    return config
+
 
 def save_config(config):
-    """保存配置文件"""
+    """保存配置文件（保存到正在使用的配置文件，没有时保存到当前目录）
+
+    先写入同一目录下的临时文件再替换，其他进程或自动重新加载不会读到写了一半的文件。
+    """
+    path = os.path.abspath(settings.path or CONFIG_FILE)
+    temp_path = None
     try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, path)
     except Exception as e:
         print(f"保存配置失败: {e}")
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+    settings.invalidate()
+
+
+def __getattr__(name):
+    """配置项按需从当前配置中读取（PEP 562）"""
+    values = settings.current()
+    if name == "FONT_PATH":
+        # 默认字体只在用到时查找，读取其他配置项不会等待字体扫描
+        return values[name] or get_default_font_path()
+    if name in values:
+        return values[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-# 加载配置
-config = load_config()
-
-# 导出配置项
-DEFAULT_LOGO = config["DEFAULT_LOGO"]
-PAPER_SIZES = config["PAPER_SIZES"]
-LABEL_PRINTER_SIZES = config["LABEL_PRINTER_SIZES"]
-LABEL_SIZES = config["LABEL_SIZES"]
-QR_CODE_SIZE_PERCENT = config["QR_CODE_SIZE_PERCENT"]
-QR_MARGIN = config["QR_MARGIN"]
-QR_NAME_FONT_SIZE = config["QR_NAME_FONT_SIZE"]
-LOGO_SIZE_PERCENT = config["LOGO_SIZE_PERCENT"]
-LOGO_MARGIN = config["LOGO_MARGIN"]
-FONT_SIZE = config["FONT_SIZE"]
-FONT_PATH = config["FONT_PATH"]
+def __dir__():
+    return sorted(set(globals()) | set(DEFAULT_CONFIG))
@@ -0,0 +1,66 @@
+"""FreeType字体对象缓存
+
+打开大型中文字体文件（几十MB的TTC）需要几十毫秒，按(字体路径, 字号, 字形集)缓存后，
+同一进程中的所有渲染共用字体对象。qr_generator、text_layout 和各导出模块都从这里获取字体。
+"""
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+import config
+from font_index import face_index
+
+# 字体缓存的最大条目数（不同路径/字号的组合）
+FONT_CACHE_SIZE = 32
+
+_font_cache = OrderedDict()
+_font_cache_lock = threading.Lock()
+_font_cache_stats = {"hits": 0, "misses": 0}
+
+
+def get_font(font_size, font_path=None, index=None):
+    """获取字体对象，按(字体路径, 字号, 字体索引)缓存
+
+    index 为None时由字体索引确定（字体集合中能显示中文标签的字形集）。
+    没有配置字体或字体文件无法加载时回退到默认字体，回退结果同样会被缓存，避免每次渲染都重新尝试。
+    """
+    if font_path is None:
+        font_path = config.FONT_PATH
+    if index is None:
+        index = face_index(font_path)
+    key = (font_path, font_size, index)
+
+    with _font_cache_lock:
+        font = _font_cache.get(key)
+        if font is not None:
+            _font_cache.move_to_end(key)
+            _font_cache_stats["hits"] += 1
+            return font
+        _font_cache_stats["misses"] += 1
+
+    try:
+        font = ImageFont.truetype(font_path, font_size, index=index) if font_path else ImageFont.load_default()
+    except Exception:
+        font = ImageFont.load_default()
+
+    with _font_cache_lock:
+        _font_cache[key] = font
+        _font_cache.move_to_end(key)
+        while len(_font_cache) > FONT_CACHE_SIZE:
+            _font_cache.popitem(last=False)
+    return font
+
+
+def font_cache_info():
+    """返回字体缓存的命中统计"""
+    with _font_cache_lock:
+        return {**_font_cache_stats, "size": len(_font_cache), "maxsize": FONT_CACHE_SIZE}
+
+
+def clear_font_cache():
+    """清空字体缓存及统计"""
+    with _font_cache_lock:
+        _font_cache.clear()
+        _font_cache_stats["hits"] = 0
+        _font_cache_stats["misses"] = 0
@@ -0,0 +1,229 @@
+"""系统字体索引：扫描一次系统字体目录，记录每个字体（含TTC中的每个字形集）的字族和中文覆盖情况
+
+索引保存在用户缓存目录的 fonts.json 中，以扫描过的所有目录的修改时间和 fontTools 版本作为有效性依据，
+安装或删除字体、安装或升级 fontTools 后自动重新扫描（没有 fontTools 时读不到字体信息，扫描结果不保存）；之后的启动只需要读取索引和检查目录状态（几毫秒）。
+渲染代码通过 best_face() 和 face_index() 查找字体，不再逐个尝试打开字体文件。
+
+用法:
+    python -m bedoya fonts             # 列出支持中文标签的字体
+    python -m bedoya fonts --refresh   # 重新扫描
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+
+# 索引格式版本，记录的内容变化时加1（旧索引会被重新扫描）
+INDEX_VERSION = 2
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc")
+# 标签文字固定部分需要的字符
+LABEL_CHARS = "姓名：ID主题0123456789"
+# 常见姓氏和名字用字，用于比较各字体对中文姓名的覆盖率
+COMMON_NAME_CHARS = (
+    "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁"
+    "任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴"
+    "莫孔向汤欧阳司马上官诸葛伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰文辉建国红梅鑫宇浩然"
+    "子涵梓萱诗琪欣怡雨轩博文俊熙晨皓"
+)
+# 优先使用的字体文件（与以前按固定路径查找时的顺序相同，已有环境的输出保持不变）
+PREFERRED_FONTS = (
+    "simhei.ttf", "msyh.ttc", "simsun.ttc",
+    "pingfang.ttc", "stheiti light.ttc", "stheiti medium.ttc",
+    "droidsansfallbackfull.ttf", "wqy-microhei.ttc", "wqy-zenhei.ttc",
+)
+REGULAR_STYLES = ("regular", "normal", "book", "roman", "medium")
+
+_index = None
+_index_lock = threading.Lock()
+_face_indexes = {}
+
+
+def font_dirs():
+    """当前系统的字体目录"""
+    home = os.path.expanduser("~")
+    if os.name == "nt":
+        windir = os.environ.get("WINDIR", "C:\\Windows")
+        local = os.environ.get("LOCALAPPDATA") or os.path.join(home, "AppData", "Local")
+        return [os.path.join(windir, "Fonts"), os.path.join(local, "Microsoft", "Windows", "Fonts")]
+    if sys.platform == "darwin":
+        return ["/System/Library/Fonts", "/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(home, ".local", "share")
+    return ["/usr/share/fonts", "/usr/local/share/fonts", os.path.join(data_home, "fonts"),
+            os.path.join(home, ".fonts")]
+
+
+def index_path():
+    import config
+    return os.path.join(config.user_cache_dir(), "fonts.json")
+
+
+def fonttools_version():
+    """已安装的 fontTools 版本，没有安装时返回None"""
+    try:
+        import fontTools
+    except ImportError:
+        return None
+    return getattr(fontTools, "version", "unknown")
+
+
+def scan_font_file(path):
+    """读取字体文件中每个字形集的字族、样式和中文覆盖情况，无法读取时返回空列表"""
+    try:
+        from fontTools.ttLib import TTFont, TTCollection
+    except ImportError:
+        return []
+
+    faces = []
+    try:
+        if path.lower().endswith((".ttc", ".otc")):
+            with TTCollection(path, lazy=True) as collection:
+                fonts = list(collection.fonts)
+                faces = [_describe(path, index, font) for index, font in enumerate(fonts)]
+        else:
+            with TTFont(path, lazy=True) as font:
+                faces = [_describe(path, 0, font)]
+    except Exception:
+        return []
+    return [face for face in faces if face]
+
+
+def _describe(path, index, font):
+    try:
+        cmap = font.getBestCmap() or {}
+        name = font["name"]
+        family = name.getBestFamilyName() or os.path.basename(path)
+        style = name.getBestSubFamilyName() or ""
+    except Exception:
+        return None
+    return {
+        "path": path,
+        "index": index,
+        "family": str(family),
+        "style": str(style),
+        "label": all(ord(char) in cmap for char in LABEL_CHARS),
+        "names": round(sum(ord(char) in cmap for char in COMMON_NAME_CHARS) / len(COMMON_NAME_CHARS), 3),
+    }
+
+
+def _dir_stamp(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def scan_fonts(roots=None):
+    """扫描字体目录，返回索引（字体列表和所有扫描过的目录的修改时间）"""
+    roots = [root for root in (roots or font_dirs()) if os.path.isdir(root)]
+    dirs = {}
+    faces = []
+    for root in roots:
+        for directory, _, files in os.walk(root):
+            dirs[directory] = _dir_stamp(directory)
+            for file_name in sorted(files):
+                if file_name.lower().endswith(FONT_EXTENSIONS):
+                    faces.extend(scan_font_file(os.path.join(directory, file_name)))
+    return {"version": INDEX_VERSION, "fonttools": fonttools_version(), "roots": roots, "dirs": dirs,
+            "faces": faces}
+
+
+def _is_current(index, roots):
+    """索引是否仍然有效：版本和 fontTools 版本相同，字体目录没有增减，扫描过的目录都没有被修改"""
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return False
+    if index.get("fonttools") is None or index["fonttools"] != fonttools_version():
+        return False
+    if index.get("roots") != [root for root in roots if os.path.isdir(root)]:
+        return False
+    return all(_dir_stamp(directory) == stamp for directory, stamp in index.get("dirs", {}).items())
+
+
+def _read_index(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_index(index, path):
+    """原子地写入索引文件，失败时只是下次重新扫描"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError as e:
+        import config
+        config.warn(f"无法保存字体索引: {e}")
+
+
+def load_index(refresh=False, scan=True):
+    """返回字体索引，本进程只检查一次；缓存文件无效或 refresh 为True时重新扫描
+
+    scan 为False时缓存文件无效也不扫描，返回None。
+    """
+    global _index
+    with _index_lock:
+        if _index is not None and not refresh:
+            return _index
+        roots = font_dirs()
+        path = index_path()
+        index = None if refresh else _read_index(path)
+        if not _is_current(index, roots):
+            if not scan:
+                return None
+            index = scan_fonts(roots)
+            # 没有 fontTools 时索引是空的，不保存，安装后下次启动即可扫描
+            if index["fonttools"] is not None:
+                _write_index(index, path)
+        _index = index
+        _face_indexes.clear()
+        return index
+
+
+def _rank(face):
+    """字体的优先级：覆盖标签文字 > 优先字体文件 > 姓名用字覆盖率 > 常规字重 > 字形集序号小"""
+    file_name = os.path.basename(face["path"]).lower()
+    preferred = PREFERRED_FONTS.index(file_name) if file_name in PREFERRED_FONTS else len(PREFERRED_FONTS)
+    return (face["label"], -preferred, face["names"], face["style"].lower() in REGULAR_STYLES,
+            -face["index"])
+
+
+def best_face(faces=None):
+    """最适合标签的字体 (路径, 字形集序号)，没有任何字体时返回None"""
+    if faces is None:
+        faces = load_index()["faces"]
+    if not faces:
+        return None
+    face = max(faces, key=_rank)
+    return face["path"], face["index"]
+
+
+def face_index(font_path):
+    """字体文件中用于标签的字形集序号
+
+    单个字体文件为0；字体集合（TTC）中第0个能显示标签文字时使用第0个，否则使用覆盖最好的一个。
+    """
+    if not font_path or not font_path.lower().endswith((".ttc", ".otc")):
+        return 0
+    index = _face_indexes.get(font_path)
+    if index is not None:
+        return index
+    system_index = load_index(scan=False)
+    faces = [face for face in system_index["faces"] if face["path"] == font_path] if system_index else []
+    if not faces:
+        faces = scan_font_file(font_path)
+    if not faces or faces[0]["label"]:
+        index = 0
+    else:
+        index = best_face(faces)[1]
+    _face_indexes[font_path] = index
+    return index
+
+
+def cjk_faces():
+    """能显示标签文字的字体，按优先级排序"""
+    return sorted((face for face in load_index()["faces"] if face["label"]), key=_rank, reverse=True)
@@ -0,0 +1,187 @@
+import os
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+import config
+from qr_generator import render_label_tile, mm_to_pixels
+
+# 拼版时缓存的不同标签数量（同一学生的多份只渲染一次）
+LABEL_CACHE_SIZE = 64
+
+
+def grid_layout(sheet_size_mm, label_size_mm, gutter_mm=2, margin_mm=5, dpi=300):
+    """计算一张纸上能排下的标签网格，返回 (列数, 行数, 每个格子左上角的像素坐标列表)"""
+    sheet_width, sheet_height = (mm_to_pixels(v, dpi) for v in sheet_size_mm)
+    label_width, label_height = (mm_to_pixels(v, dpi) for v in label_size_mm)
+    gutter = mm_to_pixels(gutter_mm, dpi)
+    margin = mm_to_pixels(margin_mm, dpi)
+
+    usable_width = sheet_width - 2 * margin
+    usable_height = sheet_height - 2 * margin
+    cols = max(0, (usable_width + gutter) // (label_width + gutter))
+    rows = max(0, (usable_height + gutter) // (label_height + gutter))
+    if cols == 0 or rows == 0:
+        raise ValueError(f"标签尺寸{label_size_mm}超出纸张可用区域{sheet_size_mm}")
+
+    # 网格在纸面上居中
+    grid_width = cols * label_width + (cols - 1) * gutter
+    grid_height = rows * label_height + (rows - 1) * gutter
+    origin_x = (sheet_width - grid_width) // 2
+    origin_y = (sheet_height - grid_height) // 2
+
+    positions = [
+        (origin_x + col * (label_width + gutter), origin_y + row * (label_height + gutter))
+        for row in range(rows)
+        for col in range(cols)
+    ]
+    return cols, rows, positions
+
+
+def cut_mark_lines(cols, rows, positions, label_size_px, sheet_size_px, dpi=300):
+    """计算网格外侧页边距中的裁切线，返回线段列表 [((x0, y0), (x1, y1)), ...]"""
+    label_width, label_height = label_size_px
+    sheet_width, sheet_height = sheet_size_px
+    left, top = positions[0]
+    right = positions[cols - 1][0] + label_width
+    bottom = positions[-1][1] + label_height
+
+    gap = mm_to_pixels(1, dpi)          # 标记与标签之间的空隙
+    length = mm_to_pixels(3, dpi)       # 标记长度
+
+    lines = []
+    # 每列的左右边界在上下页边距中画竖线
+    for col in range(cols):
+        x0 = positions[col][0]
+        for x in (x0, x0 + label_width - 1):
+            lines.append(((x, max(0, top - gap - length)), (x, max(0, top - gap))))
+            lines.append(((x, min(sheet_height - 1, bottom + gap)),
+                          (x, min(sheet_height - 1, bottom + gap + length))))
+    # 每行的上下边界在左右页边距中画横线
+    for row in range(rows):
+        y0 = positions[row * cols][1]
+        for y in (y0, y0 + label_height - 1):
+            lines.append(((max(0, left - gap - length), y), (max(0, left - gap), y)))
+            lines.append(((min(sheet_width - 1, right + gap), y),
+                          (min(sheet_width - 1, right + gap + length), y)))
+    return lines
+
+
+def cut_mark_width(dpi=300):
+    """裁切线线宽（像素）"""
+    return max(1, mm_to_pixels(0.1, dpi))
+
+
+def draw_cut_marks(image, cols, rows, positions, label_size_px, dpi=300):
+    """在网格外侧的页边距中绘制裁切线标记"""
+    draw = ImageDraw.Draw(image)
+    line_width = cut_mark_width(dpi)
+    for start, end in cut_mark_lines(cols, rows, positions, label_size_px, image.size, dpi):
+        draw.line([start, end], fill="black", width=line_width)
+
+
+def _expand_copies(labels):
+    """按份数展开标签列表"""
+    for label in labels:
+        for _ in range(int(label.get("copies", 1))):
+            yield label
+
+
+def impose_labels(labels, sheet_size_mm=None, label_size_mm=(40, 20), gutter_mm=2, margin_mm=5,
+                  cut_marks=True, qr_size_percent=None, logo_path=None, dpi=300, mode="RGB",
+                  logo_threshold=None, failures=None):
+    """将多个标签拼排到A4/A3纸上，逐张生成整页图像
+
+    labels 为字典列表，包含 student_id、name，可选 subject、copies 和 line（花名册行号）。
+    每个不同的标签只渲染一次，之后直接粘贴到各个格子中。
+    mode 为"1"时整页为1位黑白图像。
+    生成失败的标签不会中断整批：对应的格子留空，错误以 {"line", "record", "error"} 追加到 failures 中。
+    """
+    if sheet_size_mm is None:
+        sheet_size_mm = config.PAPER_SIZES["A4"]
+    cols, rows, positions = grid_layout(sheet_size_mm, label_size_mm, gutter_mm, margin_mm, dpi)
+    sheet_size = tuple(mm_to_pixels(v, dpi) for v in sheet_size_mm)
+    label_size_px = tuple(mm_to_pixels(v, dpi) for v in label_size_mm)
+
+    cache = OrderedDict()
+    # 生成失败的标签（同一标签的其他份数不再重试）
+    failed = set()
+    sheet = None
+    cell = 0
+    for label in _expand_copies(labels):
+        key = (label["student_id"], label["name"], label.get("subject") or None)
+        image = cache.get(key)
+        if image is None and key not in failed:
+            try:
+                tile = render_label_tile(label["student_id"], label["name"], paper_size_mm=label_size_mm,
+                                         qr_size_percent=qr_size_percent, logo_path=logo_path,
+                                         subject=key[2], dpi=dpi, mode=mode, logo_threshold=logo_threshold)
+                if tile is None:
+                    raise ValueError(f"生成标签失败: {label['name']}_{label['student_id']}")
+                image = tile.to_image()
+            except Exception as e:
+                failed.add(key)
+                if failures is not None:
+                    failures.append({"line": label.get("line"), "record": label, "error": str(e)})
+            else:
+                cache[key] = image
+                while len(cache) > LABEL_CACHE_SIZE:
+                    cache.popitem(last=False)
+        elif image is not None:
+            cache.move_to_end(key)
+
+        if sheet is None:
+            sheet = Image.new(mode, sheet_size, "white")
+        if image is not None:
+            sheet.paste(image, positions[cell])
+        cell += 1
+
+        if cell == len(positions):
+            if cut_marks:
+                draw_cut_marks(sheet, cols, rows, positions, label_size_px, dpi)
+            yield sheet
+            sheet = None
+            cell = 0
+
+    if sheet is not None:
+        if cut_marks:
+            draw_cut_marks(sheet, cols, rows, positions, label_size_px, dpi)
+        yield sheet
+
+
+def impose_roster(roster, output_dir, sheet_size_mm=None, label_size_mm=(40, 20), gutter_mm=2,
+                  margin_mm=5, cut_marks=True, qr_size_percent=None, logo_path=None, dpi=300, fmt="png",
+                  mode="RGB", logo_threshold=None):
+    """将花名册拼版输出为若干张整页图像（fmt为svg时输出矢量SVG），返回 (输出文件列表, 错误列表)
+
+    错误列表包含花名册中无效的行和生成失败的标签（其格子留空）。
+    """
+    from batch import read_roster, build_jobs
+
+    records = read_roster(roster) if isinstance(roster, (str, os.PathLike)) else roster
+    jobs, errors = build_jobs(records)
+    os.makedirs(output_dir, exist_ok=True)
+
+    outputs = []
+    if fmt == "svg":
+        from svg_export import render_sheet_svg, save_svg
+        if sheet_size_mm is None:
+            sheet_size_mm = config.PAPER_SIZES["A4"]
+        per_sheet = len(grid_layout(sheet_size_mm, label_size_mm, gutter_mm, margin_mm)[2])
+        cells = list(_expand_copies(jobs))
+        for index in range(0, len(cells), per_sheet):
+            output_path = os.path.join(output_dir, f"sheet_{index // per_sheet + 1:03d}.svg")
+            save_svg(render_sheet_svg(cells[index:index + per_sheet], sheet_size_mm, label_size_mm,
+                                      gutter_mm, margin_mm, cut_marks, qr_size_percent, logo_path), output_path)
+            outputs.append(output_path)
+        return outputs, errors
+
+    failures = []
+    sheets = impose_labels(jobs, sheet_size_mm, label_size_mm, gutter_mm, margin_mm, cut_marks,
+                           qr_size_percent, logo_path, dpi, mode, logo_threshold, failures)
+    for index, sheet in enumerate(sheets, start=1):
+        output_path = os.path.join(output_dir, f"sheet_{index:03d}.{fmt}")
+        params = {"compression": "group4"} if fmt == "tiff" and mode == "1" else {}
+        sheet.save(output_path, fmt.upper().replace("JPG", "JPEG"), dpi=(dpi, dpi), **params)
+        outputs.append(output_path)
+    errors.extend(failures)
+    errors.sort(key=lambda error: error["line"] or 0)
+    return outputs, errors
@@ -0,0 +1,286 @@
+"""热敏标签打印机直连输出（ZPL / ESC/POS，原始TCP端口9100）
+
+标签按打印机分辨率直接渲染为1位黑白图像，编码为：
+- ZPL：^GFA 图形字段，数据为 Z64（zlib压缩 + Base64 + CRC16校验），份数用 ^PQ 由打印机处理
+- ESC/POS：GS v 0 光栅位图，按条带发送，每份之后走纸切纸
+
+一个 RawPrinter 连接在整个批次中复用。FakePrinterServer 在本地记录收到的字节，
+用于在没有打印机时检查输出。
+
+用法:
+    python -m bedoya print --printer 192.168.1.50 --name 江龙 --id 3436676 --paper 40x20
+    python -m bedoya print --printer 192.168.1.50:9100 --roster 花名册.csv --language escpos
+"""
+import base64
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+
+RAW_PRINT_PORT = 9100
+# 热敏标签打印机常见分辨率（8点/毫米）
+DEFAULT_PRINTER_DPI = 203
+PRINTER_LANGUAGES = ("zpl", "escpos")
+# ESC/POS 每个光栅条带的最大行数（部分打印机的缓冲区有限）
+ESCPOS_BAND_ROWS = 256
+
+_INVERT = bytes(255 - value for value in range(256))
+
+
+def packed_rows(image):
+    """将图像转换为按行打包的位数据（1为黑点），返回 (每行字节数, 高度, 数据)"""
+    if image.mode != "1":
+        image = image.convert("1")
+    width, height = image.size
+    # PIL的1位图像中1为白色，打印机中1为黑点，取反；每行按字节对齐补0（白）
+    data = image.tobytes().translate(_INVERT)
+    bytes_per_row = (width + 7) // 8
+    padding = bytes_per_row * 8 - width
+    if padding:
+        # 行尾补位取反后变成了黑点，清除掉
+        mask = (0xFF << padding) & 0xFF
+        rows = bytearray(data)
+        for end in range(bytes_per_row - 1, len(rows), bytes_per_row):
+            rows[end] &= mask
+        data = bytes(rows)
+    return bytes_per_row, height, data
+
+
+def crc16_ccitt(data, crc=0x0000):
+    """ZPL Z64 使用的 CRC-16/XMODEM 校验"""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return crc
+
+
+def zpl_graphic_field(image):
+    """生成 ^GFA 图形字段（Z64压缩）"""
+    bytes_per_row, height, data = packed_rows(image)
+    encoded = base64.b64encode(zlib.compress(data, 9))
+    crc = crc16_ccitt(encoded)
+    total = bytes_per_row * height
+    return (f"^GFA,{total},{total},{bytes_per_row},:Z64:".encode("ascii") + encoded +
+            f":{crc:04X}".encode("ascii"))
+
+
+def zpl_label(image, copies=1):
+    """单个标签的完整ZPL，份数由打印机复制（^PQ），不重复发送图像"""
+    width, height = image.size
+    return (f"^XA^PW{width}^LL{height}^LH0,0^FO0,0".encode("ascii") + zpl_graphic_field(image) +
+            f"^FS^PQ{max(1, int(copies))}^XZ\n".encode("ascii"))
+
+
+def escpos_label(image, copies=1, feed_lines=3, cut=True):
+    """单个标签的ESC/POS光栅指令，ESC/POS没有份数指令，每份重复发送"""
+    bytes_per_row, height, data = packed_rows(image)
+    body = bytearray(b"\x1b@")  # 初始化打印机
+    for top in range(0, height, ESCPOS_BAND_ROWS):
+        rows = min(ESCPOS_BAND_ROWS, height - top)
+        body += b"\x1dv0\x00" + struct.pack("<HH", bytes_per_row, rows)
+        body += data[top * bytes_per_row:(top + rows) * bytes_per_row]
+    body += b"\x1bd" + bytes([feed_lines])
+    if cut:
+        body += b"\x1dVB\x00"  # 走纸后部分切纸
+    return bytes(body) * max(1, int(copies))
+
+
+def encode_label(image, language="zpl", copies=1):
+    """按打印机语言编码标签"""
+    if language == "zpl":
+        return zpl_label(image, copies)
+    if language == "escpos":
+        return escpos_label(image, copies)
+    raise ValueError(f"不支持的打印机语言: {language}")
+
+
+def parse_printer_address(value, default_port=RAW_PRINT_PORT):
+    """解析 "主机" 或 "主机:端口" """
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit() and host:
+        return host.strip("[]"), int(port)
+    return value, default_port
+
+
+class RawPrinter:
+    """原始TCP打印连接（端口9100），首次发送时连接，之后在整个批次中复用
+
+    连接被打印机关闭时自动重连一次，但只在这个标签还没有发出任何字节时重试：
+    已经发出一部分后再整段重发，打印机可能打出重复或错乱的标签，这时抛出 ConnectionError。
+    """
+
+    def __init__(self, host, port=RAW_PRINT_PORT, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.connections = 0
+        self.bytes_sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def connect(self):
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections += 1
+        return self.sock
+
+    def send(self, data):
+        view = memoryview(data)
+        for attempt in (1, 2):
+            sent = 0
+            try:
+                sock = self.connect()
+                while sent < len(view):
+                    sent += sock.send(view[sent:])
+                self.bytes_sent += sent
+                return
+            except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError) as e:
+                self.close()
+                self.bytes_sent += sent
+                if sent:
+                    raise ConnectionError(f"发送中连接被打印机断开（已发送{sent}/{len(data)}字节），"
+                                          f"为避免重复打印不再重试") from e
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+
+
+def render_printer_label(student_id, name, paper_size_mm, subject=None, qr_size_percent=None,
+                         logo_path=None, dpi=DEFAULT_PRINTER_DPI, logo_threshold=None):
+    """按打印机分辨率渲染1位黑白标签"""
+    from qr_generator import render_label_tile
+
+    tile = render_label_tile(student_id, name, paper_size_mm=paper_size_mm, qr_size_percent=qr_size_percent,
+                             logo_path=logo_path, subject=subject, dpi=dpi, mode="1",
+                             logo_threshold=logo_threshold)
+    if tile is None:
+        raise ValueError(f"生成标签失败: {name}_{student_id}")
+    return tile.to_image()
+
+
+def print_labels(labels, host, port=RAW_PRINT_PORT, language="zpl", paper_size_mm=(40, 20),
+                 qr_size_percent=None, logo_path=None, dpi=DEFAULT_PRINTER_DPI, logo_threshold=None,
+                 progress=None):
+    """通过一个复用的连接打印多个标签
+
+    labels 为字典列表，包含 student_id、name，可选 subject、copies 和 paper_size。
+    返回包含标签数、发送字节数、连接次数和耗时的汇总。
+    """
+    if language not in PRINTER_LANGUAGES:
+        raise ValueError(f"不支持的打印机语言: {language}")
+    start = time.perf_counter()
+    count = 0
+    with RawPrinter(host, port) as printer:
+        for label in labels:
+            image = render_printer_label(label["student_id"], label["name"],
+                                         label.get("paper_size") or paper_size_mm,
+                                         label.get("subject") or None, qr_size_percent, logo_path,
+                                         dpi, logo_threshold)
+            try:
+                printer.send(encode_label(image, language, label.get("copies", 1)))
+            except OSError as e:
+                raise ConnectionError(f"打印 {label['name']}_{label['student_id']} 失败"
+                                      f"（之前的{count}个标签已发送）: {e}") from e
+            count += 1
+            if progress:
+                progress(count, len(labels))
+    return {
+        "labels": count,
+        "bytes": printer.bytes_sent,
+        "connections": printer.connections,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+class _RecordingHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        chunks = []
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+        self.server.owner._record(b"".join(chunks))
+
+
+class FakePrinterServer:
+    """本地假打印机：监听TCP端口，记录每个连接收到的全部字节
+
+    with FakePrinterServer() as fake:
+        print_labels(labels, "127.0.0.1", fake.port)
+        fake.wait_for(1)
+        fake.received  # [第1个连接的字节, ...]
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = socketserver.ThreadingTCPServer((host, port), _RecordingHandler)
+        self.server.daemon_threads = True
+        self.server.owner = self
+        self.host, self.port = self.server.server_address[:2]
+        self.received = []
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def _record(self, data):
+        with self.condition:
+            self.received.append(data)
+            self.condition.notify_all()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def wait_for(self, connections, timeout=5):
+        """等待收到指定数量的完整连接，超时返回False"""
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.received) >= connections, timeout)
+
+    @property
+    def data(self):
+        """所有连接收到的字节"""
+        with self.condition:
+            return b"".join(self.received)
+
+
+def decode_zpl_graphics(data):
+    """从ZPL数据中解析所有 ^GFA Z64 图形字段，返回 [(每行字节数, 位数据), ...]，校验失败时抛出ValueError"""
+    fields = []
+    for part in data.split(b"^GFA,")[1:]:
+        header, _, rest = part.partition(b":Z64:")
+        _, _, bytes_per_row = header.split(b",")[:3]
+        encoded, _, tail = rest.partition(b":")
+        if int(tail[:4], 16) != crc16_ccitt(encoded):
+            raise ValueError("Z64 CRC校验失败")
+        fields.append((int(bytes_per_row), zlib.decompress(base64.b64decode(encoded))))
+    return fields
@@ -0,0 +1,228 @@
+"""标签布局规划：只计算各元素的像素位置，不进行任何绘制
+
+布局只取决于纸张尺寸、二维码比例、分辨率、是否有主题行和Logo原图尺寸，
+与学生姓名和学号无关。plan_label 按这些参数缓存计划，同一花名册中相同纸张的
+所有标签共用一个计划；qr_generator.rasterize_plan 按计划绘制像素。
+"""
+from functools import lru_cache
+import config
+
+# 缓存的布局计划数量（预览时窗口缩放会产生不同的DPI）
+PLAN_CACHE_SIZE = 128
+
+
+def mm_to_pixels(mm, dpi=300):
+    """将毫米转换为像素"""
+    return int(mm * dpi / 25.4)
+
+
+def fit_keep_aspect(size, target_size):
+    """计算保持宽高比缩放到目标框内的尺寸"""
+    if isinstance(target_size, tuple):
+        target_width, target_height = target_size
+    else:
+        target_width = target_height = target_size
+
+    width, height = size
+    aspect = width / height
+
+    if aspect > target_width / target_height:
+        new_width = target_width
+        new_height = int(target_width / aspect)
+    else:
+        new_height = target_height
+        new_width = int(target_height * aspect)
+
+    return new_width, new_height
+
+
+def is_full_layout(paper_size_mm):
+    """判断是否使用全画幅布局（当尺寸小于100mm或是自定义尺寸时）"""
+    return (min(paper_size_mm) < 100 or
+            tuple(paper_size_mm) not in [tuple(config.PAPER_SIZES["A4"]), tuple(config.PAPER_SIZES["A3"])])
+
+
+class LabelPlan:
+    """标签的布局计划（创建后不可修改，可以安全地在线程和标签之间共享）
+
+    sheet_size 为整张纸的像素尺寸，qr_box 为 (x, y, 边长)，logo_box 为 (x, y, 宽, 高)，
+    logo_target 为Logo缩放的目标框，text_origin 为首行文字左上角，line_offsets 为各行相对首行的偏移。
+    font_size 为文字的最大字号，text_width 为每行文字可用的宽度（到二维码左边缘，二维码自带白边），
+    text_height 为首行以下可用的高度（标准布局到二维码下边缘，全画幅布局到纸张下边缘），
+    放不下的文字由 text_layout 缩小字号或截断。
+    没有Logo时 logo_box、logo_target、font_size、text_origin、text_width 和 text_height 为None
+    （只放二维码，不显示文字）。
+    """
+    __slots__ = ("sheet_size", "full_layout", "qr_box", "logo_box", "logo_target",
+                 "font_size", "text_origin", "line_offsets", "text_width", "text_height")
+
+    def __init__(self, sheet_size, full_layout, qr_box, logo_box=None, logo_target=None,
+                 font_size=None, text_origin=None, line_offsets=(), text_width=None, text_height=None):
+        set_field = object.__setattr__
+        set_field(self, "sheet_size", sheet_size)
+        set_field(self, "full_layout", full_layout)
+        set_field(self, "qr_box", qr_box)
+        set_field(self, "logo_box", logo_box)
+        set_field(self, "logo_target", logo_target)
+        set_field(self, "font_size", font_size)
+        set_field(self, "text_origin", text_origin)
+        set_field(self, "line_offsets", tuple(line_offsets))
+        set_field(self, "text_width", text_width)
+        set_field(self, "text_height", text_height)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LabelPlan 不可修改")
+
+    def __delattr__(self, name):
+        raise AttributeError("LabelPlan 不可修改")
+
+    def _fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, LabelPlan):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self):
+        return hash(self._fields())
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"LabelPlan({fields})"
+
+    @property
+    def has_text(self):
+        return self.text_origin is not None
+
+    def text_positions(self):
+        """各行文字左上角的像素坐标"""
+        if self.text_origin is None:
+            return []
+        text_x, text_y = self.text_origin
+        return [(text_x, text_y + offset) for offset in self.line_offsets]
+
+
+def resolve_qr_size(qr_size_percent):
+    """二维码比例（相对纸张短边），None时使用配置项 QR_CODE_SIZE_PERCENT"""
+    return config.QR_CODE_SIZE_PERCENT / 100 if qr_size_percent is None else qr_size_percent
+
+
+def plan_label(paper_size_mm, qr_size_percent=None, logo_size=None, has_subject=False, dpi=300):
+    """返回标签的布局计划，相同参数只计算一次
+
+    logo_size 为Logo原图尺寸，None表示没有Logo。
+    """
+    paper_size_mm = tuple(paper_size_mm)
+    return _plan_label(paper_size_mm, resolve_qr_size(qr_size_percent), tuple(logo_size) if logo_size else None,
+                       bool(has_subject), dpi, is_full_layout(paper_size_mm))
+
+
+def plan_cache_info():
+    """布局计划缓存的命中统计"""
+    return _plan_label.cache_info()
+
+
+def clear_plan_cache():
+    _plan_label.cache_clear()
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _plan_label(paper_size_mm, qr_size_percent, logo_size, has_subject, dpi, full_layout):
+    width_pixels = mm_to_pixels(paper_size_mm[0], dpi)
+    height_pixels = mm_to_pixels(paper_size_mm[1], dpi)
+    sheet_size = (width_pixels, height_pixels)
+
+    if full_layout:
+        return _plan_full(sheet_size, logo_size, has_subject, dpi)
+    return _plan_standard(sheet_size, qr_size_percent, logo_size, has_subject, dpi)
+
+
+def _plan_full(sheet_size, logo_size, has_subject, dpi):
+    """全画幅布局：Logo和文字在左，二维码在右，铺满整张纸"""
+    width_pixels, height_pixels = sheet_size
+    margin_pixels = mm_to_pixels(2, dpi)  # 2mm边距
+    content_width = width_pixels - 2 * margin_pixels
+    content_height = height_pixels - 2 * margin_pixels
+
+    # 计算二维码尺寸（占据45%宽度），放在右边，垂直居中
+    qr_size = int(content_width * 0.45)
+    qr_box = (width_pixels - qr_size - margin_pixels, (height_pixels - qr_size) // 2, qr_size)
+    if not logo_size:
+        return LabelPlan(sheet_size, True, qr_box)
+
+    # Logo放在左边（占据45%宽度，高度占90%）
+    logo_target = (int(content_width * 0.45), int(content_height * 0.9))
+    logo_width, logo_height = fit_keep_aspect(logo_size, logo_target)
+    logo_x = margin_pixels
+    # 调整logo垂直位置，考虑文字空间
+    font_size = max(1, int(min(width_pixels, height_pixels) * 0.12))  # 增大字体尺寸
+    text_space = int(font_size * 3)  # 为两行文字和间距预留空间
+    logo_y = (height_pixels - logo_height - text_space) // 2
+
+    # 文字在Logo下方：姓名行、ID行、课程主题行
+    line_offsets = [0, int(font_size * 1.5)] + ([int(font_size * 3)] if has_subject else [])
+    text_y = logo_y + logo_height + margin_pixels
+    return LabelPlan(
+        sheet_size, True, qr_box,
+        logo_box=(logo_x, logo_y, logo_width, logo_height),
+        logo_target=logo_target,
+        font_size=font_size,
+        text_origin=(logo_x, text_y),
+        line_offsets=line_offsets,
+        text_width=max(1, qr_box[0] - logo_x),
+        text_height=max(1, height_pixels - text_y),
+    )
+
+
+def _plan_standard(sheet_size, qr_size_percent, logo_size, has_subject, dpi):
+    """标准布局：Logo、文字和二维码以小尺寸放在纸张右下角"""
+    width_pixels, height_pixels = sheet_size
+    # 计算二维码基础尺寸（以较短边为基准）
+    base_size = min(width_pixels, height_pixels)
+    qr_size = int(base_size * qr_size_percent)
+
+    # 计算边距（以毫米为单位）
+    margin_pixels = mm_to_pixels(5, dpi)
+
+    if not logo_size:
+        # 如果没有Logo，只显示二维码
+        qr_box = (width_pixels - margin_pixels - qr_size, height_pixels - margin_pixels - qr_size, qr_size)
+        return LabelPlan(sheet_size, False, qr_box)
+
+    # 计算字体大小（二维码尺寸的15%），不超过3mm，低分辨率预览时至少1像素
+    font_size = int(qr_size * 0.15)
+    max_font_size = mm_to_pixels(3, dpi)
+    font_size = max(1, min(font_size, max_font_size))
+
+    # 计算文字高度（三行文字加间距）
+    text_height = int(font_size * 3.3)
+    gap_1mm = mm_to_pixels(1, dpi)
+
+    # 计算logo应该的高度（总高度减去文字高度和1mm间距），宽度为二维码宽度
+    logo_target = (qr_size, max(1, qr_size - text_height - gap_1mm))
+    logo_width, logo_height = fit_keep_aspect(logo_size, logo_target)
+
+    # 左侧整体高度（logo + 1mm间距 + 文字），整体宽度为两个相同宽度的元素加2mm间距
+    left_total_height = logo_height + gap_1mm + text_height
+    total_width = qr_size * 2 + mm_to_pixels(2, dpi)
+
+    # 整体靠右对齐，Logo在左边
+    start_x = width_pixels - margin_pixels - total_width
+    logo_x = start_x
+    logo_y = height_pixels - margin_pixels - left_total_height
+
+    # 文字在Logo下方（1mm间距），姓名行、ID行（减小行间距）和课程主题行
+    line_offsets = [0, int(font_size * 1.1)] + ([int(font_size * 2.2)] if has_subject else [])
+    # 二维码在右边（2mm间距）
+    qr_box = (start_x + qr_size + mm_to_pixels(2, dpi), height_pixels - margin_pixels - qr_size, qr_size)
+    return LabelPlan(
+        sheet_size, False, qr_box,
+        logo_box=(logo_x, logo_y, logo_width, logo_height),
+        logo_target=logo_target,
+        font_size=font_size,
+        text_origin=(logo_x, logo_y + logo_height + gap_1mm),
+        line_offsets=line_offsets,
+        text_width=max(1, qr_box[0] - logo_x),
+        text_height=text_height,
+    )
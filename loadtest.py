@@ -0,0 +1,112 @@
+"""标签服务压力测试
+
+用法:
+    python -m bedoya serve -q &
+    python loadtest.py --requests 500 --concurrency 16
+    python loadtest.py --unique 50 --paper A3 --format pdf
+
+--unique 控制不同学生的数量：越小缓存命中越多，--unique 0 表示每个请求都不同。
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+
+def percentile(values, percent):
+    """按最近秩法计算百分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def request_urls(base_url, count, unique, paper, fmt):
+    """生成请求地址列表"""
+    urls = []
+    for index in range(count):
+        student = index % unique if unique else index
+        query = urlencode({"name": f"学生{student:04d}", "id": str(3436000 + student),
+                           "subject": "水彩风景", "paper": paper})
+        urls.append(f"{base_url}/label.{fmt}?{query}")
+    return urls
+
+
+def fetch(url, timeout=60):
+    """发送请求，返回 (状态码, 耗时毫秒, 字节数)"""
+    start = time.perf_counter()
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            size = len(response.read())
+            status = response.status
+    except HTTPError as e:
+        size = len(e.read())
+        status = e.code
+    return status, (time.perf_counter() - start) * 1000, size
+
+
+def run_load(urls, concurrency=8):
+    """并发发送全部请求并汇总延迟和吞吐量"""
+    results = []
+    lock = threading.Lock()
+
+    def worker(url):
+        try:
+            result = fetch(url)
+        except OSError:
+            result = (0, 0.0, 0)
+        with lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, urls))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for status, latency, _ in results if status == 200]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        "requests": len(results),
+        "ok": len(latencies),
+        "statuses": statuses,
+        "elapsed": elapsed,
+        "requests_per_sec": len(results) / elapsed if elapsed else 0,
+        "p50_ms": percentile(latencies, 50) if latencies else None,
+        "p99_ms": percentile(latencies, 99) if latencies else None,
+        "mean_ms": statistics.mean(latencies) if latencies else None,
+        "bytes": sum(size for _, _, size in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="标签服务压力测试")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="服务地址")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发数")
+    parser.add_argument("--unique", type=int, default=20, help="不同学生数量（0表示全部不同）")
+    parser.add_argument("--paper", default="A4", help="纸张尺寸")
+    parser.add_argument("--format", choices=("png", "pdf", "svg"), default="png", help="输出格式")
+    args = parser.parse_args(argv)
+
+    urls = request_urls(args.url.rstrip("/"), args.requests, args.unique, args.paper, args.format)
+    summary = run_load(urls, args.concurrency)
+
+    def ms(value):
+        return "-" if value is None else f"{value:.1f}ms"
+
+    print(f"请求: {summary['requests']}（成功{summary['ok']}），并发{args.concurrency}，"
+          f"耗时{summary['elapsed']:.2f}秒")
+    print(f"吞吐量: {summary['requests_per_sec']:.1f} 请求/秒，"
+          f"传输{summary['bytes'] / 1024 / 1024:.1f}MB")
+    print(f"延迟: p50 {ms(summary['p50_ms'])}，p99 {ms(summary['p99_ms'])}，平均 {ms(summary['mean_ms'])}")
+    print("状态码: " + "，".join(f"{status}×{count}" for status, count in sorted(summary["statuses"].items())))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,118 @@ import sys
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                             QSpinBox, QFileDialog, QMessageBox, QGroupBox,
-                            QRadioButton, QButtonGroup, QFrame)
-from PyQt6.QtCore import Qt, QSize, QRect
+                            QRadioButton, QButtonGroup, QFrame, QProgressDialog)
+from PyQt6.QtCore import (Qt, QSize, QRect, QPoint, QObject, QRunnable, QThreadPool,
+                          QTimer, pyqtSignal)
 from PyQt6.QtGui import QPixmap, QPainter, QColor, QImage, QLinearGradient, QPen
 from PIL import Image
-from PIL.ImageQt import ImageQt
 import qrcode
-from qr_generator import generate_qr_code
+from qr_generator import render_label_tile, warm_font_cache
+from render_session import RenderSession
+from render_cache import render_label_file
+from batch import render_roster
+from print_queue import PrintQueue
 import config
+import font_index
 import os
 import math
+import multiprocessing
+import threading
+from collections import OrderedDict
+import profiling
+
+# 参数变化后等待的时间（毫秒），连续调整时只渲染最后一次
+PREVIEW_DEBOUNCE_MS = 150
+# 缓存的预览背景数量（不同纸张比例）
+FRAME_CACHE_SIZE = 4
+
+class PreviewSignals(QObject):
+    """预览渲染任务的信号，在后台线程发出，在界面线程处理"""
+    finished = pyqtSignal(int, object, object, object)  # 请求序号、预览更新、渲染参数、各阶段耗时
+    failed = pyqtSignal(int, str)                       # 请求序号、错误信息
+
+class PreviewTask(QRunnable):
+    """在线程池中渲染预览，避免阻塞界面线程
+    
+    同一纸张、Logo和分辨率下复用渲染会话，只重绘文字和二维码区域；
+    shown_version 为预览区域当前显示的会话版本，结果只包含此后变化的区域。
+    """
+    def __init__(self, request_id, params, session, shown_version, is_stale):
+        super().__init__()
+        self.request_id = request_id
+        self.params = params
+        self.session = session
+        self.shown_version = shown_version
+        self.is_stale = is_stale
+        self.signals = PreviewSignals()
+        
+    def run(self):
+        # 开始执行前已有更新的请求，直接放弃
+        if self.is_stale(self.request_id):
+            return
+        try:
+            # 只统计本线程的渲染，结果显示在状态栏
+            with profiling.profile() as stats:
+                self.session.update(self.params["student_id"], self.params["name"], self.params["subject"])
+                rect = self.session.changed_since(self.shown_version)
+                # 会话的图像会被后续更新修改，只把变化区域的副本交给界面线程
+                update = {
+                    "version": self.session.version,
+                    "sheet_size": self.session.image.size,
+                    "rect": rect,
+                    "image": self.session.image.crop(rect) if rect else None,
+                }
+        except Exception as e:
+            self.signals.failed.emit(self.request_id, str(e))
+            return
+        self.signals.finished.emit(self.request_id, update, self.params, stats.summary())
+
+def pil_to_qimage(image):
+    """RGB图像转换为QImage（图像应已缩小到显示尺寸），返回 (QImage, 像素数据)
+
+    像素只在PIL导出时复制一次：按BGRX导出正好是Qt光栅绘制的原生格式RGB32，
+    QImage直接引用导出的数据，绘制时不再转换格式。QImage不复制data，
+    调用方必须在QImage的整个生命周期内保持data的引用。
+    """
+    data = image.tobytes("raw", "BGRX")
+    width, height = image.size
+    return QImage(data, width, height, width * 4, QImage.Format.Format_RGB32), data
+
+class BatchSignals(QObject):
+    """批量生成任务的信号，在后台线程发出，在界面线程处理"""
+    progress = pyqtSignal(int, int)    # 已完成数、总数
+    finished = pyqtSignal(object)      # 汇总结果
+    failed = pyqtSignal(str)           # 错误信息
+
+class BatchTask(QRunnable):
+    """在后台线程中运行批量生成（渲染本身在进程池中进行），界面线程只接收进度"""
+    def __init__(self, roster_file, output_dir, options):
+        super().__init__()
+        self.roster_file = roster_file
+        self.output_dir = output_dir
+        self.options = options
+        self.signals = BatchSignals()
+        
+    def run(self):
+        try:
+            summary = render_roster(self.roster_file, self.output_dir, **self.options,
+                                    progress=lambda done, total, result: self.signals.progress.emit(done, total))
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(summary)
+
+class PrintSignals(QObject):
+    """打印队列的完成信号，在队列线程发出，在界面线程处理"""
+    done = pyqtSignal(object)  # PrintJob
+
+class FontSignals(QObject):
+    """字体预加载完成的信号，在后台线程发出，在界面线程处理"""
+    ready = pyqtSignal()
+
+class WarningSignals(QObject):
+    """配置和字体的警告（可能在后台线程发出），在界面线程显示到状态栏"""
+    warning = pyqtSignal(str)
 
 class PreviewWidget(QLabel):
     def __init__(self, parent=None):
@@ -26,72 +128,154 @@ class PreviewWidget(QLabel):
                 padding: 20px;
             }
         """)
+        # 预览分辨率的整张标签（窗口缩放时从它重新缩放，不重新渲染）
+        self.source_image = None
+        # 缩放到预览区域的标签，以及按目标尺寸缓存的阴影和纸张背景
+        self.label_image = None
+        self.label_data = None    # label_image引用的像素数据，必须和label_image一起保留
+        self.frame_cache = OrderedDict()
+        
+    def previewDpi(self, paper_size_mm):
+        """按预览区域的实际像素大小计算渲染分辨率，不超过打印分辨率"""
+        available_width = max(1, self.width() - 40)  # 减去padding
+        available_height = max(1, self.height() - 40)
+        scale = min(available_width / paper_size_mm[0], available_height / paper_size_mm[1])
+        dpi = scale * 25.4 * self.devicePixelRatioF()
+        return max(1, min(dpi, config.PRINT_DPI))
+    
+    def targetSize(self, image_size):
+        """保持纸张比例缩放到预览区域的尺寸"""
+        available_width = max(1, self.width() - 40)  # 减去padding
+        available_height = max(1, self.height() - 40)
+        image_ratio = image_size[0] / image_size[1]
+        preview_ratio = available_width / available_height
+        
+        if image_ratio > preview_ratio:
+            return available_width, max(1, int(available_width / image_ratio))
+        return max(1, int(available_height * image_ratio)), available_height
+    
+    def paperFrame(self, target_size):
+        """带阴影的白色纸张背景，按目标尺寸缓存，只在窗口缩放或纸张比例变化时重画"""
+        frame = self.frame_cache.get(target_size)
+        if frame is not None:
+            self.frame_cache.move_to_end(target_size)
+            return frame
         
-    def setPreviewImage(self, image):
-        """设置预览图像"""
-        if isinstance(image, Image.Image):
-            # 转换PIL图像为QPixmap
-            qimage = ImageQt(image)
-            pixmap = QPixmap.fromImage(qimage)
-            
-            # 计算预览区域大小
-            available_width = self.width() - 40  # 减去padding
-            available_height = self.height() - 40
-            
-            # 保持纸张比例进行缩放
-            image_ratio = pixmap.width() / pixmap.height()
-            preview_ratio = available_width / available_height
-            
-            if image_ratio > preview_ratio:
-                target_width = available_width
-                target_height = int(available_width / image_ratio)
-            else:
-                target_height = available_height
-                target_width = int(available_height * image_ratio)
-            
-            # 创建预览画布
-            preview = QPixmap(target_width + 40, target_height + 40)
-            preview.fill(Qt.GlobalColor.transparent)
+        target_width, target_height = target_size
+        frame = QPixmap(target_width + 40, target_height + 40)
+        frame.fill(Qt.GlobalColor.transparent)
+        
+        try:
+            painter = QPainter(frame)
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
             
-            try:
-                painter = QPainter(preview)
-                painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-                
-                # 绘制阴影
-                shadow_margin = 20
-                for i in range(5):
-                    shadow_offset = i * 2
-                    shadow_alpha = int(30 - i * 5)
-                    painter.setPen(Qt.PenStyle.NoPen)
-                    painter.setBrush(QColor(0, 0, 0, shadow_alpha))
-                    shadow_rect = QRect(
-                        shadow_margin + shadow_offset,
-                        shadow_margin + shadow_offset,
-                        target_width - shadow_offset,
-                        target_height - shadow_offset
-                    )
-                    painter.drawRect(shadow_rect)
-                
-                # 绘制白色纸张背景
-                paper_rect = QRect(shadow_margin, shadow_margin, target_width, target_height)
-                painter.setBrush(QColor(255, 255, 255))
-                painter.setPen(QPen(QColor(220, 220, 220)))
-                painter.drawRect(paper_rect)
-                
-                # 绘制缩放后的图像
-                scaled_image = pixmap.scaled(
-                    target_width,
-                    target_height,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
+            # 绘制阴影
+            shadow_margin = 20
+            for i in range(5):
+                shadow_offset = i * 2
+                shadow_alpha = int(30 - i * 5)
+                painter.setPen(Qt.PenStyle.NoPen)
+                painter.setBrush(QColor(0, 0, 0, shadow_alpha))
+                shadow_rect = QRect(
+                    shadow_margin + shadow_offset,
+                    shadow_margin + shadow_offset,
+                    target_width - shadow_offset,
+                    target_height - shadow_offset
                 )
-                painter.drawPixmap(shadow_margin, shadow_margin, scaled_image)
-                
-            finally:
-                painter.end()
+                painter.drawRect(shadow_rect)
+            
+            # 绘制白色纸张背景
+            paper_rect = QRect(shadow_margin, shadow_margin, target_width, target_height)
+            painter.setBrush(QColor(255, 255, 255))
+            painter.setPen(QPen(QColor(220, 220, 220)))
+            painter.drawRect(paper_rect)
             
-            # 设置预览图像
-            self.setPixmap(preview)
+        finally:
+            painter.end()
+        
+        self.frame_cache[target_size] = frame
+        while len(self.frame_cache) > FRAME_CACHE_SIZE:
+            self.frame_cache.popitem(last=False)
+        return frame
+        
+    def setPreviewImage(self, image):
+        """设置整张预览图像"""
+        if isinstance(image, Image.Image):
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            self.source_image = image
+            self.rescalePreview()
+    
+    def rescalePreview(self):
+        """把预览图像缩放到当前预览区域：先在PIL中缩小，再转换为QImage"""
+        target_size = self.targetSize(self.source_image.size)
+        # 缩小倍数较大时先按整数倍reduce，再用LANCZOS缩放到目标尺寸
+        scaled = self.source_image.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        self.label_image, self.label_data = pil_to_qimage(scaled)
+        self.update()
+    
+    def updatePreviewRegion(self, image, rect, sheet_size):
+        """只替换预览中变化的区域（rect为整张标签上的像素区域），并只重绘这一块
+        
+        没有可更新的预览或标签尺寸不同时返回False，需要调用 setPreviewImage。
+        """
+        if self.source_image is None or tuple(sheet_size) != self.source_image.size:
+            return False
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        self.source_image.paste(image, rect[:2])
+        
+        # 变化区域映射到预览尺寸（向外取整并多留1像素，避免缩放边缘出现接缝）
+        source_width, source_height = self.source_image.size
+        target_width, target_height = self.label_image.width(), self.label_image.height()
+        scale_x = target_width / source_width
+        scale_y = target_height / source_height
+        left, top, right, bottom = rect
+        target_left = max(0, math.floor(left * scale_x) - 1)
+        target_top = max(0, math.floor(top * scale_y) - 1)
+        target_right = min(target_width, math.ceil(right * scale_x) + 1)
+        target_bottom = min(target_height, math.ceil(bottom * scale_y) + 1)
+        box = (target_left / scale_x, target_top / scale_y, target_right / scale_x, target_bottom / scale_y)
+        scaled = self.source_image.resize((target_right - target_left, target_bottom - target_top),
+                                          Image.Resampling.LANCZOS, box=box, reducing_gap=2.0)
+        
+        # 导出的数据是只读的，第一次在label_image上绘制时Qt会复制一份自己持有
+        region, region_data = pil_to_qimage(scaled)
+        painter = QPainter(self.label_image)
+        try:
+            painter.drawImage(target_left, target_top, region)
+        finally:
+            painter.end()
+        origin = self.frameOrigin()
+        self.update(QRect(origin.x() + 20 + target_left, origin.y() + 20 + target_top,
+                          target_right - target_left, target_bottom - target_top))
+        return True
+    
+    def frameOrigin(self):
+        """预览画面（阴影和纸张）在控件中的左上角（居中显示）"""
+        contents = self.contentsRect()
+        return QPoint(contents.x() + (contents.width() - self.label_image.width() - 40) // 2,
+                      contents.y() + (contents.height() - self.label_image.height() - 40) // 2)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # 旧尺寸的背景不再使用；标签从已有的预览图像重新缩放，不重新渲染
+        self.frame_cache.clear()
+        if self.source_image is not None:
+            self.rescalePreview()
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.label_image is None:
+            return
+        # 局部更新时Qt只重绘event.rect()，其余部分保持不变
+        origin = self.frameOrigin()
+        painter = QPainter(self)
+        try:
+            painter.drawPixmap(origin, self.paperFrame((self.label_image.width(), self.label_image.height())))
+            painter.drawImage(origin.x() + 20, origin.y() + 20, self.label_image)
+        finally:
+            painter.end()
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -190,7 +374,7 @@ class MainWindow(QMainWindow):
         
         self.qr_size = QSpinBox()
         self.qr_size.setRange(5, 20)
-        self.qr_size.setValue(8)
+        self.qr_size.setValue(round(config.QR_CODE_SIZE_PERCENT))
         self.qr_size.setSingleStep(1)
         self.qr_size.setFixedWidth(80)
         self.qr_size.setFixedHeight(32)
@@ -224,10 +408,13 @@ class MainWindow(QMainWindow):
         print_btn.clicked.connect(self.printImage)
         save_btn = QPushButton("保存图片")
         save_btn.clicked.connect(self.saveImage)
+        batch_btn = QPushButton("批量生成")
+        batch_btn.clicked.connect(self.batchGenerate)
         
         button_layout.addWidget(preview_btn)
         button_layout.addWidget(print_btn)
         button_layout.addWidget(save_btn)
+        button_layout.addWidget(batch_btn)
         
         # 添加所有组件到左侧面板
         left_layout.addWidget(info_group)
@@ -265,23 +452,71 @@ class MainWindow(QMainWindow):
         layout.addWidget(left_panel)
         layout.addWidget(preview_group, stretch=1)
         
+        # 预览渲染：单线程后台渲染 + 防抖，只保留最新的请求
+        self.render_pool = QThreadPool(self)
+        self.render_pool.setMaxThreadCount(1)
+        
+        # 打印在后台队列中执行，每个任务使用独立的临时文件
+        self.print_signals = PrintSignals()
+        self.print_signals.done.connect(self.onPrintFinished)
+        self.print_queue = PrintQueue(printer=config.PRINTER_NAME or None,
+                                      on_done=self.print_signals.done.emit)
+        # 配置和字体的警告显示在状态栏而不是终端，启动前已经产生的警告补充显示最近一条
+        self.warning_signals = WarningSignals()
+        self.warning_signals.warning.connect(self.onWarning)
+        config.set_warning_handler(self.warning_signals.warning.emit)
+        earlier_warnings = config.recent_warnings()
+        if earlier_warnings:
+            self.onWarning(earlier_warnings[-1])
+        # 首次运行时扫描系统字体可能需要几秒，在后台进行，界面先显示出来
+        self.font_signals = FontSignals()
+        self.font_signals.ready.connect(self.onFontsReady)
+        if font_index.load_index(scan=False) is None:
+            self.statusBar().showMessage("正在建立系统字体索引（只在首次运行或字体变化后进行）...")
+        threading.Thread(target=self.warmFonts, daemon=True).start()
+        # 正在进行的批量生成任务（持有其信号对象）
+        self.batch_task = None
+        self.preview_request_id = 0
+        self.pending_task = None
+        # 增量渲染会话（只在渲染线程中使用）和预览区域当前显示的版本
+        self.preview_session = None
+        self.shown_version = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(lambda: self.startPreviewRender(silent=True))
+        
         # 连接信号
         self.paper_group.buttonClicked.connect(self.onPaperSizeChanged)
-        self.width_input.valueChanged.connect(self.generatePreview)
-        self.height_input.valueChanged.connect(self.generatePreview)
-        self.qr_size.valueChanged.connect(self.generatePreview)
+        self.width_input.valueChanged.connect(self.schedulePreview)
+        self.height_input.valueChanged.connect(self.schedulePreview)
+        self.qr_size.valueChanged.connect(self.schedulePreview)
         
         # 初始化logo路径
         self.logo_path = config.DEFAULT_LOGO
         self.updateLogoPreview()
         
-        # 保存预览图像
-        self.preview_image = None
+        # 保存预览图像的参数
+        self.preview_params = None
         
+    def warmFonts(self):
+        """后台线程：查找默认字体（必要时扫描系统字体）并预加载常用字号，避免首次预览时等待"""
+        try:
+            warm_font_cache()
+        finally:
+            self.font_signals.ready.emit()
+    
+    def onFontsReady(self):
+        if self.statusBar().currentMessage().startswith("正在建立系统字体索引"):
+            self.statusBar().clearMessage()
+    
+    def onWarning(self, message):
+        self.statusBar().showMessage(f"警告：{message}", 10000)
+    
     def onPaperSizeChanged(self, button):
         is_custom = button.text() == "自定义"
         self.custom_size_widget.setVisible(is_custom)
-        self.generatePreview()
+        self.schedulePreview()
     
     def selectLogo(self):
         file_name, _ = QFileDialog.getOpenFileName(
@@ -293,7 +528,7 @@ class MainWindow(QMainWindow):
         if file_name:
             self.logo_path = file_name
             self.updateLogoPreview()
-            self.generatePreview()
+            self.schedulePreview()
     
     def updateLogoPreview(self):
         try:
@@ -323,56 +558,130 @@ class MainWindow(QMainWindow):
         # 默认返回A4尺寸
         return config.PAPER_SIZES["A4"]
     
+    def schedulePreview(self):
+        """参数变化时延迟刷新预览，连续变化只触发一次渲染"""
+        self.preview_timer.start()
+    
     def generatePreview(self):
+        self.preview_timer.stop()
+        self.startPreviewRender(silent=False)
+    
+    def startPreviewRender(self, silent=False):
+        """提交预览渲染任务，silent为True时缺少信息不弹出提示"""
         name = self.name_input.text().strip()
         student_id = self.id_input.text().strip()
         subject = self.subject_input.text().strip()
         
         if not name or not student_id:
-            QMessageBox.warning(self, "提示", "请输入学生姓名和学号！")
+            if not silent:
+                QMessageBox.warning(self, "提示", "请输入学生姓名和学号！")
             return
-            
-        try:
-            # 生成二维码图片
-            paper_size = self.getPaperSize()
-            qr_size_percent = self.qr_size.value() / 100
-            
-            image = generate_qr_code(
-                student_id,
-                name,
-                paper_size_mm=paper_size,
-                qr_size_percent=qr_size_percent,
-                logo_path=self.logo_path,
-                subject=subject
-            )
-            
-            # 更新预览
-            self.preview.setPreviewImage(image)
-            self.preview_image = image
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"生成二维码失败：{str(e)}")
+        
+        paper_size = self.getPaperSize()
+        params = {
+            "student_id": student_id,
+            "name": name,
+            "paper_size_mm": paper_size,
+            "qr_size_percent": self.qr_size.value() / 100,
+            "logo_path": self.logo_path,
+            "subject": subject
+        }
+        
+        # 取消还在排队的旧任务，正在执行的旧任务完成后结果会被丢弃
+        if self.pending_task is not None:
+            try:
+                self.render_pool.tryTake(self.pending_task)
+            except RuntimeError:
+                pass  # 任务已执行完毕并被线程池释放
+        self.preview_request_id += 1
+        
+        # 预览按屏幕分辨率渲染，打印和保存时再按打印分辨率渲染
+        # 纸张、二维码比例、Logo或预览分辨率变化时才重新建立会话（重画底图）
+        dpi = self.preview.previewDpi(paper_size)
+        session_params = (paper_size, params["qr_size_percent"], self.logo_path, dpi)
+        if self.preview_session is None or not self.preview_session.matches(*session_params):
+            self.preview_session = RenderSession(*session_params)
+            self.shown_version = None
+        task = PreviewTask(
+            self.preview_request_id,
+            params,
+            self.preview_session,
+            self.shown_version,
+            lambda request_id: request_id != self.preview_request_id
+        )
+        task.signals.finished.connect(self.onPreviewFinished)
+        task.signals.failed.connect(self.onPreviewFailed)
+        self.pending_task = task
+        self.statusBar().showMessage("正在生成预览...")
+        self.render_pool.start(task)
+    
+    def onPreviewFinished(self, request_id, update, params, stages):
+        if request_id != self.preview_request_id:
+            return
+        self.pending_task = None
+        rect = update["rect"]
+        if rect is not None:
+            if rect == (0, 0) + tuple(update["sheet_size"]):
+                self.preview.setPreviewImage(update["image"])
+            elif not self.preview.updatePreviewRegion(update["image"], rect, update["sheet_size"]):
+                # 预览区域还没有整张图像，丢弃会话立即重新渲染整张
+                self.preview_session = None
+                self.startPreviewRender(silent=True)
+                return
+        self.shown_version = update["version"]
+        self.preview_params = params
+        total = sum(stage["total_ms"] for stage in stages.values())
+        self.statusBar().showMessage(
+            f"预览渲染 {total:.0f}ms（{profiling.format_summary(stages, limit=3)}）", 5000)
+    
+    def onPreviewFailed(self, request_id, message):
+        if request_id != self.preview_request_id:
+            return
+        self.pending_task = None
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "错误", f"生成二维码失败：{message}")
     
     def printImage(self):
-        if self.preview_image is None:
+        if self.preview_params is None:
             QMessageBox.warning(self, "提示", "请先生成预览！")
             return
         
-        try:
-            # 保存临时文件
-            temp_file = "temp_print.png"
-            self.preview_image.save(temp_file)
-            
-            # 打印文件
-            copies = self.copies.value()
-            os.startfile(temp_file, "print")
-            
-            QMessageBox.information(self, "提示", f"已发送{copies}份打印任务到打印机")
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"打印失败：{str(e)}")
+        params = dict(self.preview_params)
+        copies = self.copies.value()
+        title = f"{params['name']}_{params['student_id']}"
+        if config.LABEL_PRINTER:
+            self.print_queue.submit_action(lambda: self.printToLabelPrinter(params, copies), copies, title)
+        else:
+            # 按打印分辨率渲染也在队列线程中进行，界面不会卡住
+            self.print_queue.submit(lambda: render_label_tile(**params, dpi=config.PRINT_DPI), copies, title)
+        self.statusBar().showMessage(f"已加入打印队列：{title}（{copies}份）")
+    
+    def printToLabelPrinter(self, params, copies):
+        """直接发送到配置的热敏标签打印机，份数由打印机复制（在打印队列线程中执行）"""
+        from label_printer import print_labels, parse_printer_address
+        
+        host, port = parse_printer_address(config.LABEL_PRINTER)
+        label = {"student_id": params["student_id"], "name": params["name"],
+                 "subject": params["subject"], "copies": copies}
+        print_labels([label], host, port, language=config.LABEL_PRINTER_LANGUAGE,
+                     paper_size_mm=params["paper_size_mm"], qr_size_percent=params["qr_size_percent"],
+                     logo_path=params["logo_path"], dpi=config.LABEL_PRINTER_DPI)
+    
+    def closeEvent(self, event):
+        # 等待已提交的打印任务完成，并删除交给系统打印程序的临时文件
+        self.print_queue.close()
+        config.set_warning_handler(None)
+        super().closeEvent(event)
+    
+    def onPrintFinished(self, job):
+        if job.status == "done":
+            self.statusBar().showMessage(f"已发送{job.copies}份打印任务到打印机：{job.title}", 5000)
+        else:
+            self.statusBar().clearMessage()
+            QMessageBox.critical(self, "错误", f"打印失败：{job.error}")
     
     def saveImage(self):
-        if self.preview_image is None:
+        if self.preview_params is None:
             QMessageBox.warning(self, "提示", "请先生成预览！")
             return
             
@@ -385,11 +694,68 @@ class MainWindow(QMainWindow):
             )
             
             if file_name:
-                self.preview_image.save(file_name)
+                # 按打印分辨率渲染；相同的标签之前保存过时直接从磁盘缓存复制
+                fmt = os.path.splitext(file_name)[1].lstrip(".").lower() or "png"
+                render_label_file(file_name, fmt, **self.preview_params, dpi=config.PRINT_DPI)
                 QMessageBox.information(self, "成功", "图片保存成功！")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"保存图片失败：{str(e)}")
 
+    def batchGenerate(self):
+        roster_file, _ = QFileDialog.getOpenFileName(
+            self,
+            "选择花名册",
+            "",
+            "花名册 (*.csv *.xlsx);;所有文件 (*.*)"
+        )
+        if not roster_file:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "选择保存目录")
+        if not output_dir:
+            return
+        
+        self.batch_dialog = QProgressDialog("正在批量生成标签...", None, 0, 0, self)
+        self.batch_dialog.setWindowTitle("批量生成")
+        self.batch_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.batch_dialog.setMinimumDuration(0)
+        self.batch_dialog.show()
+        
+        # 在后台线程中等待进程池，界面线程保持响应，进度通过信号更新
+        options = {
+            "qr_size_percent": self.qr_size.value() / 100,
+            "logo_path": self.logo_path,
+            "default_paper_size": self.getPaperSize(),
+            "dpi": config.PRINT_DPI,
+        }
+        self.batch_task = BatchTask(roster_file, output_dir, options)
+        self.batch_task.signals.progress.connect(self.onBatchProgress)
+        self.batch_task.signals.finished.connect(self.onBatchFinished)
+        self.batch_task.signals.failed.connect(self.onBatchFailed)
+        QThreadPool.globalInstance().start(self.batch_task)
+    
+    def onBatchProgress(self, done, total):
+        self.batch_dialog.setMaximum(total)
+        self.batch_dialog.setValue(done)
+    
+    def onBatchFailed(self, message):
+        self.batch_dialog.close()
+        self.batch_task = None
+        QMessageBox.critical(self, "错误", f"批量生成失败：{message}")
+    
+    def onBatchFinished(self, summary):
+        self.batch_dialog.close()
+        self.batch_task = None
+        message = (f"成功 {summary['succeeded']} 个，失败 {summary['failed']} 个，共需打印 {summary['copies']} 份\n"
+                   f"耗时 {summary['elapsed']:.1f} 秒（{summary['labels_per_sec']:.1f} 个/秒）")
+        if summary["duplicates"]:
+            details = "\n".join(f"第{d['line']}行与第{d['duplicate_of']}行相同，已保存为 {os.path.basename(d['path'])}"
+                                for d in summary["duplicates"][:10])
+            message += f"\n\n姓名和学号重复的行：\n{details}"
+        if summary["errors"]:
+            details = "\n".join(f"第{e['line']}行: {e['error']}" for e in summary["errors"][:10])
+            message += f"\n\n出错的行：\n{details}"
+        QMessageBox.information(self, "批量生成完成", message)
+
 def main():
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
@@ -399,4 +765,6 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == '__main__':
+    # 打包后的程序中，批量生成的工作进程会重新执行本程序，需要在这里接管，不能再启动界面
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,464 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import time
+import zlib
+import numpy as np
+from PIL import Image
+import config
+from layout import plan_label, resolve_qr_size
+from qr_generator import label_text_lines, build_qr_payload, qr_matrix, get_logo_size, mm_to_pixels
+from text_layout import layout_text
+
+# 布局按300DPI的像素坐标计算，再换算为PDF的点（1/72英寸）
+LAYOUT_DPI = 300
+PX_TO_PT = 72 / LAYOUT_DPI
+
+
+def mm_to_points(mm):
+    """将毫米转换为PDF点"""
+    return mm * 72 / 25.4
+
+
+def _num(value):
+    """格式化PDF中的数字，去掉多余的0"""
+    text = f"{value:.3f}".rstrip("0").rstrip(".")
+    return text if text not in ("", "-0") else "0"
+
+
+class PdfWriter:
+    """最小化的流式PDF写入器：对象写完即落盘，只在内存中保留偏移量"""
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        self.next_num = 1
+        self.position = 0
+        self._write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data):
+        self.f.write(data)
+        self.position += len(data)
+
+    def reserve(self):
+        """预留一个对象编号，稍后再写入内容"""
+        num = self.next_num
+        self.next_num += 1
+        return num
+
+    def write_object(self, num, body):
+        """写入普通对象"""
+        if isinstance(body, str):
+            body = body.encode("latin-1")
+        self.offsets[num] = self.position
+        self._write(f"{num} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def write_stream(self, num, data, entries="", compress=True):
+        """写入流对象，默认使用Flate压缩"""
+        if compress:
+            data = zlib.compress(data, 6)
+            entries += " /Filter /FlateDecode"
+        self.offsets[num] = self.position
+        self._write(f"{num} 0 obj\n<< /Length {len(data)}{entries} >>\nstream\n".encode())
+        self._write(data)
+        self._write(b"\nendstream\nendobj\n")
+
+    def finish(self, root_num):
+        """写入交叉引用表和文件尾"""
+        missing = [num for num in range(1, self.next_num) if num not in self.offsets]
+        if missing:
+            raise ValueError(f"PDF对象未写入: {missing}")
+        xref_position = self.position
+        lines = [f"xref\n0 {self.next_num}\n", "0000000000 65535 f \n"]
+        lines += [f"{self.offsets[num]:010d} 00000 n \n" for num in range(1, self.next_num)]
+        lines.append(f"trailer\n<< /Size {self.next_num} /Root {root_num} 0 R >>\n")
+        lines.append(f"startxref\n{xref_position}\n%%EOF\n")
+        self._write("".join(lines).encode())
+
+
+class PdfFont:
+    """CID字体（Identity-H编码），记录用到的字形，关闭文档时子集化并嵌入"""
+
+    def __init__(self, font_path, font_index=None):
+        try:
+            from fontTools.ttLib import TTFont
+        except ImportError:
+            raise ValueError("导出PDF需要安装fonttools: pip install fonttools")
+
+        if font_index is None:
+            from font_index import face_index
+            font_index = face_index(font_path)
+
+        try:
+            self.font = TTFont(font_path, fontNumber=font_index, lazy=True)
+            self.cmap = self.font.getBestCmap()
+        except Exception as e:
+            raise ValueError(f"无法加载字体 {font_path}: {e}")
+        self.font_path = font_path
+        self.font_index = font_index
+        self.units_per_em = self.font["head"].unitsPerEm
+        self.ascent = self.font["hhea"].ascent / self.units_per_em
+        self.descent = self.font["hhea"].descent / self.units_per_em
+        self.used = {0: None}  # 字形编号 -> 对应字符（用于ToUnicode）
+
+    def encode(self, text):
+        """将文本转换为字形编号的十六进制字符串"""
+        codes = []
+        for char in text:
+            glyph_name = self.cmap.get(ord(char))
+            gid = self.font.getGlyphID(glyph_name) if glyph_name else 0
+            if gid and gid not in self.used:
+                self.used[gid] = char
+            codes.append(f"{gid:04X}")
+        return "<" + "".join(codes) + ">"
+
+    def _subset_data(self):
+        """按用到的字形子集化字体，保留原字形编号"""
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+
+        # 子集化时对无法处理的表只给出警告，不需要输出
+        logging.getLogger("fontTools.subset").setLevel(logging.ERROR)
+        font = TTFont(self.font_path, fontNumber=self.font_index)
+        options = subset.Options()
+        options.retain_gids = True
+        options.hinting = False
+        options.notdef_outline = True
+        options.layout_features = []
+        options.desubroutinize = True
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(gids=sorted(self.used))
+        subsetter.subset(font)
+        buffer = io.BytesIO()
+        font.save(buffer)
+        return buffer.getvalue(), "glyf" in font
+
+    def _to_unicode(self):
+        """生成字形编号到Unicode的映射表"""
+        entries = [(gid, char) for gid, char in sorted(self.used.items()) if char]
+        lines = [
+            "/CIDInit /ProcSet findresource begin",
+            "12 dict begin",
+            "begincmap",
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            "/CMapName /Adobe-Identity-UCS def",
+            "/CMapType 2 def",
+            "1 begincodespacerange",
+            "<0000> <FFFF>",
+            "endcodespacerange",
+        ]
+        for start in range(0, len(entries), 100):
+            chunk = entries[start:start + 100]
+            lines.append(f"{len(chunk)} beginbfchar")
+            for gid, char in chunk:
+                lines.append(f"<{gid:04X}> <{char.encode('utf-16-be').hex().upper()}>")
+            lines.append("endbfchar")
+        lines += ["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"]
+        return "\n".join(lines).encode("ascii")
+
+    def write(self, writer, font_num):
+        """写入字体相关的所有对象"""
+        font_data, is_truetype = self._subset_data()
+        # 子集字体名需要6位大写字母前缀
+        digest = hashlib.md5(repr(sorted(self.used)).encode()).digest()
+        tag = "".join(chr(ord("A") + b % 26) for b in digest[:6])
+        ps_name = self.font["name"].getDebugName(6) or "CJKFont"
+        base_font = f"{tag}+{ps_name.replace(' ', '')}"
+
+        scale = 1000 / self.units_per_em
+        hmtx = self.font["hmtx"]
+        glyph_order = self.font.getGlyphOrder()
+        widths = " ".join(
+            f"{gid} [{round(hmtx[glyph_order[gid]][0] * scale)}]" for gid in sorted(self.used)
+        )
+        head = self.font["head"]
+        bbox = [round(v * scale) for v in (head.xMin, head.yMin, head.xMax, head.yMax)]
+
+        cid_num, descriptor_num, file_num, unicode_num = (writer.reserve() for _ in range(4))
+        if is_truetype:
+            writer.write_stream(file_num, font_data, f" /Length1 {len(font_data)}")
+            file_key, cid_subtype = "FontFile2", "CIDFontType2"
+        else:
+            writer.write_stream(file_num, font_data, " /Subtype /OpenType")
+            file_key, cid_subtype = "FontFile3", "CIDFontType0"
+
+        writer.write_object(descriptor_num, (
+            f"<< /Type /FontDescriptor /FontName /{base_font} /Flags 4"
+            f" /FontBBox [{' '.join(map(str, bbox))}] /ItalicAngle 0"
+            f" /Ascent {round(self.ascent * 1000)} /Descent {round(self.descent * 1000)}"
+            f" /CapHeight {round(self.ascent * 1000)} /StemV 80 /{file_key} {file_num} 0 R >>"
+        ))
+        cid_to_gid = " /CIDToGIDMap /Identity" if is_truetype else ""
+        writer.write_object(cid_num, (
+            f"<< /Type /Font /Subtype /{cid_subtype} /BaseFont /{base_font}"
+            f" /CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >>"
+            f" /FontDescriptor {descriptor_num} 0 R /W [{widths}]{cid_to_gid} >>"
+        ))
+        writer.write_stream(unicode_num, self._to_unicode())
+        writer.write_object(font_num, (
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /{base_font} /Encoding /Identity-H"
+            f" /DescendantFonts [{cid_num} 0 R] /ToUnicode {unicode_num} 0 R >>"
+        ))
+
+
+def qr_rectangles(matrix):
+    """将二维码矩阵按行合并为连续的矩形 (列, 行, 宽度)"""
+    rects = []
+    for row_index, row in enumerate(np.asarray(matrix, dtype=np.int8)):
+        edges = np.diff(np.concatenate(([0], row, [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        rects.extend((int(start), row_index, int(end - start)) for start, end in zip(starts, ends))
+    return rects
+
+
+class PdfExporter:
+    """流式PDF导出：每个学生（或每张拼版）一页，写完即落盘，内存占用与名单长度无关
+
+    Logo作为共享图像对象只嵌入一次，文字为真实的PDF文字（嵌入子集字体），二维码为矢量矩形。
+    """
+
+    def __init__(self, path, qr_size_percent=None, logo_path=None, font_path=None, font_index=None):
+        """path 可以是文件路径，也可以是已打开的二进制文件对象（不会被关闭）"""
+        self.path = path
+        self.qr_size_percent = resolve_qr_size(qr_size_percent)
+        self.logo_path = config.DEFAULT_LOGO if logo_path is None else logo_path
+        self.logo_size = get_logo_size(self.logo_path) if os.path.exists(self.logo_path) else None
+        self.font = PdfFont(font_path or config.FONT_PATH, font_index)
+
+        self.owns_file = not hasattr(path, "write")
+        self.file = open(path, "wb") if self.owns_file else path
+        self.writer = PdfWriter(self.file)
+        self.pages_num = self.writer.reserve()
+        self.font_num = self.writer.reserve()
+        self.logo_num = None
+        self.page_nums = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.owns_file:
+            self.file.close()
+
+    @property
+    def page_count(self):
+        return len(self.page_nums)
+
+    def _logo_object(self):
+        """首次使用时写入Logo图像，之后所有页面共享引用"""
+        if self.logo_num is None:
+            self.logo_num = self.writer.reserve()
+            with Image.open(self.logo_path) as logo:
+                # 与位图输出一致，不使用透明通道
+                logo = logo.convert("RGB")
+                width, height = logo.size
+                data = logo.tobytes()
+            self.writer.write_stream(self.logo_num, data, (
+                f" /Type /XObject /Subtype /Image /Width {width} /Height {height}"
+                f" /ColorSpace /DeviceRGB /BitsPerComponent 8"
+            ))
+        return self.logo_num
+
+    def _label_content(self, student_id, name, subject, paper_size_mm, offset_px, page_height_pt):
+        """生成单个标签的绘图指令，offset_px为标签在页面上的位置（300DPI像素）"""
+        plan = plan_label(paper_size_mm, self.qr_size_percent, self.logo_size,
+                          bool(subject), LAYOUT_DPI)
+        offset_x, offset_y = offset_px
+        ops = []
+
+        def to_pdf(x, y, height=0):
+            # 像素坐标（原点在左上角）转换为PDF坐标（原点在左下角）
+            return (offset_x + x) * PX_TO_PT, page_height_pt - (offset_y + y + height) * PX_TO_PT
+
+        if plan.logo_box:
+            self._logo_object()
+            x, y, width, height = plan.logo_box
+            left, bottom = to_pdf(x, y, height)
+            ops.append(f"q {_num(width * PX_TO_PT)} 0 0 {_num(height * PX_TO_PT)} "
+                       f"{_num(left)} {_num(bottom)} cm /Logo Do Q")
+
+        if plan.has_text:
+            # 过长的行按嵌入的字体缩小字号或截断，与位图输出相同
+            fitted = layout_text(plan, label_text_lines(student_id, name, subject),
+                                 self.font.font_path, self.font.font_index)
+            current_size = fitted[0][2]
+            ops.append(f"BT 0 g /F1 {_num(current_size * PX_TO_PT)} Tf")
+            for text_x, text_y, font_size, text in fitted:
+                if font_size != current_size:
+                    ops.append(f"/F1 {_num(font_size * PX_TO_PT)} Tf")
+                    current_size = font_size
+                # 位图文字以上缘定位，PDF文字以基线定位
+                x, baseline = to_pdf(text_x, text_y, font_size * self.font.ascent)
+                ops.append(f"1 0 0 1 {_num(x)} {_num(baseline)} Tm {self.font.encode(text)} Tj")
+            ops.append("ET")
+
+        qr_x, qr_y, qr_size = plan.qr_box
+        matrix = qr_matrix(build_qr_payload(student_id, name, subject))
+        module = qr_size * PX_TO_PT / matrix.shape[0]
+        left, top = to_pdf(qr_x, qr_y)
+        ops.append("0 g")
+        for col, row, width in qr_rectangles(matrix):
+            ops.append(f"{_num(left + col * module)} {_num(top - (row + 1) * module)} "
+                       f"{_num(width * module)} {_num(module)} re")
+        ops.append("f")
+        return ops
+
+    def _write_page(self, page_size_mm, ops, copies=1):
+        """写入一页的内容流和页面对象，copies 份相同的页面共享同一个内容流"""
+        width_pt, height_pt = (mm_to_points(v) for v in page_size_mm)
+        content_num = self.writer.reserve()
+        self.writer.write_stream(content_num, "\n".join(ops).encode("latin-1"))
+
+        resources = f"/Font << /F1 {self.font_num} 0 R >>"
+        if self.logo_num is not None:
+            resources += f" /XObject << /Logo {self.logo_num} 0 R >>"
+        for _ in range(copies):
+            page_num = self.writer.reserve()
+            self.writer.write_object(page_num, (
+                f"<< /Type /Page /Parent {self.pages_num} 0 R"
+                f" /MediaBox [0 0 {_num(width_pt)} {_num(height_pt)}]"
+                f" /Resources << {resources} >> /Contents {content_num} 0 R >>"
+            ))
+            self.page_nums.append(page_num)
+
+    def add_label(self, student_id, name, subject=None, paper_size_mm=(297, 210), copies=1):
+        """添加 copies 页，内容为单个学生的标签"""
+        height_pt = mm_to_points(paper_size_mm[1])
+        ops = self._label_content(student_id, name, subject, paper_size_mm, (0, 0), height_pt)
+        self._write_page(paper_size_mm, ops, copies)
+
+    def add_sheet(self, labels, sheet_size_mm, label_size_mm=(40, 20), gutter_mm=2, margin_mm=5,
+                  cut_marks=True):
+        """添加一页拼版，labels 最多填满一张纸，多余的会被忽略"""
+        from imposition import grid_layout, cut_mark_lines, cut_mark_width
+
+        cols, rows, positions = grid_layout(sheet_size_mm, label_size_mm, gutter_mm, margin_mm, LAYOUT_DPI)
+        height_pt = mm_to_points(sheet_size_mm[1])
+        ops = []
+        for label, position in zip(labels, positions):
+            ops += self._label_content(label["student_id"], label["name"], label.get("subject") or None,
+                                       label_size_mm, position, height_pt)
+        if cut_marks and labels:
+            label_size_px = tuple(mm_to_pixels(v, LAYOUT_DPI) for v in label_size_mm)
+            sheet_size_px = tuple(mm_to_pixels(v, LAYOUT_DPI) for v in sheet_size_mm)
+            ops.append(f"0 G {_num(cut_mark_width(LAYOUT_DPI) * PX_TO_PT)} w")
+            for (x0, y0), (x1, y1) in cut_mark_lines(cols, rows, positions, label_size_px,
+                                                      sheet_size_px, LAYOUT_DPI):
+                ops.append(f"{_num(x0 * PX_TO_PT)} {_num(height_pt - y0 * PX_TO_PT)} m "
+                           f"{_num(x1 * PX_TO_PT)} {_num(height_pt - y1 * PX_TO_PT)} l")
+            ops.append("S")
+        self._write_page(sheet_size_mm, ops)
+        return len(positions)
+
+    def close(self):
+        """写入字体、页面树和交叉引用表，完成文档"""
+        self.font.write(self.writer, self.font_num)
+        kids = " ".join(f"{num} 0 R" for num in self.page_nums)
+        self.writer.write_object(self.pages_num, (
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_nums)} >>"
+        ))
+        catalog_num = self.writer.reserve()
+        self.writer.write_object(catalog_num, f"<< /Type /Catalog /Pages {self.pages_num} 0 R >>")
+        self.writer.finish(catalog_num)
+        if self.owns_file:
+            self.file.close()
+
+
+def export_roster_pdf(roster, path, qr_size_percent=None, logo_path=None, default_paper_size=None,
+                      impose=False, sheet_size_mm=None, label_size_mm=(40, 20), gutter_mm=2,
+                      margin_mm=5, cut_marks=True, font_path=None, font_index=None, progress=None):
+    """将花名册导出为多页PDF，每个学生每份一页，或按拼版每张纸一页
+
+    path 为文件路径时先写入同目录的临时文件，完成后再替换，中途出错不会留下不完整的PDF。
+    出错的行会被记录并跳过，不会中断整个导出。
+    progress(done, total) 在每页写完后回调。返回包含页数、错误和吞吐量的汇总。
+    """
+    from batch import read_roster, build_jobs
+
+    records = read_roster(roster) if isinstance(roster, (str, os.PathLike)) else roster
+    jobs, errors = build_jobs(records, default_paper_size)
+    start = time.perf_counter()
+
+    if hasattr(path, "write"):
+        exporter, labels = _export_jobs(jobs, errors, path, qr_size_percent, logo_path, impose, sheet_size_mm,
+                                        label_size_mm, gutter_mm, margin_mm, cut_marks, font_path,
+                                        font_index, progress)
+    else:
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".pdf", dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                exporter, labels = _export_jobs(jobs, errors, f, qr_size_percent, logo_path, impose,
+                                                sheet_size_mm, label_size_mm, gutter_mm, margin_mm, cut_marks,
+                                                font_path, font_index, progress)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    elapsed = time.perf_counter() - start
+    errors.sort(key=lambda e: e["line"])
+    return {
+        "pages": exporter.page_count,
+        "labels": labels,
+        "errors": errors,
+        "elapsed": elapsed,
+        "pages_per_sec": exporter.page_count / elapsed if elapsed > 0 else 0.0,
+        "size": os.path.getsize(path) if isinstance(path, (str, os.PathLike)) else None,
+    }
+
+
+def _export_jobs(jobs, errors, f, qr_size_percent, logo_path, impose, sheet_size_mm, label_size_mm,
+                 gutter_mm, margin_mm, cut_marks, font_path, font_index, progress):
+    """把任务写入已打开的文件，出错的行追加到 errors，返回 (exporter, 成功的标签数)"""
+    from imposition import grid_layout
+
+    def failed(job, e):
+        errors.append({"line": job["line"], "record": job, "error": str(e)})
+
+    labels = 0
+    with PdfExporter(f, qr_size_percent, logo_path, font_path, font_index) as exporter:
+        if impose:
+            if sheet_size_mm is None:
+                sheet_size_mm = config.PAPER_SIZES["A4"]
+            # 先逐个生成一次标签内容，出错的行不占用拼版位置
+            cells = []
+            for job in jobs:
+                try:
+                    exporter._label_content(job["student_id"], job["name"], job["subject"], label_size_mm,
+                                            (0, 0), 0)
+                except Exception as e:
+                    failed(job, e)
+                    continue
+                labels += 1
+                cells += [job] * job["copies"]
+            per_sheet = len(grid_layout(sheet_size_mm, label_size_mm, gutter_mm, margin_mm, LAYOUT_DPI)[2])
+            total = (len(cells) + per_sheet - 1) // per_sheet
+            for index in range(0, len(cells), per_sheet):
+                exporter.add_sheet(cells[index:index + per_sheet], sheet_size_mm, label_size_mm,
+                                   gutter_mm, margin_mm, cut_marks)
+                if progress:
+                    progress(exporter.page_count, total)
+        else:
+            total = sum(job["copies"] for job in jobs)
+            for job in jobs:
+                try:
+                    exporter.add_label(job["student_id"], job["name"], job["subject"], job["paper_size"],
+                                       job["copies"])
+                except OSError:
+                    raise  # 写入失败，整个文件作废
+                except Exception as e:
+                    failed(job, e)
+                    total -= job["copies"]
+                    continue
+                labels += 1
+                if progress:
+                    progress(exporter.page_count, total)
+    return exporter, labels
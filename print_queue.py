@@ -0,0 +1,257 @@
+"""打印队列：在后台线程中渲染、写入独立的临时文件并交给系统打印
+
+- 每个任务使用 tempfile 生成的独立文件，连续打印不会互相覆盖
+- 份数交给打印系统处理（lp -n / lpr -#，并由打印机逐份整理），只渲染和传输一次
+- Linux/macOS 通过 CUPS 的 lp 或 lpr 打印，Windows 使用 os.startfile（不支持份数参数，
+  交给打印程序的是一个按份数重复页面的多页TIFF，只调用一次；打印程序异步读取文件，
+  文件在之后的任务或关闭队列时删除）
+- 配置项 PRINT_COMMAND 可以替换为任意命令（例如测试用的替身），
+  可使用占位符 {file} {copies} {printer} {title}
+
+测试用的替身打印命令会把收到的任务追加到日志文件中：
+    PRINT_COMMAND = "python print_queue.py record /tmp/jobs.log {file} --copies {copies}"
+"""
+import json
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SPOOL_PREFIX = "bedoya_print_"
+# os.startfile 交给打印程序的文件至少保留的时间（秒），之后才会被清理
+STARTFILE_KEEP_SECONDS = 120
+
+
+class PrintJob:
+    """一个打印任务及其状态（queued、printing、done、failed）"""
+
+    def __init__(self, job_id, source, copies=1, title=None, action=None):
+        self.job_id = job_id
+        self.source = source
+        self.action = action
+        self.copies = max(1, int(copies))
+        self.title = title or f"bedoya-{job_id}"
+        self.status = "queued"
+        self.error = None
+        self.path = None
+        self.submitted = time.perf_counter()
+        self.finished = None
+
+    def __repr__(self):
+        return f"PrintJob({self.job_id}, {self.title!r}, copies={self.copies}, status={self.status!r})"
+
+
+def print_command(path, copies=1, printer=None, title=None, template=None):
+    """生成打印命令参数列表，系统没有可用的打印命令时返回None"""
+    if template:
+        values = {"file": path, "copies": copies, "printer": printer or "", "title": title or ""}
+        return [part.format(**values) for part in shlex.split(template, posix=os.name != "nt")]
+    if shutil.which("lp"):
+        command = ["lp", "-n", str(copies), "-o", "collate=true"]
+        if title:
+            command += ["-t", title]
+        if printer:
+            command += ["-d", printer]
+        return command + [path]
+    if shutil.which("lpr"):
+        command = ["lpr", "-#", str(copies)]
+        if title:
+            command += ["-T", title]
+        if printer:
+            command += ["-P", printer]
+        return command + [path]
+    return None
+
+
+def spool_image(source, spool_dir=None, suffix=".png", copies=1):
+    """将标签写入独立的临时文件，返回文件路径
+
+    source 可以是 LabelTile、PIL图像，或返回两者之一的函数（在队列线程中渲染）。
+    copies 大于1时写入每份一页的多页TIFF（suffix 应为 .tif），用于不支持份数参数的打印方式。
+    """
+    if callable(source):
+        source = source()
+    if source is None:
+        raise ValueError("无法生成标签，请检查Logo和字体设置")
+    fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix=suffix, dir=spool_dir)
+    try:
+        if copies > 1:
+            # 多页TIFF写入时需要回读文件，按路径写入
+            os.close(fd)
+            image = source.to_image() if hasattr(source, "to_image") else source
+            image.save(path, "TIFF", save_all=True, append_images=[image] * (copies - 1),
+                       compression="tiff_deflate")
+        else:
+            with os.fdopen(fd, "wb") as f:
+                source.save(f, "PNG")
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+class PrintQueue:
+    """后台打印队列，submit 立即返回，任务按提交顺序在工作线程中执行
+
+    on_done(job) 在工作线程中回调（界面程序需要自行切换到界面线程）。
+    """
+
+    def __init__(self, printer=None, command=None, spool_dir=None, on_done=None, timeout=60):
+        import config
+
+        self.printer = printer
+        self.command = config.PRINT_COMMAND if command is None else command
+        self.spool_dir = spool_dir
+        self.on_done = on_done
+        self.timeout = timeout
+        self.jobs = queue.Queue()
+        # 交给 os.startfile 的文件 [(路径, 提交时间), ...]，打印程序读完后才能删除
+        self.startfile_spool = []
+        self.next_id = 1
+        self.lock = threading.Lock()
+        self.stats = {"jobs": 0, "copies": 0, "failed": 0, "busy_seconds": 0.0}
+        self.worker = threading.Thread(target=self._run, name="print-queue", daemon=True)
+        self.worker.start()
+
+    def submit(self, source, copies=1, title=None):
+        """加入打印队列，返回 PrintJob"""
+        return self._enqueue(source, copies, title, None)
+
+    def submit_action(self, action, copies=1, title=None):
+        """加入一个自行完成打印的任务（例如直连标签打印机），action() 在队列线程中执行"""
+        return self._enqueue(None, copies, title, action)
+
+    def _enqueue(self, source, copies, title, action):
+        with self.lock:
+            job = PrintJob(self.next_id, source, copies, title, action)
+            self.next_id += 1
+        self.jobs.put(job)
+        return job
+
+    def wait(self):
+        """等待已提交的任务全部完成"""
+        self.jobs.join()
+
+    def close(self):
+        """处理完剩余任务后停止工作线程，并删除交给 os.startfile 的临时文件"""
+        self.jobs.put(None)
+        self.worker.join()
+        self._clean_startfile_spool(force=True)
+
+    def info(self):
+        with self.lock:
+            return {**self.stats, "pending": self.jobs.qsize()}
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                self._process(job)
+            finally:
+                self.jobs.task_done()
+
+    def _process(self, job):
+        start = time.perf_counter()
+        job.status = "printing"
+        try:
+            if job.action:
+                job.action()
+            else:
+                self._clean_startfile_spool()
+                if self._uses_startfile():
+                    suffix = ".tif" if job.copies > 1 else ".png"
+                    job.path = spool_image(job.source, self.spool_dir, suffix, job.copies)
+                else:
+                    job.path = spool_image(job.source, self.spool_dir)
+                job.source = None
+                self._dispatch(job)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        job.finished = time.perf_counter()
+        with self.lock:
+            self.stats["busy_seconds"] += job.finished - start
+            if job.status == "done":
+                self.stats["jobs"] += 1
+                self.stats["copies"] += job.copies
+            else:
+                self.stats["failed"] += 1
+        if self.on_done:
+            self.on_done(job)
+
+    def _uses_startfile(self):
+        """没有可用的打印命令时使用 os.startfile（Windows）"""
+        return print_command("", printer=self.printer, template=self.command) is None
+
+    def _clean_startfile_spool(self, force=False):
+        """删除之前交给 os.startfile 的文件；打印程序仍在读取时（Windows上无法删除）留到下次"""
+        now = time.time()
+        remaining = []
+        for path, submitted in self.startfile_spool:
+            if not force and now - submitted < STARTFILE_KEEP_SECONDS:
+                remaining.append((path, submitted))
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                remaining.append((path, submitted))
+        self.startfile_spool = remaining
+
+    def _dispatch(self, job):
+        command = print_command(job.path, job.copies, self.printer, job.title, self.command)
+        if command is None:
+            if not hasattr(os, "startfile"):
+                os.remove(job.path)
+                raise RuntimeError("没有找到打印命令（lp/lpr），请安装CUPS或设置PRINT_COMMAND")
+            # 打印动作没有份数参数：文件中已按份数重复页面，只调用一次。
+            # 打印程序异步读取文件，不能立即删除，在之后的任务或关闭队列时清理
+            self.startfile_spool.append((job.path, time.time()))
+            os.startfile(job.path, "print")
+            return
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+            if result.returncode != 0:
+                raise RuntimeError((result.stderr or result.stdout).strip() or f"打印命令返回{result.returncode}")
+        finally:
+            # lp/lpr 返回时已经把文件复制到系统队列
+            os.remove(job.path)
+
+
+def record_job(log_path, file_path, copies):
+    """替身打印命令：把任务追加到日志（JSON行），用于测试任务数、份数、页数和吞吐量"""
+    from PIL import Image
+
+    with Image.open(file_path) as image:
+        pages = getattr(image, "n_frames", 1)
+    entry = {"file": os.path.basename(file_path), "copies": int(copies), "pages": pages,
+             "bytes": os.path.getsize(file_path), "time": time.time()}
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="打印队列工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="替身打印命令：记录任务到日志文件")
+    record.add_argument("log")
+    record.add_argument("file")
+    record.add_argument("--copies", type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record_job(args.log, args.file, args.copies)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""渲染各阶段的耗时统计
+
+render_label_tile 等热点路径用 stage() 标记各个阶段（二维码编码、Logo解码、缩放、
+文字绘制、粘贴、PNG编码等）。没有任何监听者时 stage() 直接返回一个共享的空上下文，
+只多一次函数调用和一次判断，不计时也不分配对象。
+
+用法:
+    import profiling
+
+    with profiling.profile() as stats:        # 统计当前线程中的渲染
+        render_label_tile(...)
+    print(profiling.format_summary(stats.summary()))
+
+    profiling.add_listener(callback)           # callback(阶段名, 秒, 字节数)
+    profiling.enable()                         # 汇总到全局直方图 profiling.global_stats()
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图的桶：以微秒为单位按2的幂划分，最后一个桶收集所有更慢的记录
+HISTOGRAM_BUCKETS = 24
+
+# 阶段的显示名称（未列出的阶段直接显示阶段名）
+STAGE_LABELS = {
+    "layout": "布局",
+    "logo_header": "Logo文件头",
+    "logo_decode": "Logo解码",
+    "logo_resize": "Logo缩放",
+    "qr_encode": "二维码编码",
+    "qr_raster": "二维码栅格化",
+    "font": "字体加载",
+    "canvas": "画布",
+    "logo_paste": "Logo粘贴",
+    "text": "文字绘制",
+    "qr_paste": "二维码粘贴",
+    "restore": "底图恢复",
+    "compose": "整页合成",
+    "png_encode": "PNG编码",
+}
+
+_listeners = ()
+_listeners_lock = threading.Lock()
+
+
+class _NullStage:
+    """未启用统计时使用的空上下文"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """计时上下文，退出时把耗时和字节数发给所有监听者"""
+    __slots__ = ("name", "start", "nbytes")
+
+    def __init__(self, name):
+        self.name = name
+        self.nbytes = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        for listener in _listeners:
+            listener(self.name, elapsed, self.nbytes)
+        return False
+
+    def add_bytes(self, nbytes):
+        """记录本阶段分配的缓冲区大小"""
+        self.nbytes += nbytes
+
+
+def stage(name):
+    """标记一个渲染阶段：with stage("qr_raster") as s: ...; s.add_bytes(n)"""
+    if not _listeners:
+        return NULL_STAGE
+    return _Stage(name)
+
+
+def image_bytes(image):
+    """PIL图像像素缓冲区的大小（字节）"""
+    return image.width * image.height * len(image.getbands())
+
+
+def add_listener(callback):
+    """注册监听者 callback(阶段名, 秒, 字节数)，会在执行渲染的线程中调用"""
+    global _listeners
+    with _listeners_lock:
+        _listeners = _listeners + (callback,)
+
+
+def remove_listener(callback):
+    global _listeners
+    with _listeners_lock:
+        _listeners = tuple(listener for listener in _listeners if listener is not callback)
+
+
+def is_enabled():
+    """当前是否有监听者（即 stage() 是否在计时）"""
+    return bool(_listeners)
+
+
+class StageHistogram:
+    """单个阶段的耗时直方图"""
+    __slots__ = ("count", "total", "min", "max", "bytes", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.bytes = 0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds, nbytes=0):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.bytes += nbytes
+        bucket = min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.buckets[bucket] += 1
+
+    def percentile(self, percent):
+        """按桶估算百分位数（返回桶的上界，秒）"""
+        if not self.count:
+            return None
+        target = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def snapshot(self):
+        """可序列化（JSON/pickle）的统计结果"""
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else None,
+            "min_ms": self.min * 1000 if self.min is not None else None,
+            "max_ms": self.max * 1000,
+            "p50_ms": self.percentile(50) * 1000 if self.count else None,
+            "p99_ms": self.percentile(99) * 1000 if self.count else None,
+            "bytes": self.bytes,
+            "buckets": list(self.buckets),
+        }
+
+    def merge(self, snapshot):
+        """合并另一个进程的 snapshot()"""
+        if not snapshot["count"]:
+            return
+        self.count += snapshot["count"]
+        self.total += snapshot["total_ms"] / 1000
+        other_min = snapshot["min_ms"] / 1000
+        self.min = other_min if self.min is None else min(self.min, other_min)
+        self.max = max(self.max, snapshot["max_ms"] / 1000)
+        self.bytes += snapshot["bytes"]
+        for bucket, count in enumerate(snapshot["buckets"][:HISTOGRAM_BUCKETS]):
+            self.buckets[bucket] += count
+
+
+class StageStats:
+    """按阶段汇总的直方图，可作为监听者注册
+
+    thread 不为None时只记录该线程中的阶段，避免统计到其他线程的渲染。
+    """
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, name, seconds, nbytes):
+        if self.thread is not None and threading.get_ident() != self.thread:
+            return
+        with self.lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = StageHistogram()
+            histogram.add(seconds, nbytes)
+
+    def summary(self):
+        """各阶段的统计结果 {阶段名: snapshot}"""
+        with self.lock:
+            return {name: histogram.snapshot() for name, histogram in self.stages.items()}
+
+    def merge(self, summary):
+        """合并 summary() 的结果（例如来自工作进程）"""
+        with self.lock:
+            for name, snapshot in summary.items():
+                histogram = self.stages.get(name)
+                if histogram is None:
+                    histogram = self.stages[name] = StageHistogram()
+                histogram.merge(snapshot)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+
+
+@contextmanager
+def profile(all_threads=False):
+    """在上下文中统计渲染阶段，返回 StageStats（默认只统计当前线程）"""
+    stats = StageStats(None if all_threads else threading.get_ident())
+    add_listener(stats)
+    try:
+        yield stats
+    finally:
+        remove_listener(stats)
+
+
+_global_stats = StageStats()
+
+
+def enable():
+    """开始把所有线程的阶段汇总到全局统计"""
+    if _global_stats not in _listeners:
+        add_listener(_global_stats)
+
+
+def disable():
+    remove_listener(_global_stats)
+
+
+def global_stats():
+    """全局统计（enable() 之后的所有渲染）"""
+    return _global_stats
+
+
+def format_summary(summary, limit=None):
+    """把 summary() 的结果格式化为一行文字，按总耗时从高到低排列"""
+    stages = sorted(summary.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    if limit:
+        stages = stages[:limit]
+    return "，".join(f"{STAGE_LABELS.get(name, name)} {snapshot['total_ms']:.1f}ms"
+                    for name, snapshot in stages)
+
+
+def format_table(summary):
+    """把 summary() 的结果格式化为多行表格"""
+    headers = ["阶段", "次数", "总计(ms)", "平均(ms)", "p50(ms)", "p99(ms)", "最大(ms)", "内存(KB)"]
+    rows = []
+    for name, s in sorted(summary.items(), key=lambda item: item[1]["total_ms"], reverse=True):
+        rows.append([STAGE_LABELS.get(name, name), s["count"], f"{s['total_ms']:.1f}",
+                     f"{s['mean_ms']:.2f}", f"{s['p50_ms']:.2f}", f"{s['p99_ms']:.2f}",
+                     f"{s['max_ms']:.2f}", f"{s['bytes'] / 1024:.0f}"])
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    lines = ["  ".join(str(h).ljust(w) for h, w in zip(headers, widths))]
+    for row in rows:
+        lines.append("  ".join(str(cell).ljust(w) for cell, w in zip(row, widths)))
+    return "\n".join(lines)
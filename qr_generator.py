@@ -1,237 +1,446 @@
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
 import qrcode
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+from qrcode.base import rs_blocks
+from qrcode.util import QRData, MODE_8BIT_BYTE
+
 import config
-import os
+import profiling
+from font_cache import get_font
+from layout import plan_label, mm_to_pixels, fit_keep_aspect, is_full_layout
+from text_layout import layout_text
+
+# Logo缓存的最大条目数（不同路径/尺寸的组合）
+LOGO_CACHE_SIZE = 16
+
+_logo_cache = OrderedDict()
+_logo_cache_lock = threading.Lock()
+_logo_cache_stats = {"hits": 0, "misses": 0}
+
+# 二维码矩阵缓存的最大条目数（不同内容/纠错级别的组合）
+QR_MATRIX_CACHE_SIZE = 256
+
+# 支持的输出颜色模式：RGB彩色，"1"为1位黑白（热敏标签打印机）
+OUTPUT_MODES = ("RGB", "1")
 
-def mm_to_pixels(mm, dpi=300):
-    """将毫米转换为像素"""
-    return int(mm * dpi / 25.4)
+# 渲染器版本，是磁盘渲染缓存键的一部分；修改会改变输出像素的代码时加1
+RENDERER_VERSION = 4
 
-def resize_keep_aspect(image, target_size):
+def resize_keep_aspect(image, target_size, resample=Image.Resampling.LANCZOS):
     """调整图像大小，保持宽高比"""
-    if isinstance(target_size, tuple):
-        target_width, target_height = target_size
-    else:
-        target_width = target_height = target_size
-        
-    width, height = image.size
-    aspect = width / height
+    return image.resize(fit_keep_aspect(image.size, target_size), resample)
+
+def build_qr_payload(student_id, name, subject=None):
+    """生成二维码中编码的文本"""
+    qr_data = f"ID:{student_id}\nName:{name}"
+    if subject:
+        qr_data += f"\nSubject:{subject}"
+    return qr_data
+
+@lru_cache(maxsize=None)
+def qr_capacity_table(error_correction):
+    """字节模式下各版本(1-40)可容纳的最大字节数，下标0对应版本1"""
+    capacities = []
+    for version in range(1, 41):
+        data_bits = sum(block.data_count for block in rs_blocks(version, error_correction)) * 8
+        # 4位模式指示符 + 字符计数（版本1-9为8位，10-40为16位）
+        length_bits = 8 if version < 10 else 16
+        capacities.append((data_bits - 4 - length_bits) // 8)
+    return tuple(capacities)
+
+def qr_version_for(data_length, error_correction):
+    """查表选择能容纳指定字节数的最小版本"""
+    for version, capacity in enumerate(qr_capacity_table(error_correction), start=1):
+        if data_length <= capacity:
+            return version
+    raise ValueError(f"二维码内容过长（{data_length}字节）")
+
+@lru_cache(maxsize=QR_MATRIX_CACHE_SIZE)
+def qr_matrix(payload, error_correction=qrcode.constants.ERROR_CORRECT_H, border=1):
+    """计算二维码模块矩阵，按(内容, 纠错级别, 边框)缓存
+
+    返回只读的布尔数组（含边框），可在不同纸张尺寸、二维码大小和预览之间复用。
+    """
+    data = payload.encode("utf-8")
+    qr = qrcode.QRCode(
+        version=qr_version_for(len(data), error_correction),
+        error_correction=error_correction,
+        border=border,
+    )
+    # 统一使用字节模式，与容量表保持一致，省去逐版本试探
+    qr.add_data(QRData(data, mode=MODE_8BIT_BYTE, check_data=False))
+    qr.make(fit=False)
+    matrix = np.array(qr.get_matrix(), dtype=bool)
+    matrix.flags.writeable = False
+    return matrix
+
+def qr_matrix_cache_info():
+    """返回二维码矩阵缓存的命中统计"""
+    info = qr_matrix.cache_info()
+    return {"hits": info.hits, "misses": info.misses,
+            "size": info.currsize, "maxsize": info.maxsize}
+
+def rasterize_qr_matrix(matrix, size, mode="L"):
+    """将二维码模块矩阵直接展开为目标像素尺寸的黑白图像（mode为"L"或1位的"1"）
+
+    每个像素按整数对齐映射到所属模块，尺寸不能整除时余数像素均匀分配到各模块，
+    不经过中间图像和插值缩放，模块边缘保持锐利。
+    """
+    modules = np.asarray(matrix, dtype=bool)
+    count = modules.shape[0]
+    # 每个模块的像素边界，相邻模块的宽度最多相差1像素
+    edges = np.arange(count + 1) * size // count
+    widths = np.diff(edges)
+    if mode == "1":
+        # 1位图像中True为白色
+        pixels = np.repeat(np.repeat(~modules, widths, axis=0), widths, axis=1)
+        return Image.fromarray(pixels)
+    # 深色模块为0（黑），浅色为255（白），先在模块尺度上取值再逐行逐列展开
+    values = np.where(modules, 0, 255).astype(np.uint8)
+    pixels = np.repeat(np.repeat(values, widths, axis=0), widths, axis=1)
+    return Image.fromarray(pixels, mode="L")
+
+def to_bilevel(image, threshold=None):
+    """将图像转换为1位黑白：threshold为None时使用Floyd-Steinberg抖动，否则按亮度阈值二值化"""
+    # 与彩色输出一致，先去掉透明通道
+    gray = image.convert("RGB").convert("L")
+    if threshold is None:
+        return gray.convert("1")
+    return gray.point(lambda value: 255 if value >= threshold else 0).convert("1", dither=Image.Dither.NONE)
+
+def load_logo(logo_path, target_size, resample=Image.Resampling.LANCZOS, mode="RGB", threshold=None):
+    """加载并缩放Logo，结果按(路径, 修改时间/大小, 目标尺寸, 重采样方式, 模式)缓存
+
+    mode为"1"时在缩放后转换为1位黑白（见 to_bilevel，threshold为二值化阈值）。
+    返回的图像在缓存中共享，调用方只能读取（如paste），不能原地修改。
+    """
+    stat = os.stat(logo_path)
+    if not isinstance(target_size, tuple):
+        target_size = (target_size, target_size)
+    key = (os.path.abspath(logo_path), stat.st_mtime_ns, stat.st_size,
+           target_size, resample, mode, threshold)
+    
+    with _logo_cache_lock:
+        logo = _logo_cache.get(key)
+        if logo is not None:
+            _logo_cache.move_to_end(key)
+            _logo_cache_stats["hits"] += 1
+            return logo
+        _logo_cache_stats["misses"] += 1
+    
+    with Image.open(logo_path) as source:
+        with profiling.stage("logo_decode") as s:
+            source.load()
+            s.add_bytes(profiling.image_bytes(source))
+        with profiling.stage("logo_resize") as s:
+            logo = resize_keep_aspect(source, target_size, resample)
+            # 提前转换为最终模式，避免每次粘贴时再转换（mode为None时保持原模式）
+            if mode is not None and mode != "1" and logo.mode != mode:
+                logo = logo.convert(mode)
+            s.add_bytes(profiling.image_bytes(logo))
+        if mode == "1":
+            # 只有Logo需要抖动或二值化，二维码和文字本身就是纯黑白
+            with profiling.stage("logo_dither"):
+                logo = to_bilevel(logo, threshold)
+    
+    with _logo_cache_lock:
+        _logo_cache[key] = logo
+        _logo_cache.move_to_end(key)
+        while len(_logo_cache) > LOGO_CACHE_SIZE:
+            _logo_cache.popitem(last=False)
+    return logo
+
+def get_logo_size(logo_path):
+    """读取Logo原图尺寸（只解析文件头），按路径和修改时间缓存"""
+    stat = os.stat(logo_path)
+    return _logo_source_size(os.path.abspath(logo_path), stat.st_mtime_ns, stat.st_size)
+
+@lru_cache(maxsize=LOGO_CACHE_SIZE)
+def _logo_source_size(logo_path, mtime_ns, file_size):
+    with Image.open(logo_path) as image:
+        return image.size
+
+def logo_cache_info():
+    """返回Logo缓存的命中统计"""
+    with _logo_cache_lock:
+        return {**_logo_cache_stats, "size": len(_logo_cache), "maxsize": LOGO_CACHE_SIZE}
+
+def clear_logo_cache():
+    """清空Logo缓存及统计"""
+    with _logo_cache_lock:
+        _logo_cache.clear()
+        _logo_cache_stats["hits"] = 0
+        _logo_cache_stats["misses"] = 0
+
+def layout_font_sizes(qr_size_percents=None, dpi=300):
+    """计算标准布局和全画幅布局在指定分辨率下实际会用到的字号"""
+    if qr_size_percents is None:
+        qr_size_percents = [percent / 100 for percent in range(5, 21)]  # 与界面的5%-20%一致
+    
+    sizes = set()
+    # 标准布局（A4/A3）：二维码尺寸的15%，最大3mm
+    for paper_size_mm in (config.PAPER_SIZES["A4"], config.PAPER_SIZES["A3"]):
+        base_size = min(mm_to_pixels(paper_size_mm[0], dpi), mm_to_pixels(paper_size_mm[1], dpi))
+        for percent in qr_size_percents:
+            qr_size = int(base_size * percent)
+            sizes.add(min(int(qr_size * 0.15), mm_to_pixels(3, dpi)))
+    # 全画幅布局（标签尺寸）：短边的12%
+    for label in config.LABEL_SIZES + config.LABEL_PRINTER_SIZES:
+        width_pixels = mm_to_pixels(label['width'], dpi)
+        height_pixels = mm_to_pixels(label['height'], dpi)
+        sizes.add(int(min(width_pixels, height_pixels) * 0.12))
+    return sorted(size for size in sizes if size > 0)
+
+def warm_font_cache(sizes=None, font_path=None, dpi=None):
+    """预先加载常用字号的字体，通常在程序启动时调用"""
+    if sizes is None:
+        sizes = layout_font_sizes(dpi=dpi or config.PRINT_DPI)
+    for size in sizes:
+        get_font(size, font_path)
+
+class LabelTile:
+    """标签图块：只保存有内容的区域及其在整张纸上的位置
+
+    标准布局的内容只占纸张右下角的一小块，整张纸在需要时才合成（to_image），
+    保存PNG时空白部分按行直接写出，内存和编码时间只与标签大小相关。
+    """
+
+    def __init__(self, image, offset, sheet_size, background="white", dpi=None):
+        self.image = image
+        self.offset = offset
+        self.sheet_size = sheet_size
+        self.background = background
+        self.dpi = dpi
+
+    @property
+    def bbox(self):
+        """图块在整张纸上的区域 (left, top, right, bottom)"""
+        left, top = self.offset
+        return (left, top, left + self.image.size[0], top + self.image.size[1])
+
+    def to_image(self):
+        """合成整张纸的图像"""
+        if self.offset == (0, 0) and self.image.size == self.sheet_size:
+            return self.image
+        with profiling.stage("compose") as s:
+            sheet = Image.new(self.image.mode, self.sheet_size, self.background)
+            sheet.paste(self.image, self.offset)
+            s.add_bytes(profiling.image_bytes(sheet))
+        return sheet
+
+    def save(self, fp, format=None):
+        """保存为图像文件，PNG格式逐行写出而不合成整张纸"""
+        if format is None and isinstance(fp, (str, os.PathLike)):
+            format = os.path.splitext(os.fspath(fp))[1].lstrip(".")
+        format = {"JPG": "JPEG", "TIF": "TIFF"}.get((format or "").upper(), (format or "").upper()) or None
+        if format == "PNG" and self.image.mode in ("RGB", "L", "1"):
+            with profiling.stage("png_encode"):
+                if isinstance(fp, (str, os.PathLike)):
+                    with open(fp, "wb") as f:
+                        _write_png_rows(f, self)
+                else:
+                    _write_png_rows(fp, self)
+            return
+        image = self.to_image()
+        params = {}
+        if self.dpi:
+            params["dpi"] = (self.dpi, self.dpi)
+        if format == "TIFF" and image.mode == "1":
+            # 1位图像使用CCITT G4压缩，热敏打印机驱动可以直接使用
+            params["compression"] = "group4"
+        with profiling.stage(f"{(format or 'image').lower()}_encode"):
+            image.save(fp, format, **params)
+
+def _png_chunk(chunk_type, data):
+    """生成PNG数据块"""
+    return (struct.pack(">I", len(data)) + chunk_type + data +
+            struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+def _write_png_rows(f, tile, chunk_size=1 << 16):
+    """按行写出整张纸的PNG，空白行不经过图像缓冲区"""
+    width, height = tile.sheet_size
+    image = tile.image
+    channels = 3 if image.mode == "RGB" else 1
+    color_type = 2 if image.mode == "RGB" else 0
+    bit_depth = 1 if image.mode == "1" else 8
+    background = Image.new(image.mode, (1, 1), tile.background).tobytes()
     
-    if aspect > target_width / target_height:
-        new_width = target_width
-        new_height = int(target_width / aspect)
+    left, top, right, bottom = tile.bbox
+    # 图块超出纸张的部分需要裁掉
+    crop = (max(0, -left), max(0, -top),
+            image.size[0] - max(0, right - width), image.size[1] - max(0, bottom - height))
+    if crop != (0, 0) + image.size:
+        image = image.crop(crop)
+        left, top = max(0, left), max(0, top)
+        right, bottom = left + image.size[0], top + image.size[1]
+    if image.mode == "1":
+        # 1位图像每字节8个像素，左右空白不一定按字节对齐：把图块所在的行合成为整行宽的条带
+        strip = Image.new("1", (width, image.size[1]), tile.background)
+        strip.paste(image, (left, 0))
+        image, left, right = strip, 0, width
+        blank_row = b"\x00" + Image.new("1", (width, 1), tile.background).tobytes()
+        row_bytes = (width + 7) // 8
     else:
-        new_height = target_height
-        new_width = int(target_height * aspect)
+        blank_row = b"\x00" + background * width
+        row_bytes = image.size[0] * channels
+    tile_bytes = image.tobytes()
+    
+    left_fill = background * left
+    right_fill = background * (width - right)
     
-    return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    f.write(b"\x89PNG\r\n\x1a\n")
+    f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0)))
+    if tile.dpi:
+        # 写入物理分辨率（像素/米），打印时按实际尺寸输出
+        pixels_per_meter = int(round(tile.dpi / 0.0254))
+        f.write(_png_chunk(b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1)))
+    
+    compressor = zlib.compressobj(6)
+    pending = []
+    pending_size = 0
+    for y in range(height):
+        if top <= y < bottom:
+            start = (y - top) * row_bytes
+            row = b"\x00" + left_fill + tile_bytes[start:start + row_bytes] + right_fill
+        else:
+            row = blank_row
+        data = compressor.compress(row)
+        if data:
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size >= chunk_size:
+                f.write(_png_chunk(b"IDAT", b"".join(pending)))
+                pending = []
+                pending_size = 0
+    pending.append(compressor.flush())
+    f.write(_png_chunk(b"IDAT", b"".join(pending)))
+    f.write(_png_chunk(b"IEND", b""))
 
-def generate_qr_code(student_id, name, paper_size_mm=(297, 210), qr_size_percent=0.08, logo_path=None, subject=None):
-    """生成标准格式的标签，包含logo、二维码和姓名"""
+def label_text_lines(student_id, name, subject=None):
+    """标签上显示的文字行"""
+    lines = [f"姓名：{name}", f"ID：{student_id}"]
+    if subject:
+        lines.append(f"主题：{subject}")
+    return lines
+
+def render_label_tile(student_id, name, paper_size_mm=(297, 210), qr_size_percent=None, logo_path=None, subject=None, dpi=300,
+                      mode="RGB", logo_threshold=None):
+    """渲染标签图块，标准布局只绘制右下角有内容的区域，失败时返回None
+
+    dpi 决定输出分辨率：打印和保存使用300DPI，预览可以使用屏幕分辨率。
+    mode 为"1"时直接渲染为1位黑白图像（热敏标签打印机），logo_threshold 见 to_bilevel。
+    """
     try:
-        # 将毫米转换为像素
-        width_pixels = mm_to_pixels(paper_size_mm[0])
-        height_pixels = mm_to_pixels(paper_size_mm[1])
-        size = (width_pixels, height_pixels)
+        if logo_path is None:
+            logo_path = config.DEFAULT_LOGO
         
-        # 创建白色背景
-        final_image = Image.new('RGB', size, 'white')
+        # 加载logo原图尺寸（只读取文件头）
+        logo_size = None
+        try:
+            if os.path.exists(logo_path):
+                with profiling.stage("logo_header"):
+                    logo_size = get_logo_size(logo_path)
+        except Exception as e:
+            print(f"无法加载Logo: {str(e)}")
+            return None
         
-        # 判断是否使用全画幅布局（当尺寸小于100mm或是自定义尺寸时）
-        is_full_layout = (min(paper_size_mm) < 100 or 
-                         paper_size_mm not in [config.PAPER_SIZES["A4"], config.PAPER_SIZES["A3"]])
-        
-        if is_full_layout:
-            # 全画幅模式布局
-            margin_pixels = mm_to_pixels(2)  # 2mm边距
-            content_width = width_pixels - 2 * margin_pixels
-            content_height = height_pixels - 2 * margin_pixels
-            
-            # 计算二维码尺寸（占据45%宽度）
-            qr_size = int(content_width * 0.45)
-            
-            # 创建二维码
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_H,
-                box_size=10,
-                border=1,
-            )
-            qr_data = f"ID:{student_id}\nName:{name}"
-            if subject:
-                qr_data += f"\nSubject:{subject}"
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            
-            # 生成二维码图像
-            qr_image = qr.make_image(fill_color="black", back_color="white")
-            qr_image = qr_image.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
-            
-            # 加载和调整Logo大小（占据45%宽度）
-            if logo_path is None:
-                logo_path = config.DEFAULT_LOGO
-                
-            try:
-                if os.path.exists(logo_path):
-                    logo = Image.open(logo_path)
-                    logo_width = int(content_width * 0.45)
-                    logo_height = int(content_height * 0.9)  # 高度占90%
-                    logo = resize_keep_aspect(logo, (logo_width, logo_height))
-            except Exception as e:
-                print(f"无法加载Logo: {str(e)}")
-                return None
-            
-            # Logo放在左边
-            if logo:
-                logo_x = margin_pixels
-                # 调整logo垂直位置，考虑文字空间
-                font_size = int(min(width_pixels, height_pixels) * 0.12)  # 增大字体尺寸
-                text_space = int(font_size * 3)  # 为两行文字和间距预留空间
-                logo_y = (height_pixels - logo.size[1] - text_space) // 2
-                final_image.paste(logo, (logo_x, logo_y))
-                
-                # 在Logo下方添加文字
-                draw = ImageDraw.Draw(final_image)
-                try:
-                    font = ImageFont.truetype(config.FONT_PATH, font_size)
-                except:
-                    font = ImageFont.load_default()
-                
-                # 计算文字位置（在Logo下方）
-                text_x = logo_x
-                text_y = logo_y + logo.size[1] + margin_pixels
-                
-                # 绘制姓名行
-                name_text = f"姓名：{name}"
-                draw.text((text_x, text_y), name_text, fill="black", font=font)
-                
-                # 绘制ID行
-                id_text = f"ID：{student_id}"
-                draw.text((text_x, text_y + int(font_size * 1.5)), id_text, fill="black", font=font)
-                
-                # 绘制课程主题行
-                if subject:
-                    subject_text = f"主题：{subject}"
-                    draw.text((text_x, text_y + int(font_size * 3)), subject_text, fill="black", font=font)
-            
-            # 二维码放在右边，垂直居中
-            qr_x = width_pixels - qr_size - margin_pixels
-            qr_y = (height_pixels - qr_size) // 2
-            final_image.paste(qr_image, (qr_x, qr_y))
-            
-        else:
-            # 标准布局模式（右下角小尺寸）
-            # 计算二维码基础尺寸（以较短边的8%为基准）
-            base_size = min(width_pixels, height_pixels)
-            qr_size = int(base_size * qr_size_percent)
-            
-            # 创建二维码
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_H,
-                box_size=10,
-                border=1,
-            )
-            qr_data = f"ID:{student_id}\nName:{name}"
-            if subject:
-                qr_data += f"\nSubject:{subject}"
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            
-            # 生成二维码图像
-            qr_image = qr.make_image(fill_color="black", back_color="white")
-            qr_image = qr_image.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
-            
-            # 加载logo
-            logo = None
-            if logo_path is None:
-                logo_path = config.DEFAULT_LOGO
-                
-            # 计算字体大小（二维码尺寸的15%）
-            font_size = int(qr_size * 0.15)
-            # 确保字体大小不超过合理范围
-            max_font_size = mm_to_pixels(3)  # 最大3mm
-            font_size = min(font_size, max_font_size)
-            
-            # 计算文字高度
-            text_height = int(font_size * 3.3)  # 三行文字加间距
-            
-            # 计算logo应该的高度（总高度减去文字高度和间距）
-            logo_height = qr_size - text_height - mm_to_pixels(1)  # 1mm为文字间距
-            
-            try:
-                if os.path.exists(logo_path):
-                    logo = Image.open(logo_path)
-                    # 调整logo大小，宽度为二维码宽度，高度为计算出的高度
-                    logo = resize_keep_aspect(logo, (qr_size, logo_height))
-            except Exception as e:
-                print(f"无法加载Logo: {str(e)}")
-                return None
-            
-            # 计算边距（以毫米为单位）
-            margin_mm = 5
-            margin_pixels = mm_to_pixels(margin_mm)
-            
-            if logo:
-                # 计算左侧整体高度（logo + 文字）
-                left_total_height = logo.size[1] + mm_to_pixels(1) + text_height  # 1mm间距
-                
-                # 计算整体宽度
-                total_width = qr_size * 2 + mm_to_pixels(2)  # 两个相同宽度的元素加2mm间距
-                
-                # 计算整体的起始位置（靠右对齐）
-                start_x = width_pixels - margin_pixels - total_width
-                
-                # 放置Logo（在左边）
-                logo_x = start_x
-                logo_y = height_pixels - margin_pixels - left_total_height
-                final_image.paste(logo, (logo_x, logo_y))
-                
-                # 添加文字（在Logo下方）
-                draw = ImageDraw.Draw(final_image)
-                try:
-                    font = ImageFont.truetype(config.FONT_PATH, font_size)
-                except:
-                    font = ImageFont.load_default()
-                
-                # 计算文字位置
-                text_x = logo_x
-                text_y = logo_y + logo.size[1] + mm_to_pixels(1)  # 1mm间距
-                
-                # 绘制姓名行
-                name_text = f"姓名：{name}"
-                draw.text((text_x, text_y), name_text, fill="black", font=font)
-                
-                # 绘制ID行（减小行间距）
-                id_text = f"ID：{student_id}"
-                draw.text((text_x, text_y + int(font_size * 1.1)), id_text, fill="black", font=font)
-                
-                # 绘制课程主题行
-                if subject:
-                    subject_text = f"主题：{subject}"
-                    draw.text((text_x, text_y + int(font_size * 2.2)), subject_text, fill="black", font=font)
-                
-                # 放置二维码（在右边）
-                qr_x = start_x + qr_size + mm_to_pixels(2)  # 2mm间距
-                qr_y = height_pixels - margin_pixels - qr_size
-                final_image.paste(qr_image, (qr_x, qr_y))
-            else:
-                # 如果没有Logo，只显示二维码
-                qr_x = width_pixels - margin_pixels - qr_size
-                qr_y = height_pixels - margin_pixels - qr_size
-                final_image.paste(qr_image, (qr_x, qr_y))
-        
-        return final_image
+        # 布局只与纸张、比例、分辨率和是否有主题有关，按参数缓存
+        with profiling.stage("layout"):
+            plan = plan_label(paper_size_mm, qr_size_percent, logo_size, bool(subject), dpi)
+        return rasterize_plan(plan, student_id, name, subject, logo_path, dpi, mode, logo_threshold)
         
     except Exception as e:
         print(f"生成二维码失败: {str(e)}")
         return None
 
+def rasterize_plan(plan, student_id, name, subject=None, logo_path=None, dpi=None, mode="RGB", logo_threshold=None):
+    """按布局计划绘制标签，返回LabelTile（出错时抛出异常）
+
+    全画幅布局绘制整张纸，标准布局只为有内容的区域分配画布。
+    mode 为"1"时画布、二维码和文字都是1位黑白，只有Logo经过抖动或二值化。
+    """
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"不支持的颜色模式: {mode}")
+    width_pixels, height_pixels = plan.sheet_size
+    
+    # 生成二维码图像（矩阵按内容缓存，直接栅格化到目标尺寸）
+    qr_x, qr_y, qr_size = plan.qr_box
+    with profiling.stage("qr_encode"):
+        matrix = qr_matrix(build_qr_payload(student_id, name, subject))
+    with profiling.stage("qr_raster") as s:
+        qr_image = rasterize_qr_matrix(matrix, qr_size, "1" if mode == "1" else "L")
+        s.add_bytes(profiling.image_bytes(qr_image))
+    
+    logo = None
+    if plan.logo_box:
+        try:
+            logo = load_logo(logo_path or config.DEFAULT_LOGO, plan.logo_target, mode=mode,
+                             threshold=logo_threshold)
+        except Exception as e:
+            raise ValueError(f"无法加载Logo: {str(e)}") from e
+    
+    # 计算文字位置，过长的行缩小字号或截断
+    text_lines = []
+    if plan.has_text:
+        with profiling.stage("font"):
+            for x, y, size, text in layout_text(plan, label_text_lines(student_id, name, subject)):
+                text_lines.append((x, y, get_font(size), text))
+    
+    if plan.full_layout:
+        # 全画幅布局的内容铺满整张纸
+        tile_left, tile_top, tile_right, tile_bottom = 0, 0, width_pixels, height_pixels
+    else:
+        # 计算所有内容的包围盒，只为这一块区域分配画布
+        boxes = [(qr_x, qr_y, qr_x + qr_size, qr_y + qr_size)]
+        if logo:
+            logo_x, logo_y, logo_width, logo_height = plan.logo_box
+            boxes.append((logo_x, logo_y, logo_x + logo_width, logo_y + logo_height))
+        for x, y, font, text in text_lines:
+            left, top, right, bottom = font.getbbox(text)
+            boxes.append((x + left, y + top, x + right, y + bottom))
+        tile_left = max(0, min(box[0] for box in boxes))
+        tile_top = max(0, min(box[1] for box in boxes))
+        tile_right = min(width_pixels, max(box[2] for box in boxes))
+        tile_bottom = min(height_pixels, max(box[3] for box in boxes))
+    
+    with profiling.stage("canvas") as s:
+        tile = Image.new(mode, (tile_right - tile_left, tile_bottom - tile_top), 'white')
+        s.add_bytes(profiling.image_bytes(tile))
+    if logo:
+        logo_x, logo_y = plan.logo_box[:2]
+        with profiling.stage("logo_paste"):
+            tile.paste(logo, (logo_x - tile_left, logo_y - tile_top))
+    if text_lines:
+        with profiling.stage("text"):
+            draw = ImageDraw.Draw(tile)
+            for x, y, font, text in text_lines:
+                draw.text((x - tile_left, y - tile_top), text, fill="black", font=font)
+    with profiling.stage("qr_paste"):
+        tile.paste(qr_image, (qr_x - tile_left, qr_y - tile_top))
+    
+    return LabelTile(tile, (tile_left, tile_top), plan.sheet_size, dpi=dpi)
+
+def generate_qr_code(student_id, name, paper_size_mm=(297, 210), qr_size_percent=None, logo_path=None, subject=None, dpi=300,
+                     mode="RGB", logo_threshold=None):
+    """生成标准格式的标签，包含logo、二维码和姓名"""
+    tile = render_label_tile(student_id, name, paper_size_mm, qr_size_percent, logo_path, subject, dpi,
+                             mode, logo_threshold)
+    if tile is None:
+        return None
+    return tile.to_image()
+
 def get_logo_image(logo_path, target_height):
     """获取Logo图像，保持宽高比"""
     try:
-        logo = Image.open(logo_path)
-        return resize_keep_aspect(logo, target_height)
+        # 缓存中的图像是共享的，返回副本供调用方自由修改
+        return load_logo(logo_path, target_height, mode=None).copy()
     except Exception as e:
         print(f"无法加载Logo: {str(e)}")
         return None
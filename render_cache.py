@@ -0,0 +1,314 @@
+"""按内容寻址的磁盘渲染缓存
+
+缓存键是所有影响输出的输入的哈希：二维码内容和文字、纸张尺寸、二维码比例、布局方式、分辨率、
+输出格式和颜色模式、Logo文件内容的哈希、字体文件及其内容的哈希，以及渲染器版本
+（qr_generator.RENDERER_VERSION，渲染结果变化时加1）。任何一项改变都会得到新的键，
+旧条目不会被误用，只会在超出容量时按最近使用时间淘汰。
+
+- 文件按键的前两位分到256个子目录中，单个目录不会过大
+- 先写入同目录的临时文件再 os.replace，进程中断或多个进程同时写入都不会留下不完整的文件
+- 命中时更新文件修改时间，超出 RENDER_CACHE_MAX_MB 后从最久未使用的条目开始删除
+
+用法:
+    python -m bedoya cache stats
+    python -m bedoya cache prune --max-mb 200
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+# 自动清理时降到容量上限的比例，避免每次写入都扫描目录
+PRUNE_LOW_WATER = 0.9
+# 超过这个时间（秒）的临时文件视为中断写入的残留
+TEMP_MAX_AGE = 3600
+TEMP_PREFIX = ".tmp-"
+# 矢量格式与分辨率无关
+VECTOR_FORMATS = ("pdf", "svg")
+
+
+def default_cache_dir():
+    """系统的用户缓存目录下的 bedoya/render"""
+    import config
+    return os.path.join(config.user_cache_dir(), "render")
+
+
+def file_digest(path):
+    """文件内容的SHA-256（按路径、修改时间和大小缓存），文件不存在时返回None"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return _file_digest(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=32)
+def _file_digest(path, mtime_ns, file_size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_key(fmt, student_id, name, paper_size_mm, qr_size_percent=None, logo_path=None, subject=None,
+               dpi=300, mode="RGB", logo_threshold=None, font_path=None):
+    """计算标签的缓存键"""
+    import config
+    from font_index import face_index
+    from layout import is_full_layout, resolve_qr_size
+    from qr_generator import RENDERER_VERSION, build_qr_payload, label_text_lines
+
+    fmt = fmt.lower()
+    subject = subject or None
+    logo_path = config.DEFAULT_LOGO if logo_path is None else logo_path
+    font_path = font_path or config.FONT_PATH
+    if fmt in VECTOR_FORMATS:
+        # 矢量输出与分辨率和颜色模式无关，相同标签只保存一份
+        dpi = mode = logo_threshold = None
+    inputs = {
+        "version": RENDERER_VERSION,
+        "format": fmt,
+        "payload": build_qr_payload(student_id, name, subject),
+        "text": label_text_lines(student_id, name, subject),
+        "paper": list(paper_size_mm),
+        "qr": resolve_qr_size(qr_size_percent),
+        "full_layout": is_full_layout(paper_size_mm),
+        "dpi": dpi,
+        "mode": mode,
+        "logo_threshold": logo_threshold,
+        "logo": file_digest(logo_path),
+        "font": [os.path.basename(font_path or ""), face_index(font_path), file_digest(font_path)],
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """磁盘渲染缓存，可以在多个线程和进程之间共享同一个目录"""
+
+    def __init__(self, directory=None, max_bytes=None):
+        import config
+
+        self.directory = directory or config.RENDER_CACHE_DIR or default_cache_dir()
+        if max_bytes is None:
+            max_bytes = int(config.RENDER_CACHE_MAX_MB * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        # 本进程估计的缓存总大小，首次写入时扫描目录得到
+        self.total_bytes = None
+
+    def path_for(self, key, fmt):
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt.lower()}")
+
+    def lookup(self, key, fmt):
+        """返回缓存文件路径，未命中时返回None；命中时更新最近使用时间"""
+        path = self.path_for(key, fmt)
+        try:
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        with self.lock:
+            self.stats["hits"] += 1
+        return path
+
+    def get(self, key, fmt):
+        """读取缓存内容，未命中时返回None"""
+        path = self.lookup(key, fmt)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            # 刚好被其他进程清理掉
+            return None
+
+    def copy_to(self, key, fmt, output_path):
+        """命中时把缓存文件复制到 output_path 并返回True"""
+        path = self.lookup(key, fmt)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, output_path)
+        except FileNotFoundError:
+            if os.path.exists(path):
+                raise
+            return False
+        return True
+
+    def put(self, key, fmt, data):
+        """原子地写入缓存，超出容量时清理最久未使用的条目，返回缓存文件路径"""
+        path = self.path_for(key, fmt)
+        shard = os.path.dirname(path)
+        os.makedirs(shard, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=shard)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self._entries())
+        else:
+            self.total_bytes += len(data)
+        with self.lock:
+            self.stats["writes"] += 1
+        if self.total_bytes > self.max_bytes:
+            self.prune(int(self.max_bytes * PRUNE_LOW_WATER))
+        return path
+
+    def _entries(self):
+        """所有缓存条目 [(最近使用时间, 大小, 路径), ...]，顺便删除中断写入留下的临时文件"""
+        entries = []
+        now = time.time()
+        try:
+            shards = [entry.path for entry in os.scandir(self.directory) if entry.is_dir()]
+        except FileNotFoundError:
+            return entries
+        for shard in shards:
+            try:
+                files = list(os.scandir(shard))
+            except FileNotFoundError:
+                continue
+            for entry in files:
+                try:
+                    stat = entry.stat()
+                    if entry.name.startswith(TEMP_PREFIX):
+                        if now - stat.st_mtime > TEMP_MAX_AGE:
+                            os.remove(entry.path)
+                        continue
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def info(self):
+        """缓存目录、条目数、总大小、容量和本进程的命中统计"""
+        entries = self._entries()
+        self.total_bytes = sum(size for _, size, _ in entries)
+        with self.lock:
+            return {
+                "directory": self.directory,
+                "entries": len(entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                **self.stats,
+            }
+
+    def prune(self, max_bytes=None):
+        """从最久未使用的条目开始删除，直到总大小不超过 max_bytes，返回删除的条目数和字节数"""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        self.total_bytes = total
+        with self.lock:
+            self.stats["evictions"] += removed
+        return {"removed": removed, "freed": freed, "bytes": total}
+
+    def clear(self):
+        """删除所有缓存条目"""
+        return self.prune(0)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    """配置中的缓存（RENDER_CACHE 为False时返回None）"""
+    global _default_cache
+    import config
+
+    if not config.RENDER_CACHE:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = RenderCache()
+        return _default_cache
+
+
+def encode_label(fmt, student_id, name, paper_size_mm, qr_size_percent=None, logo_path=None, subject=None,
+                 dpi=300, mode="RGB", logo_threshold=None):
+    """渲染标签并编码为 fmt 格式（png、jpg、bmp、tiff、pdf、svg），返回字节"""
+    import io
+
+    fmt = fmt.lower()
+    if fmt == "svg":
+        from svg_export import render_label_svg
+        return render_label_svg(student_id, name, paper_size_mm, qr_size_percent, logo_path, subject).encode("utf-8")
+
+    buffer = io.BytesIO()
+    if fmt == "pdf":
+        from pdf_export import PdfExporter
+        with PdfExporter(buffer, qr_size_percent, logo_path) as exporter:
+            exporter.add_label(student_id, name, subject, tuple(paper_size_mm))
+    else:
+        from qr_generator import render_label_tile
+        tile = render_label_tile(student_id, name, paper_size_mm=paper_size_mm, qr_size_percent=qr_size_percent,
+                                 logo_path=logo_path, subject=subject, dpi=dpi, mode=mode,
+                                 logo_threshold=logo_threshold)
+        if tile is None:
+            raise ValueError(f"生成标签失败: {name}_{student_id}")
+        tile.save(buffer, fmt.upper())
+    return buffer.getvalue()
+
+
+def render_label_file(output_path, fmt, student_id, name, paper_size_mm, qr_size_percent=None, logo_path=None,
+                      subject=None, dpi=300, mode="RGB", logo_threshold=None, use_cache=True, cache=None):
+    """渲染标签并保存到 output_path，返回是否命中缓存
+
+    use_cache 为False时不使用缓存；cache 为使用的 RenderCache，默认为配置中的缓存（default_cache）。
+    """
+    if not use_cache:
+        cache = None
+    elif cache is None:
+        cache = default_cache()
+    subject = subject or None
+    args = (student_id, name, tuple(paper_size_mm), qr_size_percent, logo_path, subject, dpi, mode, logo_threshold)
+    key = None
+    if cache is not None:
+        key = render_key(fmt, *args)
+        if cache.copy_to(key, fmt, output_path):
+            return True
+
+    data = encode_label(fmt, *args)
+    if cache is not None:
+        cache.put(key, fmt, data)
+    with open(output_path, "wb") as f:
+        f.write(data)
+    return False
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
@@ -0,0 +1,179 @@
+"""增量渲染会话：纸张、Logo和二维码比例不变时，只重绘变化的文字和二维码区域
+
+逐个浏览花名册时，每个学生只有姓名、学号和主题不同。会话保存静态底图（白色背景 +
+已定位的Logo），每次更新时先从底图恢复旧文字区域，再绘制新文字和二维码，
+并返回变化的矩形，预览只需要重绘这一块。结果与 render_label_tile(...).to_image() 逐像素相同。
+
+    session = RenderSession((40, 20), dpi=120)
+    session.update("3436676", "江龙")            # 首次返回整张纸
+    rect = session.update("3436677", "李明")     # 之后只返回文字和二维码的区域
+    session.image.crop(rect)
+
+会话不是线程安全的，同一个会话只能在一个线程中使用（预览使用单线程的线程池）。
+"""
+import os
+from PIL import Image, ImageDraw
+import config
+import profiling
+from font_cache import get_font
+from layout import plan_label, resolve_qr_size
+from qr_generator import (OUTPUT_MODES, build_qr_payload, qr_matrix, rasterize_qr_matrix, load_logo,
+                          get_logo_size, label_text_lines)
+from text_layout import layout_text
+
+# 保留最近多少次更新的变化区域（用于合并被丢弃的预览结果）
+HISTORY_SIZE = 16
+
+
+def union_rect(a, b):
+    """两个矩形 (left, top, right, bottom) 的并集，任一为None时返回另一个"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+class RenderSession:
+    """保存静态底图的标签渲染会话，update 只重绘脏区域"""
+
+    def __init__(self, paper_size_mm, qr_size_percent=None, logo_path=None, dpi=300, mode="RGB",
+                 logo_threshold=None):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"不支持的颜色模式: {mode}")
+        self.paper_size_mm = tuple(paper_size_mm)
+        self.qr_size_percent = resolve_qr_size(qr_size_percent)
+        self.logo_path = config.DEFAULT_LOGO if logo_path is None else logo_path
+        self.dpi = dpi
+        self.mode = mode
+        self.logo_threshold = logo_threshold
+        self.logo_stamp = _file_stamp(self.logo_path)
+        self.logo_size = get_logo_size(self.logo_path) if self.logo_stamp else None
+
+        self.base = None       # 静态底图：背景 + Logo
+        self.image = None      # 当前完整标签
+        self.plan = None
+        self.content = None    # (学号, 姓名, 主题)
+        self.text_box = None   # 当前文字占用的区域
+        self.version = 0
+        self.history = []      # [(版本, 变化区域), ...]
+
+    def matches(self, paper_size_mm, qr_size_percent=None, logo_path=None, dpi=300, mode="RGB",
+                logo_threshold=None):
+        """静态参数是否与本会话相同（Logo文件被修改也视为不同）"""
+        logo_path = config.DEFAULT_LOGO if logo_path is None else logo_path
+        return ((tuple(paper_size_mm), resolve_qr_size(qr_size_percent), logo_path, dpi, mode, logo_threshold) ==
+                (self.paper_size_mm, self.qr_size_percent, self.logo_path, self.dpi, self.mode,
+                 self.logo_threshold) and _file_stamp(logo_path) == self.logo_stamp)
+
+    @property
+    def sheet_rect(self):
+        width, height = self.image.size
+        return (0, 0, width, height)
+
+    def update(self, student_id, name, subject=None):
+        """更新学生信息，返回变化的区域 (left, top, right, bottom)，内容没有变化时返回None"""
+        subject = subject or None
+        content = (student_id, name, subject)
+        if content == self.content:
+            return None
+
+        with profiling.stage("layout"):
+            plan = plan_label(self.paper_size_mm, self.qr_size_percent, self.logo_size, bool(subject), self.dpi)
+        if self.image is None or plan.logo_box != self.plan.logo_box:
+            self._build_base(plan)
+            changed = self.sheet_rect
+            dirty = None
+        else:
+            changed = dirty = self.text_box
+
+        # 二维码内容包含姓名、学号和主题，每次都需要重新生成
+        with profiling.stage("qr_encode"):
+            matrix = qr_matrix(build_qr_payload(student_id, name, subject))
+        with profiling.stage("qr_raster") as s:
+            qr_image = rasterize_qr_matrix(matrix, plan.qr_box[2], "1" if self.mode == "1" else "L")
+            s.add_bytes(profiling.image_bytes(qr_image))
+
+        text_lines = []
+        text_box = None
+        if plan.has_text:
+            with profiling.stage("font"):
+                fitted = [(x, y, get_font(size), text)
+                          for x, y, size, text in layout_text(plan, label_text_lines(student_id, name, subject))]
+            for x, y, font, text in fitted:
+                left, top, right, bottom = font.getbbox(text)
+                text_box = union_rect(text_box, (x + left, y + top, x + right, y + bottom))
+                text_lines.append((x, y, font, text))
+            text_box = self._clip(text_box)
+        dirty = union_rect(dirty, text_box)
+
+        if dirty:
+            # 旧文字和新文字的区域先恢复为底图，再绘制新文字
+            with profiling.stage("restore"):
+                self.image.paste(self.base.crop(dirty), dirty[:2])
+            if text_lines:
+                with profiling.stage("text"):
+                    draw = ImageDraw.Draw(self.image)
+                    for x, y, font, text in text_lines:
+                        draw.text((x, y), text, fill="black", font=font)
+        # 二维码最后粘贴，覆盖可能伸入的长文字（与完整渲染的顺序相同）
+        qr_x, qr_y, qr_size = plan.qr_box
+        with profiling.stage("qr_paste"):
+            self.image.paste(qr_image, (qr_x, qr_y))
+
+        self.plan = plan
+        self.content = content
+        self.text_box = text_box
+        changed = union_rect(union_rect(changed, dirty), self._clip((qr_x, qr_y, qr_x + qr_size, qr_y + qr_size)))
+        self.version += 1
+        self.history = (self.history + [(self.version, changed)])[-HISTORY_SIZE:]
+        return changed
+
+    def changed_since(self, version):
+        """从 version 到当前版本之间变化的区域，version 太旧或未知时返回整张纸，没有变化时返回None"""
+        if self.image is None:
+            return None
+        if version == self.version:
+            return None
+        if not self.history or version is None or not self.history[0][0] - 1 <= version < self.version:
+            return self.sheet_rect
+        rect = None
+        for entry_version, entry_rect in self.history:
+            if entry_version > version:
+                rect = union_rect(rect, entry_rect)
+        return rect
+
+    def _build_base(self, plan):
+        """生成静态底图：白色背景和已缩放定位的Logo"""
+        with profiling.stage("canvas") as s:
+            base = Image.new(self.mode, plan.sheet_size, "white")
+            s.add_bytes(profiling.image_bytes(base))
+        if plan.logo_box:
+            try:
+                logo = load_logo(self.logo_path, plan.logo_target, mode=self.mode, threshold=self.logo_threshold)
+            except Exception as e:
+                raise ValueError(f"无法加载Logo: {str(e)}") from e
+            with profiling.stage("logo_paste"):
+                base.paste(logo, plan.logo_box[:2])
+        self.base = base
+        self.image = base.copy()
+        self.text_box = None
+        self.history = []
+
+    def _clip(self, rect):
+        if rect is None:
+            return None
+        width, height = self.image.size
+        left, top, right, bottom = max(0, rect[0]), max(0, rect[1]), min(width, rect[2]), min(height, rect[3])
+        if left >= right or top >= bottom:
+            return None
+        return (left, top, right, bottom)
+
+
+def _file_stamp(path):
+    """文件的修改时间和大小，文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
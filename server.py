@@ -0,0 +1,342 @@
+"""本地HTTP标签渲染服务（仅依赖标准库）
+
+用法:
+    python -m bedoya serve --port 8765
+    GET /label.png?name=江龙&id=3436676&subject=水彩&paper=A4&qr=8&dpi=300
+    GET /label.pdf?name=江龙&id=3436676&paper=40x20
+    GET /label.svg?name=江龙&id=3436676&paper=40x20
+    GET /stats
+
+渲染在固定大小的进程池中执行，排队过多时返回503，单个请求超时返回504（从开始渲染时计时）。
+响应按所有输入（含渲染器版本、Logo和字体内容）的哈希缓存并带有ETag，重复请求不会再次渲染。
+"""
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# 响应缓存的总大小上限（字节）
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+# 等待渲染的请求上限（含正在渲染的），超过后返回503
+MAX_PENDING = 64
+# 单个请求的渲染超时（秒），不含排队等待的时间
+RENDER_TIMEOUT = 30
+# 排队期间检查是否已开始渲染的间隔（秒）
+QUEUE_POLL_INTERVAL = 0.05
+# 允许的最大分辨率，避免超大图像占满内存
+MAX_DPI = 600
+# PNG允许的最大像素数（纸张宽×高×分辨率²），A3在600DPI下约7000万像素
+MAX_PIXELS = 80_000_000
+
+CONTENT_TYPES = {"png": "image/png", "pdf": "application/pdf", "svg": "image/svg+xml"}
+
+
+def parse_label_request(path):
+    """解析请求路径和参数，返回 (输出格式, 规范化的参数字典)"""
+    import config
+    from batch import parse_paper_size
+
+    url = urlsplit(path)
+    route = url.path.rstrip("/")
+    if route not in ("/label.png", "/label.pdf", "/label.svg"):
+        raise LookupError(route)
+    fmt = route.rsplit(".", 1)[1]
+
+    query = {key: values[-1].strip() for key, values in parse_qs(url.query).items()}
+    name = query.get("name", "")
+    student_id = query.get("id", "")
+    if not name or not student_id:
+        raise ValueError("缺少参数 name 和 id")
+
+    qr_percent = float(query["qr"]) if "qr" in query else config.QR_CODE_SIZE_PERCENT
+    if not 5 <= qr_percent <= 20:
+        raise ValueError("qr 必须在5-20之间")
+    dpi = float(query.get("dpi", 300))
+    if not 0 < dpi <= MAX_DPI:
+        raise ValueError(f"dpi 必须在1-{MAX_DPI}之间")
+
+    paper_size_mm = parse_paper_size(query.get("paper"))
+    if fmt == "png":
+        width_mm, height_mm = paper_size_mm
+        pixels = (width_mm / 25.4 * dpi) * (height_mm / 25.4 * dpi)
+        if pixels > MAX_PIXELS:
+            raise ValueError(f"图像过大（约{pixels / 1e6:.0f}百万像素，上限{MAX_PIXELS // 1_000_000}百万），"
+                             f"请减小纸张尺寸或 dpi")
+
+    params = {
+        "student_id": student_id,
+        "name": name,
+        "subject": query.get("subject") or None,
+        "paper_size_mm": list(paper_size_mm),
+        "qr_size_percent": qr_percent / 100,
+        # PDF和SVG是矢量输出，与分辨率无关
+        "dpi": dpi if fmt == "png" else None,
+    }
+    return fmt, params
+
+
+def cache_key(fmt, params):
+    """由所有影响输出的输入计算缓存键（也用作ETag），与磁盘渲染缓存的键相同
+
+    包含渲染器版本、Logo和字体文件的内容哈希，渲染代码、Logo或字体变化后客户端不会继续使用旧标签。
+    """
+    from render_cache import render_key
+
+    return render_key(fmt, params["student_id"], params["name"], params["paper_size_mm"],
+                      params["qr_size_percent"], subject=params["subject"], dpi=params["dpi"])
+
+
+def render_label_bytes(fmt, params, profile=False):
+    """在工作进程中渲染标签并编码为PNG、PDF或SVG，返回 (内容, 各阶段耗时或None)"""
+    if profile:
+        import profiling
+        with profiling.profile() as stats:
+            body, _ = render_label_bytes(fmt, params)
+        return body, stats.summary()
+
+    buffer = io.BytesIO()
+    if fmt == "pdf":
+        from pdf_export import PdfExporter
+        with PdfExporter(buffer, params["qr_size_percent"]) as exporter:
+            exporter.add_label(params["student_id"], params["name"], params["subject"],
+                               tuple(params["paper_size_mm"]))
+    elif fmt == "svg":
+        from svg_export import render_label_svg
+        document = render_label_svg(params["student_id"], params["name"], tuple(params["paper_size_mm"]),
+                                    params["qr_size_percent"], subject=params["subject"])
+        buffer.write(document.encode("utf-8"))
+    else:
+        from qr_generator import render_label_tile
+        tile = render_label_tile(params["student_id"], params["name"],
+                                 paper_size_mm=tuple(params["paper_size_mm"]),
+                                 qr_size_percent=params["qr_size_percent"],
+                                 subject=params["subject"], dpi=params["dpi"])
+        if tile is None:
+            raise ValueError("生成标签失败")
+        tile.save(buffer, "PNG")
+    return buffer.getvalue(), None
+
+
+class ResponseCache:
+    """按总字节数限制大小的LRU响应缓存"""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = body
+            self.total_bytes += len(body)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def info(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries),
+                    "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+
+class LabelService:
+    """渲染服务：进程池 + 排队上限 + 响应缓存 + 相同请求合并"""
+
+    def __init__(self, workers=None, max_pending=MAX_PENDING, cache_bytes=RESPONSE_CACHE_BYTES,
+                 profile=False):
+        import profiling
+
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.cache = ResponseCache(cache_bytes)
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        self.stats = {"requests": 0, "rendered": 0, "not_modified": 0, "rejected": 0, "errors": 0}
+        self.stats_lock = threading.Lock()
+        # 开启后工作进程返回各阶段耗时，汇总后在 /stats 中提供
+        self.stage_stats = profiling.StageStats() if profile else None
+
+    def count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def render(self, key, fmt, params):
+        """返回渲染结果，相同键的并发请求只渲染一次"""
+        body = self.cache.get(key)
+        if body is not None:
+            return body
+
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                if not self.slots.acquire(blocking=False):
+                    self.count("rejected")
+                    raise OverflowError("服务繁忙，请稍后重试")
+                try:
+                    future = self.executor.submit(render_label_bytes, fmt, params,
+                                                  self.stage_stats is not None)
+                except BaseException:
+                    # 进程池已损坏或已关闭，名额没有交给任何渲染
+                    self.slots.release()
+                    raise
+                self.inflight[key] = future
+
+        if owner:
+            # 名额在渲染真正结束时才归还：超时的请求虽然已经返回504，工作进程仍在渲染。
+            # 必须在释放 inflight_lock 之后注册：已经完成的future会在当前线程立即调用回调
+            future.add_done_callback(lambda done: self._finished(key, done))
+
+        body, _ = self._wait(future)
+        return body
+
+    def _wait(self, future):
+        """等待渲染结果，超时从工作进程开始渲染时算起，排队的时间不计入"""
+        deadline = None
+        while True:
+            if deadline is None and (future.running() or future.done()):
+                deadline = time.monotonic() + RENDER_TIMEOUT
+            timeout = QUEUE_POLL_INTERVAL if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeout:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def _finished(self, key, future):
+        """渲染结束（成功、失败或取消）时的回调：归还名额，缓存结果"""
+        with self.inflight_lock:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+        self.slots.release()
+        if future.cancelled() or future.exception() is not None:
+            return
+        body, stages = future.result()
+        self.count("rendered")
+        self.cache.put(key, body)
+        if stages:
+            self.stage_stats.merge(stages)
+
+    def info(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        info = {"workers": self.workers, "stats": stats, "cache": self.cache.info()}
+        if self.stage_stats is not None:
+            info["stages"] = self.stage_stats.summary()
+        return info
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+class LabelRequestHandler(BaseHTTPRequestHandler):
+    server_version = "BedoyaLabel/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_error_text(self, status, message):
+        self.send_body(status, message.encode("utf-8"), "text/plain; charset=utf-8")
+
+    def do_GET(self):
+        route = urlsplit(self.path).path.rstrip("/")
+        if route in ("/stats", "/health"):
+            body = json.dumps(self.service.info(), ensure_ascii=False).encode("utf-8")
+            self.send_body(200, body, "application/json; charset=utf-8")
+            return
+
+        self.service.count("requests")
+        try:
+            fmt, params = parse_label_request(self.path)
+        except LookupError:
+            self.send_error_text(404, "未找到")
+            return
+        except ValueError as e:
+            self.send_error_text(400, str(e))
+            return
+
+        key = cache_key(fmt, params)
+        etag = f'"{key[:32]}"'
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+        # ETag只由输入决定，客户端已有相同版本时无需渲染
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.service.count("not_modified")
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        try:
+            body = self.service.render(key, fmt, params)
+        except OverflowError as e:
+            self.send_error_text(503, str(e))
+            return
+        except FutureTimeout:
+            self.service.count("errors")
+            self.send_error_text(504, "渲染超时")
+            return
+        except Exception as e:
+            self.service.count("errors")
+            self.send_error_text(500, f"渲染失败: {e}")
+            return
+        self.send_body(200, body, CONTENT_TYPES[fmt], headers)
+
+    do_HEAD = do_GET
+
+
+def serve(host="127.0.0.1", port=8765, workers=None, quiet=False, profile=False):
+    """启动服务，直到收到Ctrl+C"""
+    service = LabelService(workers, profile=profile)
+    httpd = ThreadingHTTPServer((host, port), LabelRequestHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    httpd.quiet = quiet
+    print(f"标签服务已启动: http://{host}:{httpd.server_address[1]}/ （{service.workers}个渲染进程）")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.shutdown()
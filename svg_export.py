@@ -0,0 +1,160 @@
+"""SVG矢量标签输出
+
+二维码为一条合并了水平连续模块的路径，Logo以data URI只嵌入一次（拼版时所有标签引用同一份），
+文字为真实的<text>元素。布局与位图输出相同（layout.plan_label），坐标单位为1/300英寸，
+在任何打印分辨率下都清晰，文件通常只有几KB（加上Logo的大小）。
+"""
+import base64
+import io
+import os
+from functools import lru_cache
+from xml.sax.saxutils import escape, quoteattr
+import config
+from layout import plan_label, mm_to_pixels, resolve_qr_size
+from font_cache import get_font
+from qr_generator import label_text_lines, build_qr_payload, qr_matrix, get_logo_size, load_logo
+from text_layout import layout_text
+
+# 布局按300DPI的像素坐标计算，SVG的用户单位与之相同
+LAYOUT_DPI = 300
+
+
+def _num(value, digits=2):
+    """格式化坐标，去掉多余的小数位（缩放系数需要更多位，否则会累积成明显的偏差）"""
+    return f"{value:.{digits}f}".rstrip("0").rstrip(".")
+
+
+def qr_path_data(matrix):
+    """将二维码矩阵按行合并为路径数据（单位为模块），每段连续的深色模块为一个矩形"""
+    import numpy as np
+
+    commands = []
+    for row_index, row in enumerate(np.asarray(matrix, dtype=np.int8)):
+        edges = np.diff(np.concatenate(([0], row, [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        for start, end in zip(starts, ends):
+            commands.append(f"M{start} {row_index}h{end - start}v1h{start - end}z")
+    return "".join(commands)
+
+
+def logo_data_uri(logo_path, size):
+    """按300DPI缩放到 size 的Logo（与位图输出相同的像素）的data URI，按路径和修改时间缓存"""
+    stat = os.stat(logo_path)
+    return _logo_data_uri(os.path.abspath(logo_path), stat.st_mtime_ns, stat.st_size, tuple(size))
+
+
+@lru_cache(maxsize=8)
+def _logo_data_uri(logo_path, mtime_ns, file_size, size):
+    buffer = io.BytesIO()
+    load_logo(logo_path, size).save(buffer, "PNG", optimize=True)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+@lru_cache(maxsize=8)
+def font_family_for(font_path):
+    """字体文件的字族名称，无法读取时返回None"""
+    try:
+        return get_font(12, font_path).getname()[0]
+    except Exception:
+        return None
+
+
+class SvgLabelRenderer:
+    """生成标签的SVG元素，Logo和二维码样式在文档的<defs>中只定义一次"""
+
+    def __init__(self, qr_size_percent=None, logo_path=None, font_family=None):
+        self.qr_size_percent = resolve_qr_size(qr_size_percent)
+        self.logo_path = config.DEFAULT_LOGO if logo_path is None else logo_path
+        self.logo_size = get_logo_size(self.logo_path) if os.path.exists(self.logo_path) else None
+        family = font_family or font_family_for(config.FONT_PATH)
+        self.font_family = f"'{family}', sans-serif" if family else "sans-serif"
+        # 文档中最大的Logo尺寸，Logo按这个尺寸嵌入一次，所有标签共用
+        self.logo_extent = None
+
+    def label_elements(self, student_id, name, subject, paper_size_mm, offset=(0, 0)):
+        """单个标签的SVG元素列表，offset为标签在页面上的位置（300DPI像素）"""
+        plan = plan_label(paper_size_mm, self.qr_size_percent, self.logo_size, bool(subject), LAYOUT_DPI)
+        offset_x, offset_y = offset
+        elements = []
+
+        if plan.logo_box:
+            x, y, width, height = plan.logo_box
+            if self.logo_extent is None or width > self.logo_extent[0]:
+                self.logo_extent = (width, height)
+            # <use>直接给出Logo框的宽高，由<symbol>的viewBox精确缩放
+            elements.append(f'<use href="#logo" xlink:href="#logo" x="{offset_x + x}" y="{offset_y + y}" '
+                            f'width="{width}" height="{height}"/>')
+
+        if plan.has_text:
+            # 位图文字以上缘定位，SVG文字以基线定位；过长的行与位图一样缩小字号或截断
+            for x, y, font_size, text in layout_text(plan, label_text_lines(student_id, name, subject)):
+                ascent = get_font(font_size).getmetrics()[0]
+                elements.append(f'<text x="{offset_x + x}" y="{offset_y + y + ascent}" '
+                                f'font-size="{font_size}">{escape(text)}</text>')
+
+        qr_x, qr_y, qr_size = plan.qr_box
+        matrix = qr_matrix(build_qr_payload(student_id, name, subject))
+        module = qr_size / matrix.shape[0]
+        elements.append(f'<path transform="translate({offset_x + qr_x} {offset_y + qr_y}) '
+                        f'scale({_num(module, 6)})" d="{qr_path_data(matrix)}"/>')
+        return elements
+
+    def document(self, page_size_mm, elements):
+        """组装完整的SVG文档，页面尺寸以毫米为单位"""
+        width_mm, height_mm = page_size_mm
+        view_width = width_mm * LAYOUT_DPI / 25.4
+        view_height = height_mm * LAYOUT_DPI / 25.4
+        defs = ""
+        if self.logo_extent:
+            # <symbol>以原图尺寸为viewBox，各标签的<use>按自己的Logo框宽高缩放
+            logo_width, logo_height = self.logo_size
+            uri = logo_data_uri(self.logo_path, self.logo_extent)
+            defs = (f'<defs><symbol id="logo" viewBox="0 0 {logo_width} {logo_height}" preserveAspectRatio="none">'
+                    f'<image width="{logo_width}" height="{logo_height}" preserveAspectRatio="none" '
+                    f'href="{uri}" xlink:href="{uri}"/></symbol></defs>')
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{_num(width_mm)}mm" height="{_num(height_mm)}mm" '
+            f'viewBox="0 0 {_num(view_width)} {_num(view_height)}">'
+            f'{defs}<rect width="100%" height="100%" fill="white"/>'
+            f'<g font-family={quoteattr(self.font_family)} fill="black" shape-rendering="crispEdges">'
+            + "".join(elements) +
+            '</g></svg>\n'
+        )
+
+
+def render_label_svg(student_id, name, paper_size_mm=(297, 210), qr_size_percent=None, logo_path=None,
+                     subject=None, font_family=None):
+    """生成单个标签的SVG文档（字符串）"""
+    renderer = SvgLabelRenderer(qr_size_percent, logo_path, font_family)
+    elements = renderer.label_elements(student_id, name, subject, paper_size_mm)
+    return renderer.document(paper_size_mm, elements)
+
+
+def render_sheet_svg(labels, sheet_size_mm=None, label_size_mm=(40, 20), gutter_mm=2, margin_mm=5,
+                     cut_marks=True, qr_size_percent=None, logo_path=None, font_family=None):
+    """将多个标签拼排到一张纸上，返回SVG文档（多余的标签会被忽略）"""
+    from imposition import grid_layout, cut_mark_lines, cut_mark_width
+
+    if sheet_size_mm is None:
+        sheet_size_mm = config.PAPER_SIZES["A4"]
+    renderer = SvgLabelRenderer(qr_size_percent, logo_path, font_family)
+    cols, rows, positions = grid_layout(sheet_size_mm, label_size_mm, gutter_mm, margin_mm, LAYOUT_DPI)
+    elements = []
+    for label, position in zip(labels, positions):
+        elements += renderer.label_elements(label["student_id"], label["name"], label.get("subject") or None,
+                                            label_size_mm, position)
+    if cut_marks and labels:
+        label_size_px = tuple(mm_to_pixels(v, LAYOUT_DPI) for v in label_size_mm)
+        sheet_size_px = tuple(mm_to_pixels(v, LAYOUT_DPI) for v in sheet_size_mm)
+        lines = cut_mark_lines(cols, rows, positions, label_size_px, sheet_size_px, LAYOUT_DPI)
+        path = "".join(f"M{x0} {y0}L{x1} {y1}" for (x0, y0), (x1, y1) in lines)
+        elements.append(f'<path d="{path}" fill="none" stroke="black" '
+                        f'stroke-width="{cut_mark_width(LAYOUT_DPI)}"/>')
+    return renderer.document(sheet_size_mm, elements)
+
+
+def save_svg(document, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(document)
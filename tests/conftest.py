@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# 程序模块都在仓库根目录
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def user_cache(tmp_path_factory):
+    """字体索引和渲染缓存写到临时目录，不影响本机的缓存"""
+    previous = os.environ.get("XDG_CACHE_HOME")
+    os.environ["XDG_CACHE_HOME"] = str(tmp_path_factory.mktemp("cache"))
+    yield
+    if previous is None:
+        os.environ.pop("XDG_CACHE_HOME", None)
+    else:
+        os.environ["XDG_CACHE_HOME"] = previous
+
+
+def write_roster(path, rows):
+    """写入CSV花名册，rows 的第一行为表头"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("\n".join(",".join(str(cell) for cell in row) for row in rows) + "\n")
+    return str(path)
@@ -0,0 +1,81 @@
+import pytest
+
+from batch import parse_paper_size, label_filename, read_roster, build_jobs
+from conftest import write_roster
+
+
+def test_parse_paper_size():
+    assert parse_paper_size("A4") == (297, 210)
+    assert parse_paper_size("a3横向") == (420, 297)
+    assert parse_paper_size("50x30") == (50, 30)
+    assert parse_paper_size("50.5×30mm") == (50.5, 30)
+    assert parse_paper_size("", default=(40, 20)) == (40, 20)
+    with pytest.raises(ValueError):
+        parse_paper_size("B5")
+    with pytest.raises(ValueError):
+        parse_paper_size("2000x30")
+
+
+def test_label_filename_replaces_invalid_characters():
+    assert label_filename("江龙", "12/34") == "江龙_12_34.png"
+
+
+def test_read_roster_maps_chinese_headers_and_skips_blank_lines(tmp_path):
+    path = write_roster(tmp_path / "roster.csv", [
+        ["学号", "姓名", "课程主题", "份数"],
+        ["1001", "张三", "Watercolor", "2"],
+        ["", "", "", ""],
+        ["1002", "李四", "", ""],
+    ])
+    assert read_roster(path) == [
+        (2, {"student_id": "1001", "name": "张三", "subject": "Watercolor", "copies": "2"}),
+        (4, {"student_id": "1002", "name": "李四", "subject": "", "copies": ""}),
+    ]
+
+
+def test_read_roster_requires_name_and_id(tmp_path):
+    path = write_roster(tmp_path / "roster.csv", [["姓名", "主题"], ["张三", "Art"]])
+    with pytest.raises(ValueError):
+        read_roster(path)
+
+
+def test_build_jobs_reports_invalid_rows():
+    jobs, errors = build_jobs([
+        (2, {"name": "张三", "student_id": "1001", "copies": "3"}),
+        (3, {"name": "", "student_id": "1002"}),
+        (4, {"name": "王五", "student_id": "1003", "paper_size": "B5"}),
+        (5, {"name": "赵六", "student_id": "1004", "copies": "0"}),
+    ])
+    assert [(job["line"], job["copies"], job["paper_size"]) for job in jobs] == [(2, 3, (297, 210))]
+    assert [error["line"] for error in errors] == [3, 4, 5]
+
+
+def test_build_jobs_keeps_duplicate_rows_apart():
+    jobs, errors = build_jobs([
+        (2, {"name": "张三", "student_id": "A1"}),
+        (3, {"name": "张三", "student_id": "a1"}),
+        (4, {"name": "张三", "student_id": "A1"}),
+    ])
+    assert not errors
+    assert [job["file_stem"] for job in jobs] == ["张三_A1", "张三_a1_2", "张三_A1_3"]
+    assert [job["duplicate_of"] for job in jobs] == [None, 2, 2]
+
+
+def test_build_jobs_numbered_names_do_not_collide_with_real_rows():
+    jobs, _ = build_jobs([
+        (2, {"name": "张三", "student_id": "1"}),
+        (3, {"name": "张三", "student_id": "1"}),
+        (4, {"name": "张三", "student_id": "1_2"}),
+        (5, {"name": "张三", "student_id": "1_2"}),
+    ])
+    assert [job["file_stem"] for job in jobs] == ["张三_1", "张三_1_2", "张三_1_2_2", "张三_1_2_3"]
+    # 只有姓名和学号相同的行记为重复
+    assert [job["duplicate_of"] for job in jobs] == [None, 2, None, 4]
+
+    # 真实的行先出现时，重复行跳过已被使用的序号
+    jobs, _ = build_jobs([
+        (2, {"name": "张三", "student_id": "1_2"}),
+        (3, {"name": "张三", "student_id": "1"}),
+        (4, {"name": "张三", "student_id": "1"}),
+    ])
+    assert [job["file_stem"] for job in jobs] == ["张三_1_2", "张三_1", "张三_1_3"]
@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+import config
+from config import DEFAULT_CONFIG, SCHEMA, validate_config
+
+
+def test_valid_values_are_kept():
+    values = validate_config({"PRINT_DPI": 600, "LABEL_SIZES": [{"width": 30, "height": 20}],
+                              "PAPER_SIZES": {"A5": [210, 148]}, "RENDER_CACHE": False})
+    assert values["PRINT_DPI"] == 600
+    assert values["LABEL_SIZES"] == [{"width": 30, "height": 20}]
+    assert values["PAPER_SIZES"] == {"A5": (210, 148)}
+    assert values["RENDER_CACHE"] is False
+
+
+def test_invalid_values_fall_back_to_defaults(capsys):
+    values = validate_config({"PRINT_DPI": "300", "QR_CODE_SIZE_PERCENT": 0, "RENDER_CACHE": 1,
+                              "LABEL_PRINTER_LANGUAGE": "pcl", "UNKNOWN": 1})
+    for key in ("PRINT_DPI", "QR_CODE_SIZE_PERCENT", "RENDER_CACHE", "LABEL_PRINTER_LANGUAGE"):
+        assert values[key] == DEFAULT_CONFIG[key]
+    assert "UNKNOWN" not in values
+    assert "UNKNOWN" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("check, value", [
+    ("PRINT_DPI", True),
+    ("FONT_SIZE", 12.5),
+    ("LABEL_SIZES", [{"width": True, "height": 20}]),
+    ("LABEL_SIZES", [{"width": 30}]),
+    ("PAPER_SIZES", {"A4": [297, False]}),
+])
+def test_schema_rejects_wrong_types(check, value):
+    with pytest.raises(ValueError):
+        SCHEMA[check](value)
+
+
+def test_legacy_keys_are_mapped():
+    values = validate_config({"QR_CODE_SIZE": 12})
+    assert values["QR_CODE_SIZE_PERCENT"] == 12
+    # 新旧名称同时出现时使用新名称
+    values = validate_config({"QR_CODE_SIZE": 12, "QR_CODE_SIZE_PERCENT": 15})
+    assert values["QR_CODE_SIZE_PERCENT"] == 15
+
+
+def test_logo_size_keys_are_unsupported(capsys):
+    values = validate_config({"LOGO_SIZE": 10, "LOGO_SIZE_PERCENT": 12})
+    assert "LOGO_SIZE" not in values and "LOGO_SIZE_PERCENT" not in values
+    err = capsys.readouterr().err
+    assert "LOGO_SIZE 不再支持" in err and "LOGO_SIZE_PERCENT 不再支持" in err
+
+
+def test_qr_size_setting_is_the_default(monkeypatch):
+    from layout import plan_label
+    from render_cache import render_key
+
+    monkeypatch.setattr(config, "QR_CODE_SIZE_PERCENT", 15, raising=False)
+    assert plan_label((297, 210)) == plan_label((297, 210), 0.15)
+    assert plan_label((297, 210)) != plan_label((297, 210), 0.08)
+    assert render_key("png", "1", "张三", (297, 210)) == render_key("png", "1", "张三", (297, 210), 0.15)
+
+
+def test_save_config_replaces_file_atomically(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config.settings, "path", None)
+    config.save_config({"PRINT_DPI": 200})
+    config.save_config({"PRINT_DPI": object()})
+    assert os.listdir(tmp_path) == ["settings.json"]
+    with open(tmp_path / "settings.json", encoding="utf-8") as f:
+        assert json.load(f) == {"PRINT_DPI": 200}
+
+
+def test_warnings_go_to_the_registered_handler(capsys):
+    received = []
+    previous = config.set_warning_handler(received.append)
+    try:
+        validate_config({"UNKNOWN": 1})
+    finally:
+        config.set_warning_handler(previous)
+    # 注册了处理函数（界面状态栏）时不输出到标准错误
+    assert len(received) == 1 and "UNKNOWN" in received[0]
+    assert capsys.readouterr().err == ""
+    assert config.recent_warnings()[-1] == received[0]
+    config.warn("字体缺失")
+    assert capsys.readouterr().err == "警告: 字体缺失\n"
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import config
+import font_index
+from font_index import INDEX_VERSION, _is_current, _rank, best_face, scan_fonts
+
+DEJAVU = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+
+@pytest.fixture
+def font_root(tmp_path):
+    root = tmp_path / "fonts"
+    (root / "truetype").mkdir(parents=True)
+    return root
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch, font_root):
+    """字体索引写到本测试的临时目录，只扫描 font_root"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(font_index, "font_dirs", lambda: [str(font_root)])
+    monkeypatch.setattr(font_index, "_index", None)
+    monkeypatch.setattr(font_index, "_face_indexes", {})
+    return tmp_path / "cache" / "bedoya"
+
+
+def face(path, label=True, names=0.5, style="Regular", index=0):
+    return {"path": path, "index": index, "family": os.path.basename(path), "style": style,
+            "label": label, "names": names}
+
+
+def test_index_is_current_until_fonttools_changes(font_root, monkeypatch):
+    roots = [str(font_root)]
+    index = scan_fonts(roots)
+    assert _is_current(index, roots)
+    # 格式版本不同或没有索引时同样无效
+    assert not _is_current({**index, "version": INDEX_VERSION - 1}, roots)
+    assert not _is_current(None, roots)
+    monkeypatch.setattr(font_index, "fonttools_version", lambda: "0.0")
+    assert not _is_current(index, roots)
+
+
+def test_index_is_stale_when_a_font_dir_is_added_or_removed(font_root, tmp_path):
+    other = tmp_path / "more-fonts"
+    roots = [str(font_root), str(other)]
+    # 不存在的目录不记录在索引中
+    index = scan_fonts(roots)
+    assert index["roots"] == [str(font_root)] and _is_current(index, roots)
+    other.mkdir()
+    assert not _is_current(index, roots)
+    index = scan_fonts(roots)
+    shutil.rmtree(other)
+    assert not _is_current(index, roots)
+
+
+def test_index_is_stale_when_a_font_dir_is_modified(font_root):
+    roots = [str(font_root)]
+    index = scan_fonts(roots)
+    subdir = str(font_root / "truetype")
+    assert index["dirs"][subdir] is not None
+    stamp = os.stat(subdir).st_mtime_ns
+    os.utime(subdir, ns=(stamp, stamp + 10 ** 9))
+    assert not _is_current(index, roots)
+
+
+def test_rank_prefers_label_coverage_then_preferred_files():
+    plain = face("/fonts/other.ttf", names=0.9)
+    preferred = face("/fonts/msyh.ttc", names=0.5)
+    first_preferred = face("/fonts/simhei.ttf", names=0.1)
+    no_label = face("/fonts/simhei.ttf", label=False)
+    assert best_face([plain, no_label]) == ("/fonts/other.ttf", 0)
+    assert best_face([plain, preferred]) == ("/fonts/msyh.ttc", 0)
+    assert best_face([plain, preferred, first_preferred]) == ("/fonts/simhei.ttf", 0)
+    assert best_face([]) is None
+
+
+def test_rank_breaks_ties_by_names_style_and_face_index():
+    faces = [face("/fonts/a.ttc", names=0.8, style="Bold", index=0),
+             face("/fonts/a.ttc", names=0.8, style="Regular", index=2),
+             face("/fonts/a.ttc", names=0.8, style="Regular", index=1),
+             face("/fonts/a.ttc", names=0.6, style="Regular", index=3)]
+    assert [f["index"] for f in sorted(faces, key=_rank, reverse=True)] == [1, 2, 0, 3]
+    assert best_face(faces) == ("/fonts/a.ttc", 1)
+
+
+def test_best_face_reads_the_cached_index(cache_dir, font_root):
+    index = scan_fonts([str(font_root)])
+    index["faces"] = [face("/fonts/other.ttf"), face("/fonts/simsun.ttc", index=1)]
+    cache_dir.mkdir(parents=True)
+    (cache_dir / "fonts.json").write_text(json.dumps(index), encoding="utf-8")
+    assert best_face() == ("/fonts/simsun.ttc", 1)
+
+
+@pytest.mark.skipif(not os.path.exists(DEJAVU), reason="需要DejaVu字体")
+def test_scan_is_saved_and_reused(cache_dir, font_root, monkeypatch):
+    shutil.copy(DEJAVU, font_root / "truetype")
+    index = font_index.load_index()
+    assert [os.path.basename(f["path"]) for f in index["faces"]] == ["DejaVuSans.ttf"]
+    # DejaVu不能显示中文
+    assert not index["faces"][0]["label"]
+    assert (cache_dir / "fonts.json").exists()
+
+    # 新进程直接读取索引，不再扫描
+    monkeypatch.setattr(font_index, "_index", None)
+    monkeypatch.setattr(font_index, "scan_fonts", lambda roots: pytest.fail("不应重新扫描"))
+    assert font_index.load_index() == index
+
+
+def test_index_write_failure_is_reported_as_warning(tmp_path):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    warnings = []
+    previous = config.set_warning_handler(warnings.append)
+    try:
+        font_index._write_index({}, str(blocker / "fonts.json"))
+    finally:
+        config.set_warning_handler(previous)
+    assert len(warnings) == 1 and warnings[0].startswith("无法保存字体索引")
@@ -0,0 +1,71 @@
+import pytest
+
+import imposition
+from imposition import grid_layout, impose_labels, impose_roster
+from conftest import write_roster
+
+
+def test_grid_layout_fills_a4_and_centres_the_grid():
+    cols, rows, positions = grid_layout((297, 210), (40, 20), gutter_mm=2, margin_mm=5, dpi=300)
+    assert (cols, rows) == (6, 9)
+    assert len(positions) == cols * rows
+    # 第一行从左到右排列，网格左右留白相等
+    sheet_width = imposition.mm_to_pixels(297, 300)
+    label_width = imposition.mm_to_pixels(40, 300)
+    left = positions[0][0]
+    right = sheet_width - (positions[cols - 1][0] + label_width)
+    assert abs(left - right) <= 1
+    assert positions[1][1] == positions[0][1]
+
+
+def test_grid_layout_rejects_labels_larger_than_sheet():
+    with pytest.raises(ValueError):
+        grid_layout((50, 30), (60, 40))
+
+
+def test_impose_labels_expands_copies_onto_sheets():
+    labels = [{"student_id": "1001", "name": "张三", "copies": 40},
+              {"student_id": "1002", "name": "李四", "copies": 20}]
+    sheets = list(impose_labels(labels, (297, 210), (40, 20), dpi=60))
+    # A4每张54格，60份需要两张
+    assert len(sheets) == 2
+    assert sheets[0].size == (imposition.mm_to_pixels(297, 60), imposition.mm_to_pixels(210, 60))
+
+
+def test_impose_labels_leaves_failed_cells_empty(monkeypatch):
+    render = imposition.render_label_tile
+
+    def failing_render(student_id, name, **kwargs):
+        if student_id == "bad":
+            raise RuntimeError("logo broken")
+        return render(student_id, name, **kwargs)
+
+    monkeypatch.setattr(imposition, "render_label_tile", failing_render)
+    labels = [{"student_id": "bad", "name": "张三", "copies": 2, "line": 2},
+              {"student_id": "1002", "name": "李四", "line": 3}]
+    failures = []
+    sheets = list(impose_labels(labels, (297, 210), (40, 20), cut_marks=False, dpi=60, failures=failures))
+
+    assert len(sheets) == 1
+    assert [(failure["line"], failure["error"]) for failure in failures] == [(2, "logo broken")]
+    _, _, positions = grid_layout((297, 210), (40, 20), dpi=60)
+    label_box = (imposition.mm_to_pixels(40, 60), imposition.mm_to_pixels(20, 60))
+
+    def cell_is_blank(index):
+        x, y = positions[index]
+        return sheets[0].crop((x, y, x + label_box[0], y + label_box[1])).getextrema() == ((255, 255),) * 3
+
+    # 失败标签的两份都留空，后面的标签仍在第三格
+    assert cell_is_blank(0) and cell_is_blank(1)
+    assert not cell_is_blank(2)
+
+
+def test_impose_roster_reports_invalid_rows(tmp_path):
+    roster = write_roster(tmp_path / "roster.csv", [
+        ["姓名", "学号", "份数"],
+        ["张三", "1001", "2"],
+        ["", "1002", ""],
+    ])
+    outputs, errors = impose_roster(roster, str(tmp_path / "out"), dpi=60)
+    assert len(outputs) == 1
+    assert [error["line"] for error in errors] == [3]
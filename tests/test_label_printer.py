@@ -0,0 +1,108 @@
+import socket
+
+import pytest
+from PIL import Image
+
+import label_printer
+from label_printer import (FakePrinterServer, RawPrinter, decode_zpl_graphics, escpos_label, packed_rows,
+                           print_labels, render_printer_label, zpl_label)
+
+LABELS = [{"student_id": "1001", "name": "张三", "copies": 3},
+          {"student_id": "1002", "name": "李四", "subject": "Watercolor"}]
+
+
+def test_zpl_round_trip_through_fake_printer():
+    with FakePrinterServer() as fake:
+        summary = print_labels(LABELS, fake.host, fake.port, paper_size_mm=(40, 20))
+        assert fake.wait_for(1)
+    # 整批只用一个连接
+    assert summary["connections"] == 1 and len(fake.received) == 1
+    data = fake.data
+    assert summary["bytes"] == len(data)
+    assert data.count(b"^XA") == 2 and b"^PQ3^XZ" in data and b"^PQ1^XZ" in data
+
+    # 图形字段的CRC有效，解压后与直接渲染的标签一致
+    fields = decode_zpl_graphics(data)
+    for label, (bytes_per_row, bits) in zip(LABELS, fields):
+        image = render_printer_label(label["student_id"], label["name"], (40, 20), label.get("subject"))
+        assert (bytes_per_row, bits) == packed_rows(image)[::2]
+
+
+def test_zpl_crc_mismatch_is_detected():
+    data = zpl_label(Image.new("1", (16, 4), 0))
+    crc = data[data.rindex(b":") + 1:data.rindex(b":") + 5]
+    corrupted = data.replace(b":" + crc, b":" + (b"0000" if crc != b"0000" else b"FFFF"))
+    with pytest.raises(ValueError):
+        decode_zpl_graphics(corrupted)
+
+
+def test_escpos_repeats_label_per_copy():
+    image = Image.new("1", (24, 10), 1)
+    single = escpos_label(image)
+    assert escpos_label(image, copies=3) == single * 3
+    # 初始化、一个光栅条带（每行3字节，10行）、走纸和切纸
+    assert single.startswith(b"\x1b@\x1dv0\x00\x03\x00\x0a\x00")
+    assert single.endswith(b"\x1bd\x03\x1dVB\x00")
+
+
+def test_packed_rows_clears_padding_bits():
+    # 宽10点：每行2字节，末字节只有2位有效；全黑图像的补位必须为0（白）
+    bytes_per_row, height, data = packed_rows(Image.new("1", (10, 3), 0))
+    assert (bytes_per_row, height) == (2, 3)
+    assert data == b"\xff\xc0" * 3
+    # 全白图像没有黑点
+    assert packed_rows(Image.new("1", (10, 3), 1))[2] == b"\x00\x00" * 3
+
+
+class FlakySocket:
+    """前 limit 个字节之后连接被重置"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.received = b""
+
+    def setsockopt(self, *args):
+        pass
+
+    def send(self, view):
+        if self.limit == 0:
+            raise ConnectionResetError("reset")
+        chunk = bytes(view[:min(self.limit, len(view), 7)])
+        self.limit -= len(chunk)
+        self.received += chunk
+        return len(chunk)
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+
+def connect_to(monkeypatch, sockets):
+    monkeypatch.setattr(socket, "create_connection", lambda *args, **kwargs: sockets.pop(0))
+
+
+def test_send_does_not_retry_after_partial_write(monkeypatch):
+    second = FlakySocket(10 ** 6)
+    connect_to(monkeypatch, [FlakySocket(20), second])
+    printer = RawPrinter("printer")
+    with pytest.raises(ConnectionError):
+        printer.send(b"x" * 100)
+    assert printer.connections == 1 and second.received == b""
+
+
+def test_send_reconnects_when_nothing_was_sent(monkeypatch):
+    second = FlakySocket(10 ** 6)
+    connect_to(monkeypatch, [FlakySocket(0), second])
+    printer = RawPrinter("printer")
+    printer.send(b"x" * 100)
+    assert printer.connections == 2 and second.received == b"x" * 100
+    assert printer.bytes_sent == 100
+
+
+def test_print_labels_reports_the_failed_label(monkeypatch):
+    connect_to(monkeypatch, [FlakySocket(50)])
+    monkeypatch.setattr(label_printer, "render_printer_label", lambda *args: Image.new("1", (64, 32), 0))
+    with pytest.raises(ConnectionError, match="张三_1001"):
+        print_labels(LABELS, "printer")
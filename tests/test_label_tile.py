@@ -0,0 +1,42 @@
+import io
+
+import pytest
+from PIL import Image, ImageChops
+
+from qr_generator import LabelTile, render_label_tile
+
+
+def decode(tile):
+    buffer = io.BytesIO()
+    tile.save(buffer, "png")
+    buffer.seek(0)
+    with Image.open(buffer) as image:
+        image.load()
+        return image
+
+
+def assert_same(decoded, expected):
+    assert decoded.size == expected.size
+    assert ImageChops.difference(decoded.convert("L"), expected.convert("L")).getbbox() is None
+
+
+@pytest.mark.parametrize("mode", ["RGB", "1"])
+@pytest.mark.parametrize("paper_size_mm", [(297, 210), (420, 297)])
+def test_streamed_png_matches_composed_page(mode, paper_size_mm):
+    tile = render_label_tile("1001", "张三", paper_size_mm, 0.08, subject="Watercolor", dpi=150, mode=mode)
+    # 标准布局只渲染右下角的一块，整张纸由空白行和图块行拼成
+    assert tile.bbox != (0, 0) + tile.sheet_size
+    decoded = decode(tile)
+    assert_same(decoded, tile.to_image())
+    # 1位图像写成1位灰度PNG
+    assert decoded.mode == ("1" if mode == "1" else "RGB")
+    assert round(decoded.info["dpi"][0]) == 150
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L", "1"])
+def test_streamed_png_crops_tile_outside_the_sheet(mode):
+    image = Image.linear_gradient("L").resize((120, 90)).convert(mode)
+    # 偏移不按8像素对齐时1位图像的行也要正确拼接
+    for offset in [(-30, -20), (400, 250), (13, 10)]:
+        tile = LabelTile(image, offset, (450, 300))
+        assert_same(decode(tile), tile.to_image())
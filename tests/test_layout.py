@@ -0,0 +1,88 @@
+import pytest
+
+import layout
+from layout import LabelPlan, clear_plan_cache, plan_cache_info, plan_label
+from text_layout import ELLIPSIS, MIN_FONT_SCALE, advance_table, layout_text
+
+LOGO = (200, 100)
+
+
+def inside(box, sheet_size):
+    x, y, width, height = box
+    return x >= 0 and y >= 0 and x + width <= sheet_size[0] and y + height <= sheet_size[1]
+
+
+def test_small_label_uses_full_layout():
+    plan = plan_label((40, 20), 0.08, LOGO, has_subject=True)
+    assert plan.full_layout and plan.sheet_size == (472, 236)
+    # 全画幅布局：二维码占内容宽度的45%，垂直居中，与比例参数无关
+    assert plan.qr_box == (258, 22, 191)
+    assert plan.logo_box == (23, 28, 191, 95) and plan.logo_target == (191, 171)
+    assert plan.font_size == 28 and plan.line_offsets == (0, 42, 84)
+    assert plan.text_origin == (23, 146)
+    # 文字宽度到二维码左边缘，高度到纸张下边缘
+    assert plan.text_width == plan.qr_box[0] - plan.text_origin[0]
+    assert plan.text_origin[1] + plan.text_height == plan.sheet_size[1]
+    x, y, size = plan.qr_box
+    assert inside((x, y, size, size), plan.sheet_size) and inside(plan.logo_box, plan.sheet_size)
+
+
+def test_a4_uses_standard_layout_in_the_corner():
+    plan = plan_label((297, 210), 0.08, LOGO, has_subject=True)
+    assert not plan.full_layout and plan.sheet_size == (3507, 2480)
+    # 二维码边长为短边的8%，距右下边缘5mm
+    assert plan.qr_box == (3250, 2223, 198)
+    margin = layout.mm_to_pixels(5)
+    x, y, size = plan.qr_box
+    assert (x + size, y + size) == (plan.sheet_size[0] - margin, plan.sheet_size[1] - margin)
+    # Logo与二维码等宽，按比例缩放；字号为二维码的15%
+    assert plan.logo_box == (3029, 2223, 184, 92) and plan.logo_target == (198, 92)
+    assert plan.font_size == 29 and plan.line_offsets == (0, 31, 63)
+    assert plan.text_positions() == [(3029, 2326), (3029, 2357), (3029, 2389)]
+    # 没有课程主题时只有两行
+    assert plan_label((297, 210), 0.08, LOGO).line_offsets == (0, 31)
+
+
+def test_without_logo_only_the_qr_code_is_planned():
+    plan = plan_label((297, 210), 0.08)
+    assert plan.qr_box == (3250, 2223, 198)
+    assert not plan.has_text and plan.logo_box is None and plan.text_positions() == []
+    assert layout_text(plan, ["张三", "1001"]) == []
+
+
+def test_plan_is_immutable_and_hashable():
+    plan = plan_label((40, 20), 0.08, LOGO)
+    with pytest.raises(AttributeError):
+        plan.font_size = 1
+    assert plan == LabelPlan(**{name: getattr(plan, name) for name in LabelPlan.__slots__})
+    assert len({plan, plan_label((40, 20), 0.08, LOGO)}) == 1
+
+
+def test_plans_are_memoized():
+    clear_plan_cache()
+    first = plan_label((40, 20), 0.08, LOGO, True)
+    # 列表参数和真值都规范化为同一个缓存键
+    again = plan_label([40, 20], 0.08, list(LOGO), 1)
+    assert again is first
+    info = plan_cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    plan_label((297, 210), 0.08, LOGO, True)
+    assert plan_cache_info().misses == 2
+
+
+def test_long_name_is_shrunk_then_ellipsized():
+    plan = plan_label((40, 20), 0.08, LOGO, has_subject=True)
+    name = "张" * 30
+    lines = layout_text(plan, [name, "1001", "Watercolor"])
+    assert [(x, y) for x, y, _, _ in lines][0] == plan.text_origin
+    (_, _, name_size, name_text), (_, _, id_size, id_text), _ = lines
+    # 三行放不下可用高度，整块先按比例缩小
+    assert id_size < plan.font_size and id_text == "1001"
+    # 姓名缩到最小字号仍然放不下，保留开头并以省略号结尾
+    assert name_size == int(plan.font_size * MIN_FONT_SCALE)
+    assert name_text.endswith(ELLIPSIS) and name.startswith(name_text[:-1])
+    assert advance_table(name_size).fits(name_text, plan.text_width)
+    # 每行都在文字区域内
+    for x, y, size, text in lines:
+        assert y + size <= plan.sheet_size[1]
+        assert advance_table(size).width(text) <= plan.text_width
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from PIL import Image
+
+import qr_generator
+from qr_generator import load_logo, logo_cache_info, clear_logo_cache
+
+
+@pytest.fixture
+def logo(tmp_path):
+    path = str(tmp_path / "logo.png")
+    Image.new("RGBA", (200, 100), (200, 30, 30, 255)).save(path)
+    clear_logo_cache()
+    yield path
+    clear_logo_cache()
+
+
+def counts():
+    info = logo_cache_info()
+    return info["hits"], info["misses"]
+
+
+def test_repeated_loads_hit_the_cache(logo):
+    first = load_logo(logo, (100, 100))
+    assert first.size == (100, 50) and first.mode == "RGB"
+    assert load_logo(logo, 100) is first
+    assert counts() == (1, 1)
+    assert logo_cache_info()["size"] == 1
+
+
+def test_key_includes_box_resample_and_mode(logo):
+    load_logo(logo, (100, 100))
+    load_logo(logo, (80, 80))
+    load_logo(logo, (100, 100), resample=Image.Resampling.NEAREST)
+    load_logo(logo, (100, 100), mode="L")
+    assert counts() == (0, 4)
+    load_logo(logo, (80, 80))
+    assert counts() == (1, 4)
+
+
+def test_changed_file_misses(logo):
+    first = load_logo(logo, (100, 100))
+    stat = os.stat(logo)
+    # 只修改时间变化（内容和大小不变）也要重新解码
+    os.utime(logo, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_logo(logo, (100, 100)) is not first
+    assert counts() == (0, 2)
+
+    # 内容被替换为不同大小的文件
+    Image.new("RGB", (100, 200), "blue").save(logo)
+    replaced = load_logo(logo, (100, 100))
+    assert replaced.size == (50, 100)
+    assert counts() == (0, 3)
+
+
+def test_cache_is_bounded(logo, monkeypatch):
+    monkeypatch.setattr(qr_generator, "LOGO_CACHE_SIZE", 2)
+    for size in (40, 50, 60):
+        load_logo(logo, size)
+    assert logo_cache_info()["size"] == 2
+    # 最久未使用的40已被清理
+    load_logo(logo, 40)
+    assert counts() == (0, 4)
@@ -0,0 +1,90 @@
+import os
+import re
+
+import pytest
+
+from pdf_export import PdfExporter, export_roster_pdf, mm_to_points
+from conftest import write_roster
+
+
+def test_pdf_has_one_page_per_label_and_one_shared_logo(tmp_path):
+    path = tmp_path / "labels.pdf"
+    with PdfExporter(str(path)) as exporter:
+        exporter.add_label("1001", "张三", "Watercolor", (40, 20))
+        exporter.add_label("1002", "李四", None, (102, 51))
+        assert exporter.page_count == 2
+
+    data = path.read_bytes()
+    assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF")
+    assert b"/Count 2" in data
+    assert data.count(b"/Subtype /Image") == 1
+    boxes = [tuple(float(v) for v in box) for box in re.findall(rb"/MediaBox \[0 0 ([\d.]+) ([\d.]+)\]", data)]
+    expected = [(mm_to_points(40), mm_to_points(20)), (mm_to_points(102), mm_to_points(51))]
+    assert [tuple(round(v, 1) for v in box) for box in boxes] == [tuple(round(v, 1) for v in box)
+                                                                   for box in expected]
+
+
+def test_pdf_xref_offsets_point_at_objects(tmp_path):
+    path = tmp_path / "labels.pdf"
+    with PdfExporter(str(path)) as exporter:
+        exporter.add_label("1001", "张三", None, (40, 20))
+    data = path.read_bytes()
+    xref = int(data[data.rindex(b"startxref") + 9:].split()[0])
+    lines = data[xref:].split(b"\n")
+    assert lines[0].strip() == b"xref"
+    count = int(lines[1].split()[1])
+    for num, entry in enumerate(lines[3:2 + count], start=1):
+        offset = int(entry.split()[0])
+        assert data[offset:].startswith(b"%d 0 obj" % num)
+
+
+def test_export_roster_pdf_imposes_copies(tmp_path):
+    roster = write_roster(tmp_path / "roster.csv", [["姓名", "学号", "份数"], ["张三", "1001", "60"]])
+    summary = export_roster_pdf(roster, str(tmp_path / "sheets.pdf"), impose=True,
+                                sheet_size_mm=(297, 210), label_size_mm=(40, 20))
+    assert summary["pages"] == 2
+    assert not summary["errors"]
+
+
+ROSTER = [["姓名", "学号", "份数", "主题"], ["张三", "1001", "2", ""], ["李四", "1002", "1", "x" * 3000],
+          ["王五", "1003", "3", "Watercolor"]]
+
+
+def test_export_roster_pdf_emits_one_page_per_copy_and_skips_failed_rows(tmp_path):
+    roster = write_roster(tmp_path / "roster.csv", ROSTER)
+    progress = []
+    summary = export_roster_pdf(roster, str(tmp_path / "labels.pdf"), default_paper_size=(40, 20),
+                                progress=lambda done, total: progress.append((done, total)))
+    # 二维码内容过长的行被记录，其余行照常导出
+    assert [error["line"] for error in summary["errors"]] == [3]
+    assert "二维码内容过长" in summary["errors"][0]["error"]
+    assert summary["labels"] == 2 and summary["pages"] == 5
+    # 出错的行的份数从总页数中扣除
+    assert progress == [(2, 6), (5, 5)]
+    data = (tmp_path / "labels.pdf").read_bytes()
+    assert b"/Count 5" in data
+    # 同一标签的多份页面共享内容流
+    assert len(set(re.findall(rb"/Contents (\d+) 0 R", data))) == 2
+
+
+def test_export_roster_pdf_skips_failed_rows_when_imposing(tmp_path):
+    roster = write_roster(tmp_path / "roster.csv", ROSTER)
+    summary = export_roster_pdf(roster, str(tmp_path / "sheets.pdf"), impose=True,
+                                sheet_size_mm=(297, 210), label_size_mm=(40, 20))
+    assert [error["line"] for error in summary["errors"]] == [3]
+    assert summary["labels"] == 2 and summary["pages"] == 1
+
+
+def test_export_roster_pdf_keeps_old_file_when_interrupted(tmp_path):
+    roster = write_roster(tmp_path / "roster.csv", ROSTER)
+    path = tmp_path / "labels.pdf"
+    path.write_bytes(b"old")
+
+    def interrupt(done, total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        export_roster_pdf(roster, str(path), default_paper_size=(40, 20), progress=interrupt)
+    assert path.read_bytes() == b"old"
+    # 临时文件已删除
+    assert sorted(os.listdir(tmp_path)) == ["labels.pdf", "roster.csv"]
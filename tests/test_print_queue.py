@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+import sys
+
+from PIL import Image
+
+import print_queue
+from print_queue import PrintQueue, print_command, SPOOL_PREFIX
+
+SCRIPT = print_queue.__file__
+
+
+def label(color="black"):
+    return Image.new("RGB", (80, 40), color)
+
+
+def read_log(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def spooled(directory):
+    return [name for name in os.listdir(directory) if name.startswith(SPOOL_PREFIX)]
+
+
+def test_stand_in_spooler_receives_each_job_once(tmp_path):
+    log_path = str(tmp_path / "jobs.log")
+    command = f'"{sys.executable}" "{SCRIPT}" record "{log_path}" {{file}} --copies {{copies}}'
+    done = []
+    queue = PrintQueue(command=command, spool_dir=str(tmp_path), on_done=done.append)
+    jobs = [queue.submit(lambda: label(), copies) for copies in (1, 2, 3)]
+    # 渲染失败的任务被报告，不影响后面的任务
+    failed = queue.submit(lambda: None)
+    queue.submit(label(), 1)
+    queue.close()
+
+    entries = read_log(log_path)
+    assert [entry["copies"] for entry in entries] == [1, 2, 3, 1]
+    # 份数交给打印系统，文件本身只有一页
+    assert all(entry["pages"] == 1 for entry in entries)
+    assert len({entry["file"] for entry in entries}) == 4
+    assert [job.status for job in jobs] == ["done"] * 3 and failed.status == "failed"
+    assert len(done) == 5
+    assert queue.info()["copies"] == 7 and queue.info()["failed"] == 1
+    # 交给打印命令之后临时文件被删除
+    assert spooled(tmp_path) == []
+
+
+def which(*available):
+    return lambda name: f"/usr/bin/{name}" if name in available else None
+
+
+def test_print_command_prefers_lp_then_lpr(monkeypatch):
+    monkeypatch.setattr(shutil, "which", which("lp", "lpr"))
+    assert print_command("a.png", 2, "P1", "t") == ["lp", "-n", "2", "-o", "collate=true", "-t", "t",
+                                                     "-d", "P1", "a.png"]
+    monkeypatch.setattr(shutil, "which", which("lpr"))
+    assert print_command("a.png", 2, "P1", "t") == ["lpr", "-#", "2", "-T", "t", "-P", "P1", "a.png"]
+    monkeypatch.setattr(shutil, "which", which())
+    assert print_command("a.png", 2) is None
+    # 自定义命令不需要 lp/lpr
+    assert print_command("a.png", 2, template="echo {file} {copies}") == ["echo", "a.png", "2"]
+
+
+def test_without_lp_or_lpr_job_fails_and_cleans_up(monkeypatch, tmp_path):
+    monkeypatch.setattr(shutil, "which", which())
+    monkeypatch.delattr(os, "startfile", raising=False)
+    queue = PrintQueue(command="", spool_dir=str(tmp_path))
+    job = queue.submit(label(), 2)
+    queue.close()
+    assert job.status == "failed" and "lp/lpr" in job.error
+    assert spooled(tmp_path) == []
+
+
+def test_startfile_gets_one_multipage_file_per_job(monkeypatch, tmp_path):
+    monkeypatch.setattr(shutil, "which", which())
+    calls = []
+
+    def startfile(path, operation):
+        with Image.open(path) as image:
+            calls.append((operation, image.format, image.n_frames))
+
+    monkeypatch.setattr(os, "startfile", startfile, raising=False)
+    queue = PrintQueue(command="", spool_dir=str(tmp_path))
+    queue.submit(label(), 3)
+    queue.submit(label(), 1)
+    queue.wait()
+    assert calls == [("print", "TIFF", 3), ("print", "PNG", 1)]
+    # 打印程序异步读取，文件保留到关闭队列时删除
+    assert len(spooled(tmp_path)) == 2
+    queue.close()
+    assert spooled(tmp_path) == []
@@ -0,0 +1,48 @@
+import os
+
+from render_cache import RenderCache, render_key, render_label_file
+
+LABEL = ("1001", "张三", (40, 20))
+
+
+def test_render_key_depends_on_inputs():
+    key = render_key("png", *LABEL)
+    assert key == render_key("PNG", *LABEL)
+    assert key != render_key("png", "1001", "张三", (40, 30))
+    assert key != render_key("png", *LABEL, subject="Watercolor")
+    assert key != render_key("png", *LABEL, dpi=600)
+    assert key != render_key("png", *LABEL, mode="1")
+
+
+def test_vector_keys_ignore_resolution_and_colour_mode():
+    for fmt in ("pdf", "svg"):
+        assert render_key(fmt, *LABEL, dpi=300) == render_key(fmt, *LABEL, dpi=600, mode="1")
+    assert render_key("pdf", *LABEL) != render_key("svg", *LABEL)
+
+
+def test_put_get_and_prune(tmp_path):
+    cache = RenderCache(str(tmp_path), max_bytes=10 ** 6)
+    assert cache.get("ab" * 32, "png") is None
+    path = cache.put("ab" * 32, "png", b"label")
+    assert os.path.dirname(path) == os.path.join(str(tmp_path), "ab")
+    assert cache.get("ab" * 32, "png") == b"label"
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+    # 写满后最久未使用的条目被清理
+    cache.put("cd" * 32, "png", b"x" * 600000)
+    cache.put("ef" * 32, "png", b"y" * 600000)
+    assert cache.get("ef" * 32, "png") is not None
+    assert cache.get("cd" * 32, "png") is None
+
+
+def test_render_label_file_reuses_cached_output(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    first = str(tmp_path / "first.png")
+    second = str(tmp_path / "second.png")
+    render_label_file(first, "png", *LABEL, dpi=100, cache=cache)
+    render_label_file(second, "png", *LABEL, dpi=100, cache=cache)
+    assert cache.stats["writes"] == 1 and cache.stats["hits"] == 1
+    with open(first, "rb") as a, open(second, "rb") as b:
+        assert a.read() == b.read()
+
+    render_label_file(second, "png", *LABEL, dpi=100, use_cache=False, cache=cache)
+    assert cache.stats["writes"] == 1 and cache.stats["hits"] == 1
@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import server
+from server import LabelService, parse_label_request
+
+
+class DoneExecutor:
+    """submit 直接返回已完成的future（回调会在注册时立即执行）"""
+
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.calls = 0
+
+    def submit(self, fn, *args):
+        self.calls += 1
+        if self.fail:
+            raise self.fail
+        future = Future()
+        future.set_result((b"label", None))
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def service():
+    service = LabelService(workers=1, max_pending=2)
+    service.executor.shutdown()
+    yield service
+    service.shutdown()
+
+
+def test_completed_future_does_not_deadlock(service):
+    service.executor = DoneExecutor()
+    assert service.render("k", "png", {}) == b"label"
+    assert service.inflight == {}
+    assert service.stats["rendered"] == 1
+    # 结果已缓存，不再提交
+    assert service.render("k", "png", {}) == b"label"
+    assert service.executor.calls == 1
+
+
+def test_failed_submit_returns_the_slot(service):
+    service.executor = DoneExecutor(fail=BrokenProcessPool("broken"))
+    for _ in range(5):
+        with pytest.raises(BrokenProcessPool):
+            service.render("k", "png", {})
+    assert service.inflight == {}
+    # 两个名额都还在
+    service.executor = DoneExecutor()
+    assert service.render("a", "png", {}) == b"label"
+    assert service.slots.acquire(blocking=False) and service.slots.acquire(blocking=False)
+
+
+def test_parse_label_request_limits_pixels():
+    fmt, params = parse_label_request("/label.png?name=张三&id=1&paper=A3&dpi=600")
+    assert fmt == "png" and params["dpi"] == 600
+    with pytest.raises(ValueError):
+        parse_label_request("/label.png?name=张三&id=1&paper=1000x1000&dpi=600")
+    with pytest.raises(ValueError):
+        parse_label_request("/label.png?name=张三&id=1&paper=1000x1000&dpi=300")
+    # 矢量输出没有像素
+    assert parse_label_request("/label.svg?name=张三&id=1&paper=1000x1000")[1]["dpi"] is None
+    assert server.MAX_PIXELS >= 420 / 25.4 * 600 * 297 / 25.4 * 600
@@ -0,0 +1,30 @@
+import xml.etree.ElementTree as ET
+
+import config
+from svg_export import render_label_svg, render_sheet_svg
+
+SVG = "{http://www.w3.org/2000/svg}"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+
+def test_svg_label_is_well_formed_with_linked_logo():
+    document = render_label_svg("1001", "张三 & <李四>", (40, 20), subject="Watercolor",
+                                logo_path=config.DEFAULT_LOGO)
+    root = ET.fromstring(document.encode("utf-8"))
+    assert root.get("width") == "40mm" and root.get("height") == "20mm"
+    texts = [element.text for element in root.iter(SVG + "text")]
+    assert any("张三 & <李四>" in text for text in texts)
+    symbol = root.find(f"{SVG}defs/{SVG}symbol")
+    image = symbol.find(SVG + "image")
+    assert image.get("href") == image.get(XLINK_HREF)
+    assert image.get("href").startswith("data:image/png;base64,")
+    uses = list(root.iter(SVG + "use"))
+    assert len(uses) == 1 and uses[0].get(XLINK_HREF) == "#logo"
+
+
+def test_svg_sheet_embeds_logo_once():
+    labels = [{"student_id": str(1000 + i), "name": f"学生{i}"} for i in range(10)]
+    document = render_sheet_svg(labels, (297, 210), (40, 20), logo_path=config.DEFAULT_LOGO)
+    root = ET.fromstring(document.encode("utf-8"))
+    assert len(list(root.iter(SVG + "image"))) == 1
+    assert len(list(root.iter(SVG + "use"))) == 10
@@ -0,0 +1,96 @@
+import pytest
+
+from text_layout import (ELLIPSIS, GlyphAdvances, MIN_FONT_SCALE, advance_table, block_font_size,
+                         clear_layout_cache, ellipsize, fit_line, layout_cache_info)
+
+TEXT = "Watercolor Painting"
+
+
+class FakeFont:
+    """每个字符宽10，整行测量时每对相邻字符多出 kerning（模拟字距调整），记录整行测量的次数"""
+
+    def __init__(self, kerning=0):
+        self.kerning = kerning
+        self.line_calls = 0
+
+    def getlength(self, text):
+        if len(text) > 1:
+            self.line_calls += 1
+        return 10 * len(text) + self.kerning * max(0, len(text) - 1)
+
+
+def test_fits_skips_full_measurement_when_estimate_is_too_wide():
+    font = FakeFont()
+    table = GlyphAdvances(font)
+    assert not table.fits("abcdef", 55)
+    # 宽度表估算已经超出，不再整行测量
+    assert font.line_calls == 0
+    assert table.fits("abcde", 50)
+    assert font.line_calls == 1
+    # 每个字符只测量一次
+    assert set(table.advances) == set("abcdef")
+
+
+def test_fits_confirms_with_full_measurement():
+    # 宽度表不含字距调整，估算放得下时整行测量仍然可能超出
+    table = GlyphAdvances(FakeFont(kerning=2))
+    assert table.width("abcde") == 50
+    assert not table.fits("abcde", 50)
+    assert table.fits("abcde", 58)
+
+
+def test_ellipsize_keeps_the_longest_prefix():
+    table = GlyphAdvances(FakeFont())
+    assert ellipsize("abcde", 50, table) == "abcde"
+    assert ellipsize("abcdef", 50, table) == "abcd" + ELLIPSIS
+    # 截断处的空格不保留
+    assert ellipsize("ab  cdef", 50, table) == "ab" + ELLIPSIS
+    assert ellipsize("abcdef", 5, table) == ELLIPSIS
+
+
+def test_text_that_fits_is_unchanged():
+    table = advance_table(20)
+    width = max(table.width(TEXT), table.font.getlength(TEXT))
+    assert fit_line(TEXT, width, 20) == (20, TEXT)
+    assert fit_line(TEXT, None, 20) == (20, TEXT)
+
+
+def test_long_line_shrinks_to_the_largest_size_that_fits():
+    max_width = advance_table(20).font.getlength(TEXT) * 0.8
+    size, text = fit_line(TEXT, max_width, 20)
+    assert text == TEXT
+    assert int(20 * MIN_FONT_SCALE) <= size < 20
+    assert advance_table(size).fits(TEXT, max_width)
+    assert not advance_table(size + 1).fits(TEXT, max_width)
+
+
+def test_line_is_ellipsized_at_the_minimum_size():
+    max_width = advance_table(20).font.getlength(TEXT) * 0.4
+    size, text = fit_line(TEXT, max_width, 20)
+    assert size == int(20 * MIN_FONT_SCALE)
+    assert text.endswith(ELLIPSIS) and TEXT.startswith(text[:-1])
+    assert advance_table(size).fits(text, max_width)
+    # 指定的最小字号不超过最大字号
+    assert fit_line(TEXT, max_width, 20, min_size=30)[0] == 20
+
+
+def test_fit_results_are_cached():
+    clear_layout_cache()
+    fit_line(TEXT, 100, 20)
+    misses = layout_cache_info()["fits"]["misses"]
+    fit_line(TEXT, 100, 20)
+    info = layout_cache_info()
+    assert info["fits"]["misses"] == misses and info["fits"]["hits"] == 1
+    # 每种字号只建立一张宽度表
+    assert info["advances"]["size"] == info["advances"]["misses"]
+
+
+@pytest.mark.parametrize("offsets, max_height, expected", [
+    ((0, 42, 84), None, 28),
+    ((0, 42, 84), 126, 28),
+    ((0, 42, 84), 90, 20),
+    ((0,), 14, 14),
+    ((), 1, 28),
+])
+def test_block_font_size_scales_with_height(offsets, max_height, expected):
+    assert block_font_size(28, offsets, max_height) == expected
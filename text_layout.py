@@ -0,0 +1,191 @@
+"""标签文字排版：按字符宽度表测量文字，过长的行缩小字号，仍然放不下时截断并加省略号
+
+- 每种(字体, 字号, 字形集)有一张字符宽度表，字符只在第一次出现时测量，之后直接查表求和；
+  宽度之和不含字距调整，判断放得下时再用整行测量确认一次
+- 文字块的高度（行距乘以行数）超过可用高度时，整块按比例缩小字号和行距
+- 二分查找能放下整行的最大字号，不超过布局计划的字号（正常长度的文字与以前完全相同），
+  不小于其 MIN_FONT_SCALE 倍；最小字号仍然放不下时保留开头并以省略号结尾
+- 结果按(文字, 宽度, 字号, 字体)缓存，花名册中重复的主题和相同长度的学号不会重复测量
+
+排版只依赖字体和文字，同样的输入总是得到同样的字号和截断位置。
+"""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import config
+from font_cache import get_font
+from font_index import face_index
+
+ELLIPSIS = "…"
+# 过长的行最多缩小到布局字号的这个比例，再长就截断
+MIN_FONT_SCALE = 0.6
+# 缓存的字符宽度表数量（每个字体和字号一张）
+ADVANCE_CACHE_SIZE = 64
+# 缓存的单行排版结果数量
+FIT_CACHE_SIZE = 4096
+
+_advance_tables = OrderedDict()
+_advance_lock = threading.Lock()
+_advance_stats = {"hits": 0, "misses": 0}
+
+
+class GlyphAdvances:
+    """一种字体和字号的字符宽度表，字符在第一次用到时测量"""
+
+    def __init__(self, font):
+        self.font = font
+        self.advances = {}
+
+    def fits(self, text, max_width):
+        """文字能否放进 max_width：先按宽度表估算，放得下时再按整行（含字距调整）确认"""
+        return self.width(text) <= max_width and self.font.getlength(text) <= max_width
+
+    def width(self, text):
+        """文字的宽度（各字符宽度之和）"""
+        advances = self.advances
+        total = 0.0
+        for char in text:
+            advance = advances.get(char)
+            if advance is None:
+                advance = advances[char] = self.font.getlength(char)
+            total += advance
+        return total
+
+    def prefix_widths(self, text):
+        """每个前缀的宽度，第i项为前i个字符的宽度"""
+        widths = [0.0]
+        for char in text:
+            widths.append(widths[-1] + self.width(char))
+        return widths
+
+
+def advance_table(font_size, font_path=None, index=None):
+    """获取字符宽度表，按(字体路径, 字号, 字形集)缓存"""
+    if font_path is None:
+        font_path = config.FONT_PATH
+    if index is None:
+        index = face_index(font_path)
+    key = (font_path, font_size, index)
+
+    with _advance_lock:
+        table = _advance_tables.get(key)
+        if table is not None:
+            _advance_tables.move_to_end(key)
+            _advance_stats["hits"] += 1
+            return table
+        _advance_stats["misses"] += 1
+
+    table = GlyphAdvances(get_font(font_size, font_path, index))
+
+    with _advance_lock:
+        table = _advance_tables.setdefault(key, table)
+        _advance_tables.move_to_end(key)
+        while len(_advance_tables) > ADVANCE_CACHE_SIZE:
+            _advance_tables.popitem(last=False)
+    return table
+
+
+def ellipsize(text, max_width, table):
+    """截断到 max_width 以内并以省略号结尾，文字本身放得下时原样返回"""
+    if table.fits(text, max_width):
+        return text
+    widths = table.prefix_widths(text)
+    available = max_width - table.width(ELLIPSIS)
+    end = len(text)
+    while end > 0 and widths[end] > available:
+        end -= 1
+    # 宽度表不含字距调整，整行仍然超出时继续缩短
+    while end > 0 and not table.fits(text[:end].rstrip() + ELLIPSIS, max_width):
+        end -= 1
+    return text[:end].rstrip() + ELLIPSIS
+
+
+def fit_line(text, max_width, max_size, font_path=None, index=None, min_size=None):
+    """排版一行文字，返回 (字号, 文字)
+
+    max_width 为None时不限制宽度。能以 max_size 放下时原样返回；否则返回能放下整行的最大字号；
+    min_size（默认 max_size 的 MIN_FONT_SCALE 倍）仍然放不下时以 min_size 截断。
+    """
+    if font_path is None:
+        font_path = config.FONT_PATH
+    if index is None:
+        index = face_index(font_path)
+    if min_size is None:
+        min_size = max(1, int(max_size * MIN_FONT_SCALE))
+    return _fit_line(text, max_width, max_size, min(min_size, max_size), font_path, index)
+
+
+@lru_cache(maxsize=FIT_CACHE_SIZE)
+def _fit_line(text, max_width, max_size, min_size, font_path, index):
+    if max_width is None or advance_table(max_size, font_path, index).fits(text, max_width):
+        return max_size, text
+
+    # 字号越大文字越宽，二分查找能放下整行的最大字号
+    best = None
+    low, high = min_size, max_size - 1
+    while low <= high:
+        size = (low + high) // 2
+        if advance_table(size, font_path, index).fits(text, max_width):
+            best = size
+            low = size + 1
+        else:
+            high = size - 1
+    if best is not None:
+        return best, text
+    return min_size, ellipsize(text, max_width, advance_table(min_size, font_path, index))
+
+
+def fit_lines(lines, max_width, max_size, font_path=None, index=None, min_size=None):
+    """逐行排版，返回 [(字号, 文字), ...]，每行独立缩放，不影响其他行"""
+    return [fit_line(text, max_width, max_size, font_path, index, min_size) for text in lines]
+
+
+def block_font_size(font_size, line_offsets, max_height):
+    """文字块能放进 max_height 的最大字号（不超过 font_size）
+
+    line_offsets 为按 font_size 排好的各行偏移，行距与字号成正比；
+    整块高度为行距乘以行数（只有一行时行距为字号）。max_height 为None时不限制。
+    """
+    if max_height is None or not line_offsets:
+        return font_size
+    line_height = line_offsets[1] - line_offsets[0] if len(line_offsets) > 1 else font_size
+    block_height = line_height * len(line_offsets)
+    if block_height <= max_height:
+        return font_size
+    return max(1, min(font_size, int(max_height * font_size / block_height)))
+
+
+def layout_text(plan, lines, font_path=None, index=None):
+    """按布局计划排版标签文字，返回 [(x, y, 字号, 文字), ...]
+
+    先按可用高度确定整块的字号和行距，再逐行按可用宽度缩小或截断。
+    """
+    if not plan.has_text:
+        return []
+    offsets = plan.line_offsets[:len(lines)]
+    size = block_font_size(plan.font_size, offsets, plan.text_height)
+    if size != plan.font_size:
+        offsets = [offset * size // plan.font_size for offset in offsets]
+    # 按宽度缩小的下限以布局字号计算；整块已经因高度小于下限时，过长的行直接截断
+    min_size = max(1, int(plan.font_size * MIN_FONT_SCALE))
+    text_x, text_y = plan.text_origin
+    return [(text_x, text_y + offset, font_size, text)
+            for offset, (font_size, text) in zip(offsets, fit_lines(lines, plan.text_width, size, font_path,
+                                                                     index, min_size))]
+
+
+def layout_cache_info():
+    """字符宽度表和排版结果缓存的命中统计"""
+    with _advance_lock:
+        advances = {**_advance_stats, "size": len(_advance_tables), "maxsize": ADVANCE_CACHE_SIZE}
+    return {"advances": advances, "fits": _fit_line.cache_info()._asdict()}
+
+
+def clear_layout_cache():
+    """清空字符宽度表和排版结果缓存"""
+    with _advance_lock:
+        _advance_tables.clear()
+        _advance_stats["hits"] = 0
+        _advance_stats["misses"] = 0
+    _fit_line.cache_clear()